@@ -1,8 +1,12 @@
 from celery import Celery
 
+from app import config
+
+# Only imported when a job is sent to Celery (ML_EXECUTOR=celery) or by the
+# Celery worker itself; creating the app doesn't connect to the broker.
 celery = Celery(
     "app",
-    broker="redis://localhost:6379/0",
-    backend="redis://localhost:6379/0",
-    include=["app.tasks.ml_task"]   # ⭐ FORCE LOAD TASK
+    broker=config.CELERY_BROKER_URL,
+    backend=config.CELERY_BROKER_URL,
+    include=["app.services.ml_service"]   # ⭐ FORCE LOAD TASK
 )
@@ -10,5 +10,145 @@ DB_CONFIG = {
     "host": os.getenv("DB_HOST"),
     "port": os.getenv("DB_PORT"),
 }
-print(DB_CONFIG)
 
+# Full SQLAlchemy URL; overrides DB_CONFIG when set (e.g. sqlite:///./local.db for local dev)
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Create/migrate tables when the API starts. Off by default: run
+# `python -m app.tasks.init_db` as a deploy step instead.
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "false").lower() == "true"
+# Seconds /health/ready waits for the database
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", "2"))
+
+# Connection pool used by API requests
+DB_POOL_CONFIG = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    # Seconds to wait for a free connection before failing the request
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    # Recycle connections before server/proxy idle timeouts close them
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+}
+
+# Separate, smaller pool for background ML work, so a burst of jobs can't
+# starve API requests of connections (and the other way round)
+DB_WORKER_POOL_CONFIG = {
+    **DB_POOL_CONFIG,
+    "pool_size": int(os.getenv("DB_WORKER_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_WORKER_MAX_OVERFLOW", "5")),
+    "pool_timeout": float(os.getenv("DB_WORKER_POOL_TIMEOUT", "30")),
+}
+
+# ML job queue
+# ML_EXECUTOR selects where inference runs: "batch" (in-process micro-batching),
+# "thread" (in-process pool, one image per job), "db" (jobs table shared by any
+# number of workers, see app/tasks/db_queue.py) or "celery".
+ML_EXECUTOR = os.getenv("ML_EXECUTOR", "batch")
+ML_MAX_WORKERS = int(os.getenv("ML_MAX_WORKERS", "4"))
+# Jobs allowed to wait on top of the running ones before uploads get a 429.
+ML_QUEUE_SIZE = int(os.getenv("ML_QUEUE_SIZE", "100"))
+# Seconds a single job may run before its result is discarded and it is marked FAILED.
+ML_JOB_TIMEOUT = float(os.getenv("ML_JOB_TIMEOUT", "60"))
+
+# Micro-batching inference (ML_EXECUTOR=batch)
+# A batch is run as soon as it has ML_BATCH_MAX_SIZE items or its oldest item
+# has waited ML_BATCH_MAX_WAIT_MS.
+ML_BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "16"))
+ML_BATCH_MAX_WAIT_MS = int(os.getenv("ML_BATCH_MAX_WAIT_MS", "50"))
+# Threads used to decode and resize the images of one batch in parallel
+ML_DECODE_WORKERS = int(os.getenv("ML_DECODE_WORKERS", "4"))
+
+# Database-backed job queue (ML_EXECUTOR=db). Batches use ML_BATCH_MAX_SIZE.
+# Claiming threads in each API process; 0 leaves the jobs to
+# `python -m app.tasks.db_queue` workers.
+ML_DB_WORKERS = int(os.getenv("ML_DB_WORKERS", "1"))
+# Seconds between polls of an idle worker (a job queued by the same process wakes it at once)
+ML_DB_POLL_INTERVAL = float(os.getenv("ML_DB_POLL_INTERVAL", "1"))
+# A claimed job is reclaimed if its worker sends no heartbeat for this long
+ML_JOB_LEASE_SECONDS = float(os.getenv("ML_JOB_LEASE_SECONDS", "30"))
+# Attempts before a job is dead-lettered and its media marked FAILED
+ML_JOB_MAX_ATTEMPTS = int(os.getenv("ML_JOB_MAX_ATTEMPTS", "3"))
+# Seconds before the first retry of a failed attempt; doubled on every attempt
+ML_JOB_RETRY_DELAY = float(os.getenv("ML_JOB_RETRY_DELAY", "10"))
+
+# Prometheus metrics (app/services/metrics.py). When false, /metrics is not served
+# and neither requests nor SQL statements are timed.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Simulated inference time of the placeholder model, per forward pass
+ML_SIMULATED_DELAY = float(os.getenv("ML_SIMULATED_DELAY", "5"))
+# Load the model at startup instead of on the first job. /health/ready waits for it.
+ML_WARMUP = os.getenv("ML_WARMUP", "true").lower() == "true"
+# Broker of the Celery executor (ML_EXECUTOR=celery); defaults to REDIS_URL
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL") or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Feature store (app/services/feature_store.py): keeps every decoded model input
+# in memory-mapped .npy shards so re-running inference never decodes an image again
+FEATURE_STORE_ENABLED = os.getenv("FEATURE_STORE_ENABLED", "false").lower() == "true"
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "feature_store")
+FEATURE_STORE_SHARD_ROWS = int(os.getenv("FEATURE_STORE_SHARD_ROWS", "1024"))
+# How often a lookup miss re-reads the shard indexes written by other processes
+FEATURE_STORE_REFRESH_SECONDS = float(os.getenv("FEATURE_STORE_REFRESH_SECONDS", "5"))
+
+# Uploads
+# Files are streamed to disk in UPLOAD_CHUNK_SIZE pieces and rejected with 413
+# as soon as they pass MAX_UPLOAD_BYTES.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+# Folder served at /uploads. Content-addressed blobs live under UPLOAD_DIR/blobs.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# Batch uploads (/api/upload-media/batch): files per request, and the request size
+# limit (each file is still capped at MAX_UPLOAD_BYTES)
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "50"))
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+# Resumable uploads (/api/uploads). Partial files live outside the public
+# /uploads folder, but must be on the same filesystem as UPLOAD_DIR.
+RESUMABLE_UPLOAD_DIR = os.getenv("RESUMABLE_UPLOAD_DIR", "upload_sessions")
+# Sessions with no new bytes for this many seconds are deleted
+RESUMABLE_UPLOAD_TTL = int(os.getenv("RESUMABLE_UPLOAD_TTL", str(24 * 3600)))
+RESUMABLE_GC_INTERVAL = int(os.getenv("RESUMABLE_GC_INTERVAL", "3600"))
+
+# Serving uploaded images (app/routes/media_files.py)
+# Cache lifetime of images not stored under a content hash (legacy uploads);
+# content-addressed ones are always cached as immutable
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "300"))
+# When set, /uploads only serves signed URLs (app/services/media_urls.py),
+# valid for MEDIA_URL_TTL seconds
+MEDIA_SIGNING_KEY = os.getenv("MEDIA_SIGNING_KEY", "")
+MEDIA_URL_TTL = int(os.getenv("MEDIA_URL_TTL", str(7 * 24 * 3600)))
+# When set (e.g. "/protected-uploads/"), image bytes are left to the proxy in
+# front of the app through X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+
+# Image variants made at ingest (app/services/image_variants.py):
+# JPEG thumbnails no wider/taller than each of these sizes, in pixels
+THUMBNAIL_SIZES = tuple(int(size) for size in os.getenv("THUMBNAIL_SIZES", "128,256,512").split(","))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+
+# Crop/disease/remedy catalog served by /api/knowledge-base and attached to predictions
+KNOWLEDGE_BASE_PATH = os.getenv(
+    "KNOWLEDGE_BASE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "knowledge_base.json"),
+)
+
+# History paging
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+
+# Result notifications (SSE / long-poll)
+# "memory" only reaches clients connected to the same process; use "redis"
+# when running several workers or the Celery executor.
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Bulk status lookup (/api/media-status/bulk)
+BULK_STATUS_MAX_IDS = int(os.getenv("BULK_STATUS_MAX_IDS", "5000"))
+# IDs per IN (...) query, to stay well under driver/database parameter limits
+BULK_STATUS_CHUNK_SIZE = int(os.getenv("BULK_STATUS_CHUNK_SIZE", "500"))
+
+# Read-through cache of COMPLETED/FAILED results in front of status/prediction lookups.
+# "memory" (per-process LRU), "redis" (shared, uses REDIS_URL) or "none".
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "3600"))
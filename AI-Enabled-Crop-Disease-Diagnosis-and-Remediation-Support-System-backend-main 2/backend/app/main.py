@@ -1,18 +1,77 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 import os
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from app import config
 from app.routes import prediction
-from app.routes import upload, process, status, history
-from app.database import engine
-from app.models import base
+from app.routes import upload, resumable_upload, process, status, history, events, media_files, knowledge_base
+from app.database import async_engine, dispose_engines
+from app.services.metrics import MetricsMiddleware, render_metrics
+from app.services.knowledge_base import get_knowledge_base
+from app.services.model import get_model, model_loaded
+from app.tasks.job_queue import get_executor, shutdown_executor
 
-# Create database tables
-base.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Farmer Crop Diagnosis Backend")
+# Startup and shutdown
+# Importing this module has no side effects: nothing connects to the database,
+# Redis or the filesystem until the app starts. The schema is set up by a
+# separate step (python -m app.tasks.init_db), unless DB_INIT_ON_STARTUP is set.
+# With gunicorn --preload the model is loaded once in the master and shared by
+# the forked workers (see gunicorn.conf.py); each worker then runs this lifespan.
+@asynccontextmanager
+async def lifespan(app):
+    for directory in (config.UPLOAD_DIR, config.RESUMABLE_UPLOAD_DIR):
+        os.makedirs(directory, exist_ok=True)
+
+    if config.DB_INIT_ON_STARTUP:
+        from app.tasks.init_db import init_db
+
+        if not await run_in_threadpool(init_db):
+            raise RuntimeError("Database schema setup failed")
+
+    # A broken catalog file fails the startup rather than the first prediction
+    await run_in_threadpool(get_knowledge_base)
+    if config.ML_WARMUP:
+        await run_in_threadpool(get_model)
+    # In-process executors start their threads now rather than on the first upload
+    await run_in_threadpool(get_executor)
+
+    yield
+
+    await run_in_threadpool(shutdown_executor)
+    await dispose_engines()
+
+
+app = FastAPI(title="Farmer Crop Diagnosis Backend", lifespan=lifespan)
 # Initialize FastAPI application with title.
 
+# Reject oversized uploads from the Content-Length header, before the body is read.
+# Bodies without a length are still cut off while streaming in save_upload().
+# The slack allows for multipart boundaries and the form fields.
+MAX_UPLOAD_REQUEST_BYTES = config.MAX_UPLOAD_BYTES + 64 * 1024
+BATCH_UPLOAD_PATH = "/api/upload-media/batch"
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path.startswith("/api/upload"):
+        if request.url.path == BATCH_UPLOAD_PATH:
+            limit, max_request_bytes = config.MAX_BATCH_UPLOAD_BYTES, config.MAX_BATCH_UPLOAD_BYTES
+        else:
+            limit, max_request_bytes = config.MAX_UPLOAD_BYTES, MAX_UPLOAD_REQUEST_BYTES
+
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_request_bytes:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Upload exceeds {limit} bytes"},
+            )
+    return await call_next(request)
+
 # Configure CORS (Cross-Origin Resource Sharing)
 # This is crucial for allowing the Flutter Web app (running on a different port)
 # to communicate with this backend.
@@ -22,21 +81,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=[
+        "X-Next-Cursor", "X-Server-Time",                 # History paging
+        "Location", "Upload-Offset", "Upload-Length",     # Resumable uploads
+    ],
 )
 
 app.include_router(upload.router)
+app.include_router(resumable_upload.router)
 app.include_router(process.router)
 app.include_router(status.router)
 app.include_router(prediction.router)
 app.include_router(history.router)
+app.include_router(events.router)
+app.include_router(media_files.router)
+app.include_router(knowledge_base.router)
 
-# Mount uploads directory for static access
-# This allows the frontend to display uploaded images by accessing 
-# http://localhost:8000/uploads/{filename}
-if not os.path.exists("uploads"):
-    os.makedirs("uploads")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
+# Liveness: the process is up and serving. Never touches a dependency, so a
+# database outage doesn't get every instance restarted.
 @app.get("/health")
+@app.get("/health/live")
 def health():
     return {"status": "Backend running"}
+
+
+async def _check_database():
+    # Also fails while the schema hasn't been set up
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1 FROM media LIMIT 1"))
+
+
+# Readiness: this instance can take traffic (database reachable and set up,
+# uploads folder writable, model loaded). 503 with the failing checks otherwise.
+@app.get("/health/ready")
+async def ready():
+    checks = {}
+
+    try:
+        await asyncio.wait_for(_check_database(), config.READINESS_TIMEOUT)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {type(e).__name__}"
+
+    checks["uploads"] = "ok" if os.access(config.UPLOAD_DIR, os.W_OK) else "error: not writable"
+    checks["model"] = "ok" if model_loaded() else "error: not loaded"
+
+    is_ready = all(check == "ok" for check in checks.values())
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"status": "ready" if is_ready else "not ready", "checks": checks},
+    )
+
+
+if config.METRICS_ENABLED:
+    # Added last, so it is the outermost middleware and times everything below it
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, media_type=content_type)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, Integer, DateTime
+from datetime import datetime
+from app.models.base import Base
+
+
+# A stored file, keyed by the SHA-256 of its bytes.
+# Identical uploads share one Blob; ref_count is the number of Media rows using it.
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+
+    # Path relative to the uploads folder, e.g. "blobs/ab/cd/<sha256>.jpg"
+    file_path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
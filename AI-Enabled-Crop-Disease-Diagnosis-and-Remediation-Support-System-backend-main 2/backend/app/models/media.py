@@ -1,27 +1,90 @@
-from sqlalchemy import Column, String, DateTime
-from datetime import datetime
+import uuid
+
+from sqlalchemy import Column, String, DateTime, Enum, Float, Index, Uuid
+from datetime import datetime, timezone
 from app.models.base import Base
 
+# Every status a Media row can have, in pipeline order
+MEDIA_STATUSES = ("UPLOADED", "PROCESSING", "COMPLETED", "FAILED")
+# Statuses after which a Media row's diagnosis never changes again
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+# Statuses of rows still waiting for (or in) inference
+ACTIVE_STATUSES = ("UPLOADED", "PROCESSING")
+
+
+def canonical_media_id(value):
+    """
+    The stored form of a client-supplied media_id (lowercase, hyphenated UUID),
+    or None if it isn't a UUID.
+    """
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def stored_timestamp(value):
+    """
+    The stored form of a client-supplied datetime: naive UTC, like created_at
+    and updated_at. Values with an offset ("...Z", "+05:30") are converted.
+    """
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 
 class Media(Base):
     __tablename__ = "media"
 
-    media_id = Column(String, primary_key=True, index=True)
+    # Native uuid on PostgreSQL (16 bytes), 32 hex characters on SQLite.
+    # as_uuid=False: the application keeps passing media_ids around as strings.
+    media_id = Column(Uuid(as_uuid=False), primary_key=True)
     media_type = Column(String)
 
-    status = Column(String, default="UPLOADED")
+    # A PostgreSQL enum type (4 bytes); a CHECK constraint on SQLite
+    status = Column(
+        Enum(*MEDIA_STATUSES, name="media_status", create_constraint=True),
+        nullable=False,
+        default="UPLOADED",
+    )
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Bumped on every change; lets clients pull only what changed (/api/history?since=)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    
     # ⭐ NEW FIELDS
-    user_id = Column(String, index=True, nullable=True)
+    # Indexed through ix_media_user_id_created_at below
+    user_id = Column(String, nullable=True)
 
     # ⭐ NEW FIELDS (VERY IMPORTANT)
     # Result of the diagnosis (e.g., "Leaf Blight")
     result = Column(String, nullable=True)
-    # Confidence score of the diagnosis (e.g., "98%")
-    confidence = Column(String, nullable=True)
-    
+    # Confidence score of the diagnosis, from 0 to 1. The API returns it as a
+    # percentage string (e.g. "98%", see format_confidence in app/services/model.py).
+    confidence = Column(Float, nullable=True)
+
     # Filename of the stored image.
     # Frontend constructs the URL using this: BASE_URL + /uploads/ + file_path
     file_path = Column(String, nullable=True)
+
+    # SHA-256 of the file contents (see app/models/blob.py).
+    # Uploads with the same hash share one stored file and one diagnosis.
+    content_hash = Column(String(64), index=True, nullable=True)
+
+    __table_args__ = (
+        # Per-user history, newest first (see app/routes/history.py)
+        Index("ix_media_user_id_created_at", "user_id", "created_at"),
+        # Jobs not finished yet, oldest first (e.g. sweeps for rows stuck in
+        # PROCESSING). Partial: stays small however many rows are completed.
+        Index(
+            "ix_media_active_status_created_at", "status", "created_at",
+            postgresql_where=status.in_(ACTIVE_STATUSES),
+            sqlite_where=status.in_(ACTIVE_STATUSES),
+        ),
+        # Analytics over finished diagnoses ("leaf_blight above 0.8 confidence")
+        Index(
+            "ix_media_completed_result_confidence", "result", "confidence",
+            postgresql_where=status == "COMPLETED",
+            sqlite_where=status == "COMPLETED",
+        ),
+    )
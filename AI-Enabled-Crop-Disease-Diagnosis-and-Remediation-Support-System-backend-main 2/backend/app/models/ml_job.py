@@ -0,0 +1,45 @@
+from sqlalchemy import Column, DateTime, Enum, Index, Integer, String, Text, Uuid
+from datetime import datetime
+from app.models.base import Base
+
+# QUEUED: waiting for a worker (from available_at on)
+# RUNNING: claimed by lease_owner until lease_expires_at, extended by heartbeats
+# DEAD: gave up after ML_JOB_MAX_ATTEMPTS; kept for inspection (dead letters)
+# Finished jobs are deleted: the diagnosis itself lives on the Media row.
+ML_JOB_STATUSES = ("QUEUED", "RUNNING", "DEAD")
+
+
+# One diagnosis job of the database-backed queue (ML_EXECUTOR=db, see app/tasks/db_queue.py)
+class MlJob(Base):
+    __tablename__ = "ml_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    media_id = Column(Uuid(as_uuid=False), nullable=False, index=True)
+    # Absolute path of the image, as passed to enqueue_ml()
+    file_path = Column(String, nullable=False)
+
+    status = Column(
+        Enum(*ML_JOB_STATUSES, name="ml_job_status", create_constraint=True),
+        nullable=False,
+        default="QUEUED",
+    )
+    # Claims so far, including the current one
+    attempts = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Earliest time a QUEUED job may be claimed (pushed back after a failed attempt)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # Worker holding the job ("host:pid:random") and until when
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Claim order for new and retried jobs
+        Index("ix_ml_jobs_status_available_at", "status", "available_at"),
+        # Expired leases of crashed workers
+        Index("ix_ml_jobs_status_lease_expires_at", "status", "lease_expires_at"),
+    )
@@ -0,0 +1,123 @@
+import asyncio
+import json
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models.media import Media, TERMINAL_STATUSES, canonical_media_id
+from app.services.events import get_broker, media_event, media_topic, user_topic
+
+router = APIRouter(prefix="/api", tags=["Events"])
+
+# Comment line sent on idle SSE streams so proxies don't close them
+KEEPALIVE_SECONDS = 15
+
+
+async def _current_states(media_ids):
+    """Current status of each media_id, as events. Unknown IDs are left out."""
+    # A non-UUID can't be a stored media_id (and can't be bound to a uuid column)
+    media_ids = [media_id for media_id in media_ids if canonical_media_id(media_id)]
+    if not media_ids:
+        return []
+
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(Media.media_id, Media.status, Media.result, Media.confidence)
+            .where(Media.media_id.in_(media_ids))
+        )
+        return [media_event(*row) for row in rows]
+
+
+def _sse(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+
+# ✅ Server-Sent Events
+# Pushes a message every time a watched media changes status, in the same shape
+# as /api/prediction. Watch specific uploads with ?media_id=...&media_id=...
+# (the stream ends once all of them are COMPLETED/FAILED), or everything of a
+# user with ?user_id=... (the stream stays open).
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    media_id: List[str] = Query(None),
+    user_id: str = None,
+):
+    # Events carry the stored (lowercase) form of each ID
+    media_ids = {canonical_media_id(m) or m for m in media_id or []}
+    if not media_ids and not user_id:
+        raise HTTPException(status_code=400, detail="Pass media_id and/or user_id")
+
+    topics = [media_topic(m) for m in media_ids]
+    if user_id:
+        topics.append(user_topic(user_id))
+
+    async def event_stream():
+        async with get_broker().subscribe(topics) as subscription:
+            # Subscribe before reading the current state so a result committed
+            # in between is not missed
+            pending = set(media_ids)
+            states = await _current_states(list(media_ids))
+
+            for event in states:
+                yield _sse(event)
+                if event["status"] in TERMINAL_STATUSES:
+                    pending.discard(event["media_id"])
+
+            # IDs the database doesn't know will never get an event
+            known = {event["media_id"] for event in states}
+            for missing in media_ids - known:
+                yield _sse({"media_id": missing, "error": "Media not found"})
+                pending.discard(missing)
+
+            while user_id or pending:
+                if await request.is_disconnected():
+                    return
+
+                event = await subscription.get(KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield _sse(event)
+                if event["status"] in TERMINAL_STATUSES:
+                    pending.discard(event["media_id"])
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ✅ Long-poll fallback
+# For clients that can't keep an SSE stream open. Returns as soon as the media
+# reaches COMPLETED/FAILED, or its current state after `timeout` seconds.
+@router.get("/wait/{media_id}")
+async def wait_for_result(media_id: str, timeout: float = Query(25, ge=0, le=60)):
+    media_id = canonical_media_id(media_id)
+    if media_id is None:
+        return {"error": "Media not found"}
+
+    async with get_broker().subscribe([media_topic(media_id)]) as subscription:
+        states = await _current_states([media_id])
+        if not states:
+            return {"error": "Media not found"}
+
+        event = states[0]
+        deadline = asyncio.get_running_loop().time() + timeout
+
+        while event["status"] not in TERMINAL_STATUSES:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+
+            update = await subscription.get(remaining)
+            if update is None:
+                break
+            event = update
+
+        return event
@@ -1,34 +1,126 @@
-from fastapi import APIRouter
-from app.database import SessionLocal
-from app.models.media import Media
+import base64
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.database import get_async_db
+from app.models.media import Media, canonical_media_id, stored_timestamp
+from app.services.image_variants import variant_for
+from app.services.media_urls import media_url
+from app.services.model import format_confidence
 
 router = APIRouter(prefix="/api", tags=["History"])
 
+# Only the columns the history screen needs; no full ORM objects are built
+HISTORY_COLUMNS = (
+    Media.media_id,
+    Media.status,
+    Media.created_at,
+    Media.updated_at,
+    Media.result,
+    Media.confidence,
+    Media.file_path,
+)
+
+
+def encode_cursor(created_at, media_id):
+    raw = f"{created_at.isoformat()}|{media_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, media_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        if canonical_media_id(media_id) is None:
+            raise ValueError(media_id)
+        return datetime.fromisoformat(created_at), media_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/history")
-def get_history(user_id: str = None):
+async def get_history(
+    response: Response,
+    user_id: str = None,
+    limit: int = Query(config.HISTORY_PAGE_SIZE, ge=1),
+    cursor: str = None,
+    since: datetime = None,
+    size: int = Query(None, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    Fetch the history of all uploaded media and their diagnosis results.
-    Returns a list of records sorted by creation time (newest first).
+    Fetch the history of uploaded media and their diagnosis results,
+    sorted by creation time (newest first), one page at a time.
+
+    - limit: page size, capped at HISTORY_MAX_PAGE_SIZE.
+    - cursor: the X-Next-Cursor header of the previous page. Absent on the last page.
+    - since: only records changed after this time. Pass the X-Server-Time header
+      of the previous pull to fetch just the changes.
+    - size: width in pixels the client will display images at. file_path then
+      points to the smallest thumbnail at least that big instead of the original.
+
+    file_url is the image URL relative to the server (signed when
+    MEDIA_SIGNING_KEY is set, in which case clients must use it).
     """
-    db = SessionLocal()
-    try:
-        # Fetch all media records ordered by creation time (descending)
-        query = db.query(Media)
-        
-        # Filter by user_id if provided
-        if user_id:
-            query = query.filter(Media.user_id == user_id)
-            
-        history = query.order_by(Media.created_at.desc()).all()
-        return [
-            {
-                "media_id": m.media_id,
-                "status": m.status,
-                "created_at": str(m.created_at) if m.created_at else None,
-                "result": m.result,
-                "confidence": m.confidence,
-                "file_path": m.file_path
-            } for m in history
-        ]
-    finally:
-        db.close()
+    limit = min(limit, config.HISTORY_MAX_PAGE_SIZE)
+
+    # Taken before querying so nothing committed during the query is missed next time
+    response.headers["X-Server-Time"] = datetime.utcnow().isoformat()
+
+    query = select(*HISTORY_COLUMNS)
+
+    # Filter by user_id if provided
+    if user_id:
+        query = query.where(Media.user_id == user_id)
+
+    if since:
+        # Rows written before updated_at existed only have created_at
+        query = query.where(
+            func.coalesce(Media.updated_at, Media.created_at) > stored_timestamp(since)
+        )
+
+    # Keyset pagination on (created_at, media_id): seeks straight to the page
+    # through the (user_id, created_at) index instead of skipping OFFSET rows
+    if cursor:
+        cursor_created_at, cursor_media_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Media.created_at < cursor_created_at,
+                and_(Media.created_at == cursor_created_at, Media.media_id < cursor_media_id),
+            )
+        )
+
+    rows = (
+        await db.execute(
+            query.order_by(Media.created_at.desc(), Media.media_id.desc())
+            .limit(limit + 1)
+        )
+    ).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.media_id)
+
+    file_paths = [m.file_path for m in rows]
+    if size:
+        file_paths = await run_in_threadpool(
+            lambda: [variant_for(path, size) if path else path for path in file_paths]
+        )
+
+    return [
+        {
+            "media_id": m.media_id,
+            "status": m.status,
+            "created_at": str(m.created_at) if m.created_at else None,
+            "updated_at": str(m.updated_at) if m.updated_at else None,
+            "result": m.result,
+            "confidence": format_confidence(m.confidence),
+            "file_path": file_path,
+            "file_url": media_url(file_path) if file_path else None,
+        } for m, file_path in zip(rows, file_paths)
+    ]
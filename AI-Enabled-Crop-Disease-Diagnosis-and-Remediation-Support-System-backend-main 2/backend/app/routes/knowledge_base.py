@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.services.knowledge_base import DEFAULT_LANGUAGE, get_knowledge_base
+from app.services.result_cache import cached_json_response, not_modified
+
+router = APIRouter(prefix="/api/knowledge-base", tags=["Knowledge Base"])
+
+
+def _accepts_gzip(accept_encoding):
+    """True if an Accept-Encoding header allows gzip (q=0 forbids it, * stands for it)."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+
+# ✅ Knowledge Base Export
+# The whole catalog (or one language with ?lang=) in the CropModel JSON shape.
+# Served from the copy prepared at startup, gzipped when the client accepts it.
+# Clients keep the ETag and revalidate: a 304 costs a few bytes until the catalog
+# changes. For finer syncs, compare /manifest and fetch only changed crops.
+@router.get("")
+def export_knowledge_base(request: Request, lang: str = None):
+    export = get_knowledge_base().export(lang)
+    if export is None:
+        raise HTTPException(status_code=404, detail=f"No knowledge base for language {lang}")
+
+    headers = {"ETag": export.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if not_modified(request, export.etag):
+        return Response(status_code=304, headers=headers)
+
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=export.gzipped, media_type="application/json", headers=headers)
+
+    return Response(content=export.body, media_type="application/json", headers=headers)
+
+
+@router.get("/manifest")
+def knowledge_base_manifest(request: Request):
+    return cached_json_response(request, get_knowledge_base().manifest(), terminal=False)
+
+
+@router.get("/crops/{crop_id}")
+def knowledge_base_crop(crop_id: str, request: Request, lang: str = None):
+    crop = get_knowledge_base().crop(crop_id, lang)
+    if crop is None:
+        raise HTTPException(status_code=404, detail="Crop not found")
+    return cached_json_response(request, crop, terminal=False)
+
+
+# Diagnosis label -> symptoms and remedies, one entry per crop it affects
+@router.get("/diseases/{label}")
+def knowledge_base_disease(label: str, request: Request, lang: str = DEFAULT_LANGUAGE):
+    diseases = get_knowledge_base().diseases_for(label, lang)
+    if not diseases:
+        raise HTTPException(status_code=404, detail="Disease not found")
+    return cached_json_response(request, {"label": label, "diseases": diseases}, terminal=False)
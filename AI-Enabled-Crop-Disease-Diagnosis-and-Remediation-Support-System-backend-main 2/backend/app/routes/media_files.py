@@ -0,0 +1,116 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from app import config
+from app.services.image_variants import variant_for
+from app.services.media_urls import verify_media_signature
+from app.services.result_cache import not_modified
+
+router = APIRouter(tags=["Media"])
+
+# blobs/ab/cd/<sha256>.jpg and its thumbnails blobs/ab/cd/<sha256>.w256.jpg:
+# the name changes whenever the bytes do
+CONTENT_ADDRESSED = re.compile(
+    r"^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(?P<variant>\.w\d+)?\.[a-z]+$"
+)
+# Only images are public: any stored original (.jpg, .webp, .heic, .gif, ...),
+# not model inputs (.input.npy), partial writes (.part) or other internal files.
+# SVG is an image type too, but it can carry scripts.
+NOT_SERVED_TYPES = {"image/svg+xml"}
+# Missing from some systems' mime.types
+mimetypes.add_type("image/heic", ".heic")
+mimetypes.add_type("image/heif", ".heif")
+
+
+def _served_type(path):
+    """Content type of a servable image, or None."""
+    media_type = mimetypes.guess_type(path)[0]
+    if media_type and media_type.startswith("image/") and media_type not in NOT_SERVED_TYPES:
+        return media_type
+    return None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _resolve(path):
+    """Normalised path relative to UPLOAD_DIR, or 404 if it points outside of it."""
+    path = posixpath.normpath(path)
+    if path.startswith(("/", "..")) or "\\" in path or path == ".":
+        raise HTTPException(status_code=404, detail="Not Found")
+    return path
+
+
+def _validators(path, stat):
+    """(strong ETag, Cache-Control) of a stored file."""
+    match = CONTENT_ADDRESSED.match(path)
+    if match:
+        return f'"{match["sha256"]}{match["variant"] or ""}"', IMMUTABLE
+    # Legacy uploads (<media_id>.jpg) can be rewritten in place: revalidate
+    return (
+        f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+        f"public, max-age={config.MEDIA_CACHE_MAX_AGE}",
+    )
+
+
+# ✅ Uploaded Images
+# Serves what the frontend builds from file_path: BASE_URL + /uploads/ + file_path.
+# - ?size=N: the smallest stored thumbnail at least N pixels wide
+# - Content-addressed names are cached for a year (immutable); a strong ETag
+#   answers revalidations with 304
+# - Range requests (resumed or partial downloads) get 206 responses
+# - The file body is sent with sendfile by servers supporting the ASGI pathsend
+#   extension; under uvicorn it is streamed from a thread
+#
+# MEDIA_SIGNING_KEY: only signed URLs are served (see app/services/media_urls.py).
+# MEDIA_ACCEL_REDIRECT_PREFIX: the app only checks the request and sets headers;
+# the bytes are sent by nginx from an internal location, e.g.
+#
+#   location /protected-uploads/ {
+#       internal;
+#       alias /srv/crop/backend/uploads/;
+#       sendfile on;
+#   }
+#
+# so image downloads no longer hold an API worker while they transfer.
+@router.api_route("/uploads/{path:path}", methods=["GET", "HEAD"])
+def serve_upload(
+    path: str,
+    request: Request,
+    size: int = None,
+    exp: int = None,
+    sig: str = None,
+):
+    path = _resolve(path)
+
+    if config.MEDIA_SIGNING_KEY and not verify_media_signature(path, exp, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired media URL")
+
+    if size and size > 0:
+        path = variant_for(path, size, config.UPLOAD_DIR)
+
+    media_type = _served_type(path)
+    if media_type is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    full_path = os.path.join(config.UPLOAD_DIR, path)
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    etag, cache_control = _validators(path, stat)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if config.MEDIA_ACCEL_REDIRECT_PREFIX:
+        headers["X-Accel-Redirect"] = config.MEDIA_ACCEL_REDIRECT_PREFIX + path
+        return Response(media_type=media_type, headers=headers)
+
+    return FileResponse(full_path, media_type=media_type, headers=headers, stat_result=stat)
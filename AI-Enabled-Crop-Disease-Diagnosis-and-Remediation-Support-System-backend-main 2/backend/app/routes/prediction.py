@@ -1,30 +1,36 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models.media import Media
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.models.media import TERMINAL_STATUSES
+from app.services.knowledge_base import DEFAULT_LANGUAGE, get_knowledge_base
+from app.services.result_cache import get_media_snapshot, cached_json_response
 
 router = APIRouter(prefix="/api")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
+# `knowledge` lists the symptoms and remedies of the diagnosed disease from the
+# knowledge base (app/services/knowledge_base.py), in `lang` where translated.
 @router.get("/prediction/{media_id}")
-def get_prediction(media_id: str, db: Session = Depends(get_db)):
+async def get_prediction(
+    media_id: str,
+    request: Request,
+    lang: str = DEFAULT_LANGUAGE,
+    db: AsyncSession = Depends(get_async_db),
+):
 
-    media = db.query(Media).filter(Media.media_id == media_id).first()
+    media = await get_media_snapshot(db, media_id)
 
     if not media:
         return {"error": "Media not found"}
 
-    return {
-        "media_id": media.media_id,
-        "status": media.status,
-        "disease": media.result,
-        "confidence": media.confidence
-    }
+    return cached_json_response(
+        request,
+        {
+            "media_id": media["media_id"],
+            "status": media["status"],
+            "disease": media["result"],
+            "confidence": media["confidence"],
+            "knowledge": get_knowledge_base().diseases_for(media["result"], lang) if media["result"] else [],
+        },
+        terminal=media["status"] in TERMINAL_STATUSES,
+    )
@@ -1,7 +1,41 @@
 from fastapi import APIRouter
 
+from app import config
+from app.database import pool_stats
+from app.services.feature_store import get_feature_store
+from app.services.result_cache import cache_stats
+from app.tasks.job_queue import get_executor
+
 router = APIRouter(prefix="/api")
 
 @router.get("/process-test")
 def process_test():
     return {"message": "Process route working"}
+
+
+@router.get("/inference-stats")
+def inference_stats():
+    """
+    Batch fill and queue wait metrics of the in-process inference engine.
+    Only the batch executor collects them; other executors report just their name.
+    """
+    executor = get_executor()
+    stats = executor.stats() if hasattr(executor, "stats") else {}
+
+    store = get_feature_store()
+    if store:
+        stats["feature_store"] = store.stats()
+
+    return {"executor": config.ML_EXECUTOR, **stats}
+
+
+@router.get("/cache-stats")
+def result_cache_stats():
+    """Hit/miss counters of the result cache in front of status/prediction lookups."""
+    return cache_stats()
+
+
+@router.get("/db-pool-stats")
+def db_pool_stats():
+    """Connection pool usage and checkout wait times of the API and worker pools."""
+    return pool_stats()
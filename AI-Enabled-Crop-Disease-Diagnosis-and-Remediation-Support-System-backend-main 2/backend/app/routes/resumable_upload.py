@@ -0,0 +1,232 @@
+import base64
+import binascii
+import uuid
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app import config
+from app.database import get_async_db
+from app.models.media import Media, canonical_media_id
+from app.routes.upload import create_media
+from app.services.metrics import UPLOAD_BYTES
+from app.services.upload_sessions import (
+    create_session,
+    delete_session,
+    load_session,
+    maybe_collect_stale_sessions,
+    open_part,
+    received_upload,
+)
+
+router = APIRouter(prefix="/api", tags=["Resumable Uploads"])
+
+CHUNK_CONTENT_TYPE = "application/offset+octet-stream"
+
+# Upload IDs with a PATCH in progress in this process
+_busy = set()
+
+
+def _parse_metadata(header):
+    """Upload-Metadata header: comma-separated "key base64(value)" pairs."""
+    metadata = {}
+    if not header:
+        return metadata
+
+    for pair in header.split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts[0]:
+            continue
+        try:
+            value = base64.b64decode(parts[1]).decode() if len(parts) > 1 else ""
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail=f"Invalid Upload-Metadata value for {parts[0]}")
+        metadata[parts[0]] = value
+
+    return metadata
+
+
+def _offset_headers(session):
+    return {
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["length"]),
+        "Cache-Control": "no-store",
+    }
+
+
+async def _get_session(upload_id):
+    session = await run_in_threadpool(load_session, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+async def _finalize(db, session):
+    """Turn a complete session into a Media row. The session is kept if this fails."""
+    received = await run_in_threadpool(received_upload, session)
+    result = await create_media(
+        db,
+        received,
+        session["media_id"] or str(uuid.uuid4()),
+        session["user_id"],
+        session["content_type"],
+        session["filename"],
+    )
+    await run_in_threadpool(delete_session, session["upload_id"])
+    # Counted once, when finalized: a retried finalize (after a 429) isn't a new upload
+    UPLOAD_BYTES.labels("resumable").observe(received.size)
+    return result
+
+
+# ✅ Resumable Upload API (tus-style)
+# For large images on links that drop mid-upload. Instead of re-sending the
+# whole file, the client resumes from the last byte the server has.
+#
+#   POST   /api/uploads       Upload-Length + Upload-Metadata (base64 media_id,
+#                             user_id, filename, content_type, and upload_id
+#                             to resume) -> 201, Location
+#   HEAD   /api/uploads/{id}  -> Upload-Offset: bytes received so far
+#   PATCH  /api/uploads/{id}  Upload-Offset + body (application/offset+octet-stream)
+#                             -> bytes appended at that offset
+#   DELETE /api/uploads/{id}  abandon the upload
+#
+# The PATCH that delivers the last byte creates the Media row and returns the
+# same body as /upload-media. If that fails (e.g. 429), an empty PATCH at the
+# final offset retries it without re-sending anything.
+#
+# A POST that repeats an unfinished session's metadata and adds its upload_id
+# (e.g. after the client restarted, before it knew the offset) returns that
+# session. Without the upload_id a new session is always started: no one can
+# reach another client's upload through its media_id.
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    response: Response,
+    upload_length: int = Header(...),
+    upload_metadata: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    await run_in_threadpool(maybe_collect_stale_sessions)
+
+    if upload_length <= 0:
+        raise HTTPException(status_code=400, detail="Upload-Length must be positive")
+    if upload_length > config.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {config.MAX_UPLOAD_BYTES} bytes")
+
+    metadata = _parse_metadata(upload_metadata)
+    media_id = metadata.get("media_id") or None
+    if media_id:
+        media_id = canonical_media_id(media_id)
+        if media_id is None:
+            raise HTTPException(status_code=400, detail="media_id must be a UUID")
+
+    # Already uploaded (e.g. through /upload-media): nothing left to send
+    if media_id:
+        existing_status = await db.scalar(
+            select(Media.status).where(Media.media_id == media_id)
+        )
+        if existing_status:
+            response.status_code = 200
+            return {
+                "media_id": media_id,
+                "status": existing_status,
+                "message": "Media already exists (deduplicated)."
+            }
+
+    session, created = await run_in_threadpool(
+        create_session,
+        upload_length,
+        media_id,
+        metadata.get("user_id") or None,
+        metadata.get("filename"),
+        metadata.get("content_type"),
+        metadata.get("upload_id"),
+    )
+
+    if not created:
+        response.status_code = 200
+
+    location = f"/api/uploads/{session['upload_id']}"
+    response.headers.update(_offset_headers(session))
+    response.headers["Location"] = location
+    return {"upload_id": session["upload_id"], "location": location, "offset": session["offset"]}
+
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_offset(upload_id: str):
+    session = await _get_session(upload_id)
+    return Response(status_code=200, headers=_offset_headers(session))
+
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    content_type: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if content_type != CHUNK_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be {CHUNK_CONTENT_TYPE}")
+
+    # Two PATCHes appending to one file would interleave their bytes.
+    # Only guarded within a process: clients send one chunk at a time anyway.
+    if upload_id in _busy:
+        raise HTTPException(status_code=409, detail="Another request is writing to this upload")
+
+    _busy.add(upload_id)
+    try:
+        session = await _get_session(upload_id)
+
+        if upload_offset != session["offset"]:
+            raise HTTPException(
+                status_code=409,
+                detail="Upload-Offset does not match the bytes received",
+                headers=_offset_headers(session),
+            )
+
+        remaining = session["length"] - session["offset"]
+        too_long = False
+        out = await run_in_threadpool(open_part, upload_id)
+        try:
+            async for chunk in request.stream():
+                if len(chunk) > remaining:
+                    chunk = chunk[:remaining]
+                    too_long = True
+
+                await run_in_threadpool(out.write, chunk)
+                session["offset"] += len(chunk)
+                remaining -= len(chunk)
+
+                if too_long:
+                    break
+        except ClientDisconnect:
+            # Keep what arrived; the client resumes from the new offset
+            pass
+        finally:
+            await run_in_threadpool(out.close)
+
+        if too_long:
+            raise HTTPException(
+                status_code=400,
+                detail="Body goes past Upload-Length",
+                headers=_offset_headers(session),
+            )
+
+        if session["offset"] < session["length"]:
+            return Response(status_code=204, headers=_offset_headers(session))
+
+        result = await _finalize(db, session)
+        return JSONResponse(result, headers=_offset_headers(session))
+    finally:
+        _busy.discard(upload_id)
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str):
+    await _get_session(upload_id)
+    await run_in_threadpool(delete_session, upload_id)
+    return Response(status_code=204)
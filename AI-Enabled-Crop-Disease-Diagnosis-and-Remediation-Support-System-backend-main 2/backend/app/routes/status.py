@@ -1,30 +1,106 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List
 
-from app.database import SessionLocal
-from app.models.media import Media
-
-router = APIRouter(prefix="/api", tags=["Media Status"])
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import config
+from app.database import get_async_db
+from app.models.media import Media, TERMINAL_STATUSES, canonical_media_id, stored_timestamp
+from app.services.model import format_confidence
+from app.services.result_cache import get_media_snapshot, cached_json_response
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+router = APIRouter(prefix="/api", tags=["Media Status"])
 
 
 @router.get("/media-status/{media_id}")
-def get_media_status(media_id: str, db: Session = Depends(get_db)):
+async def get_media_status(media_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
 
-    media = db.query(Media).filter(Media.media_id == media_id).first()
+    media = await get_media_snapshot(db, media_id)
 
     if not media:
         return {"error": "Media not found"}
 
+    return cached_json_response(
+        request,
+        {
+            "media_id": media["media_id"],
+            "status": media["status"],
+            "uploaded_at": media["created_at"]
+        },
+        terminal=media["status"] in TERMINAL_STATUSES,
+    )
+
+
+# ✅ Bulk Status API
+# Used after reconnecting to reconcile the offline queue in a few round trips
+# instead of one request per submission. Accepts up to BULK_STATUS_MAX_IDS IDs
+# and resolves them with chunked IN (...) queries.
+#
+# With `since` (the server_time of the previous call), only media changed after
+# it are returned; unchanged ones are left out of `results` entirely.
+@router.post("/media-status/bulk")
+async def get_bulk_media_status(
+    media_ids: List[str] = Body(..., embed=True),
+    since: datetime = Body(None, embed=True),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if len(media_ids) > config.BULK_STATUS_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.BULK_STATUS_MAX_IDS} media_ids per request",
+        )
+
+    since = stored_timestamp(since)
+
+    # Taken before querying so nothing committed during the query is missed next time
+    server_time = datetime.utcnow()
+
+    unique_ids = list(dict.fromkeys(media_ids))
+    chunk_size = config.BULK_STATUS_CHUNK_SIZE
+    results = {}
+    found = set()
+
+    # Stored form -> the ID as the client sent it. Non-UUIDs can't exist: missing.
+    requested = {}
+    for media_id in unique_ids:
+        canonical = canonical_media_id(media_id)
+        if canonical:
+            requested.setdefault(canonical, media_id)
+    lookup_ids = list(requested)
+
+    for start in range(0, len(lookup_ids), chunk_size):
+        chunk = lookup_ids[start:start + chunk_size]
+        rows = await db.execute(
+            select(
+                Media.media_id,
+                Media.status,
+                Media.result,
+                Media.confidence,
+                Media.created_at,
+                Media.updated_at,
+            )
+            .where(Media.media_id.in_(chunk))
+        )
+
+        for row in rows:
+            media_id = requested[row.media_id]
+            found.add(media_id)
+
+            changed_at = row.updated_at or row.created_at
+            if since and changed_at and changed_at <= since:
+                continue
+
+            results[media_id] = {
+                "status": row.status,
+                "disease": row.result,
+                "confidence": format_confidence(row.confidence),
+                "updated_at": changed_at,
+            }
+
     return {
-        "media_id": media.media_id,
-        "status": media.status,
-        "uploaded_at": media.created_at
+        "results": results,
+        "missing": [media_id for media_id in unique_ids if media_id not in found],
+        "server_time": server_time,
     }
@@ -1,26 +1,120 @@
+import asyncio
+import json
 import os
 import uuid
+from typing import List
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Response
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from app.database import SessionLocal
-from app.models.media import Media
-from app.tasks.ml_task import process_ml
+from app import config
+
+from app.database import get_async_db
+from app.models.media import Media, canonical_media_id
+from app.services.storage_service import (
+    receive_upload_async,
+    store_blob,
+    release_blob,
+    find_cached_diagnosis,
+    safe_extension,
+    UploadTooLargeError,
+)
+from app.services.image_variants import create_variants
+from app.services.metrics import UPLOAD_BYTES, UPLOAD_STAGE_SECONDS
+from app.tasks.job_queue import enqueue_ml, enqueue_ml_batch, QueueFullError
 
 router = APIRouter(prefix="/api", tags=["Media"])
 
-UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+UPLOAD_FOLDER = config.UPLOAD_DIR
+
+
+async def _media_status(db, media_id):
+    return await db.scalar(select(Media.status).where(Media.media_id == media_id))
+
 
+async def create_media(db, received, media_id, user_id, content_type, filename):
+    """
+    Store a fully received upload and create its Media row, then queue it for ML.
+    Shared by /upload-media and resumable uploads (app/routes/resumable_upload.py).
+    Returns the upload response; raises HTTPException(429) if the ML queue is full.
+    """
+    # The blob helpers are shared with sync code; run_sync runs them on this session
+    blob, created = await db.run_sync(store_blob, received, safe_extension(filename))
+    file_path = os.path.join(UPLOAD_FOLDER, blob.file_path)
+
+    # Decode once now: thumbnails for the app, pre-resized input for the model
+    if created:
+        try:
+            with UPLOAD_STAGE_SECONDS.labels("variants").time():
+                await run_in_threadpool(create_variants, file_path)
+        except Exception:
+            # No Media row will reference the blob: don't leak it
+            await db.run_sync(release_blob, blob.sha256)
+            raise
+
+    # Same content already diagnosed -> reuse that result instead of a second ML run
+    cached = await db.run_sync(find_cached_diagnosis, blob.sha256)
+
+    # save metadata
+    media = Media(
+        media_id=media_id,
+        media_type=content_type,
+        status="COMPLETED" if cached else "UPLOADED",
+        file_path=blob.file_path,  # Path relative to uploads/
+        user_id=user_id,           # Store the user ID
+        content_hash=blob.sha256,
+        result=cached.result if cached else None,
+        confidence=cached.confidence if cached else None,
+    )
 
-# ✅ DB Dependency
-def get_db():
-    db = SessionLocal()
+    db.add(media)
     try:
-        yield db
-    finally:
-        db.close()
+        with UPLOAD_STAGE_SECONDS.labels("db_commit").time():
+            await db.commit()
+    except IntegrityError:
+        # A concurrent retry with the same media_id got there first
+        await db.rollback()
+        await db.run_sync(release_blob, blob.sha256)
+        existing_status = await _media_status(db, media_id)
+        return {
+            "media_id": media_id,
+            "status": existing_status or "UPLOADED",
+            "message": "Media already exists (deduplicated)."
+        }
+
+    if cached:
+        return {
+            "media_id": media_id,
+            "status": "COMPLETED",
+            "message": "Identical image already diagnosed. Reused the existing result."
+        }
+
+    # ⭐ Trigger ML asynchronously
+    # The job queue returns immediately; the client polls status/prediction as before.
+    try:
+        # Submitting may talk to the broker (Celery), so keep it off the event loop
+        with UPLOAD_STAGE_SECONDS.labels("enqueue").time():
+            await run_in_threadpool(enqueue_ml, media_id, file_path)
+    except QueueFullError:
+        # Undo the upload so the client's retry (same media_id) is not deduplicated
+        # into a row that will never be processed.
+        await db.delete(media)
+        await db.commit()
+        await db.run_sync(release_blob, blob.sha256)
+        raise HTTPException(
+            status_code=429,
+            detail="ML queue is full. Please retry later.",
+            headers={"Retry-After": "5"},
+        )
+
+    return {
+        "media_id": media_id,
+        "status": "UPLOADED",
+        "message": "File uploaded. ML processing started."
+    }
 
 
 # ✅ Upload API
@@ -29,57 +123,243 @@ def get_db():
 # This ensures that when the device comes online and syncs, we can de-duplicate uploads
 # if the network flakes out and retries happen.
 @router.post("/upload-media")
-def upload_media(
+async def upload_media(
     file: UploadFile = File(...),
     media_id: str = Form(None),  # Optional client-generated ID from offline mode
     user_id: str = Form(None),   # Optional user ID from client
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # If client provides an ID (Offline Sync), use it. Otherwise, generate one (Online Direct).
     if media_id:
+        # Stored as a UUID, so compare (and return) its canonical form
+        media_id = canonical_media_id(media_id)
+        if media_id is None:
+            raise HTTPException(status_code=400, detail="media_id must be a UUID")
+
         # Check for existing media with this ID (Deduplication Logic)
         # This prevents processing the same image twice if the client retries the upload.
-        existing_media = db.query(Media).filter(Media.media_id == media_id).first()
-        if existing_media:
+        existing_status = await _media_status(db, media_id)
+        if existing_status:
             return {
                 "media_id": media_id,
-                "status": existing_media.status,
+                "status": existing_status,
                 "message": "Media already exists (deduplicated)."
             }
     else:
         # Standard online upload flow
         media_id = str(uuid.uuid4())
 
-    file_extension = file.filename.split(".")[-1]
-    filename = f"{media_id}.{file_extension}"
+    # save file locally, streamed in chunks (never the whole image in memory).
+    # Files are content-addressed: if these exact bytes were uploaded before,
+    # the existing file is reused and nothing new is written.
+    try:
+        with UPLOAD_STAGE_SECONDS.labels("receive").time():
+            received = await receive_upload_async(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    UPLOAD_BYTES.labels("single").observe(received.size)
 
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    return await create_media(
+        db, received, media_id, user_id, file.content_type, file.filename
+    )
 
-    # save file locally
-    with open(file_path, "wb") as buffer:
-        buffer.write(file.file.read())
 
-    # save metadata
-    media = Media(
-        media_id=media_id,
-        media_type=file.content_type,
-        status="UPLOADED",
-        file_path=filename,  # Store just the filename, we know it's in uploads/
-        user_id=user_id      # Store the user ID
+def _parse_batch_items(items, file_count, default_user_id):
+    """Per-file metadata from the `items` form field, one entry per file."""
+    if items is None:
+        entries = [{}] * file_count
+    else:
+        try:
+            entries = json.loads(items)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="items must be a JSON array")
+
+        if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+            raise HTTPException(status_code=400, detail="items must be a JSON array of objects")
+        if len(entries) != file_count:
+            raise HTTPException(status_code=400, detail="items must have one entry per file")
+
+    # Valid IDs in their stored form; invalid ones are kept as sent and rejected per file
+    return [
+        (
+            canonical_media_id(entry["media_id"]) or entry["media_id"] if entry.get("media_id") else None,
+            entry.get("user_id") or default_user_id,
+        )
+        for entry in entries
+    ]
+
+
+def _batch_error(media_id, status_code, detail):
+    return {"media_id": media_id, "error": detail, "status_code": status_code}
+
+
+# ✅ Batch Upload API
+# Lets the offline queue be flushed in one request instead of one per submission.
+# Files are sent as repeated `files` parts; per-file metadata goes in `items`,
+# a JSON array in the same order: [{"media_id": "...", "user_id": "..."}, ...].
+# `user_id` applies to every file without its own.
+#
+# Each file behaves like a single /upload-media call (deduplicated by media_id
+# and by content, rejected if too large or the ML queue is full), so the response
+# has one result per file, in order. Failed files carry `error` and the HTTP
+# status a single upload would have returned; only those need to be retried.
+@router.post("/upload-media/batch")
+async def upload_media_batch(
+    response: Response,
+    files: List[UploadFile] = File(...),
+    items: str = Form(None),
+    user_id: str = Form(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if len(files) > config.BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.BATCH_UPLOAD_MAX_FILES} files per request",
+        )
+
+    entries = _parse_batch_items(items, len(files), user_id)
+    results = [None] * len(files)
+
+    # Deduplication: one query for every client-supplied ID
+    client_ids = [media_id for media_id, _ in entries if media_id and canonical_media_id(media_id)]
+    existing = {}
+    if client_ids:
+        existing = dict(
+            (await db.execute(
+                select(Media.media_id, Media.status).where(Media.media_id.in_(client_ids))
+            )).all()
+        )
+
+    accepted = []  # (index, media_id, user_id, file)
+    seen = set()
+    for index, ((media_id, owner), file) in enumerate(zip(entries, files)):
+        if media_id and canonical_media_id(media_id) is None:
+            results[index] = _batch_error(media_id, 400, "media_id must be a UUID")
+        elif media_id in existing:
+            results[index] = {
+                "media_id": media_id,
+                "status": existing[media_id],
+                "message": "Media already exists (deduplicated)."
+            }
+        elif media_id in seen:
+            results[index] = _batch_error(media_id, 400, "Duplicate media_id in batch")
+        else:
+            media_id = media_id or str(uuid.uuid4())
+            seen.add(media_id)
+            accepted.append((index, media_id, owner, file))
+
+    # Stream every file into the blob store, one at a time
+    stored = []  # (index, row, blob)
+    new_blob_paths = []
+    for index, media_id, owner, file in accepted:
+        try:
+            with UPLOAD_STAGE_SECONDS.labels("receive").time():
+                received = await receive_upload_async(file)
+        except UploadTooLargeError as e:
+            results[index] = _batch_error(media_id, 413, str(e))
+            continue
+        UPLOAD_BYTES.labels("batch").observe(received.size)
+
+        blob, created = await db.run_sync(store_blob, received, safe_extension(file.filename))
+        if created:
+            new_blob_paths.append(os.path.join(UPLOAD_FOLDER, blob.file_path))
+        stored.append((index, {
+            "media_id": media_id,
+            "media_type": file.content_type,
+            "status": "UPLOADED",
+            "file_path": blob.file_path,
+            "user_id": owner,
+            "content_hash": blob.sha256,
+            "result": None,
+            "confidence": None,
+        }, blob))
+
+    if not stored:
+        return {"results": results}
+
+    # Thumbnails and model inputs of the new images, decoded in parallel
+    try:
+        with UPLOAD_STAGE_SECONDS.labels("variants").time():
+            await asyncio.gather(*[run_in_threadpool(create_variants, path) for path in new_blob_paths])
+    except Exception:
+        for _, _, blob in stored:
+            await db.run_sync(release_blob, blob.sha256)
+        raise
+
+    # Content already diagnosed -> reuse those results (one query for all hashes)
+    cached = {}
+    cached_rows = await db.execute(
+        select(Media.content_hash, Media.result, Media.confidence).where(
+            Media.content_hash.in_({row["content_hash"] for _, row, _ in stored}),
+            Media.status == "COMPLETED",
+        )
     )
+    for content_hash, result, confidence in cached_rows:
+        cached.setdefault(content_hash, (result, confidence))
 
-    db.add(media)
-    db.commit()
+    for _, row, _ in stored:
+        if row["content_hash"] in cached:
+            row["status"] = "COMPLETED"
+            row["result"], row["confidence"] = cached[row["content_hash"]]
 
-    # ⭐ Trigger ML asynchronously
-    # ⭐ Trigger ML synchronously
+    # All Media rows in one INSERT
     try:
-        process_ml(media_id, file_path)
-    except Exception as e:
-        print(f"Error processing ML: {e}")
+        with UPLOAD_STAGE_SECONDS.labels("db_commit").time():
+            await db.execute(insert(Media), [row for _, row, _ in stored])
+            await db.commit()
+        inserted = stored
+    except IntegrityError:
+        # A concurrent retry inserted some of these IDs first.
+        # Fall back to row-by-row inserts to find out which ones.
+        await db.rollback()
+        inserted = []
+        for index, row, blob in stored:
+            try:
+                await db.execute(insert(Media), [row])
+                await db.commit()
+                inserted.append((index, row, blob))
+            except IntegrityError:
+                await db.rollback()
+                await db.run_sync(release_blob, blob.sha256)
+                results[index] = {
+                    "media_id": row["media_id"],
+                    "status": await _media_status(db, row["media_id"]) or "UPLOADED",
+                    "message": "Media already exists (deduplicated)."
+                }
 
-    return {
-        "media_id": media_id,
-        "status": "UPLOADED",
-        "message": "File uploaded. ML processing started."
-    }
+    # ⭐ Trigger ML for the whole batch at once
+    jobs = [
+        (row["media_id"], os.path.join(UPLOAD_FOLDER, blob.file_path))
+        for _, row, blob in inserted if row["status"] == "UPLOADED"
+    ]
+    rejected = set()
+    if jobs:
+        with UPLOAD_STAGE_SECONDS.labels("enqueue").time():
+            rejected = set(await run_in_threadpool(enqueue_ml_batch, jobs))
+
+    if rejected:
+        # Undo these uploads so the client's retry is not deduplicated
+        # into rows that will never be processed.
+        await db.execute(delete(Media).where(Media.media_id.in_(rejected)))
+        await db.commit()
+        response.headers["Retry-After"] = "5"
+
+    for index, row, blob in inserted:
+        media_id = row["media_id"]
+        if media_id in rejected:
+            await db.run_sync(release_blob, blob.sha256)
+            results[index] = _batch_error(media_id, 429, "ML queue is full. Please retry later.")
+        elif row["status"] == "COMPLETED":
+            results[index] = {
+                "media_id": media_id,
+                "status": "COMPLETED",
+                "message": "Identical image already diagnosed. Reused the existing result."
+            }
+        else:
+            results[index] = {
+                "media_id": media_id,
+                "status": "UPLOADED",
+                "message": "File uploaded. ML processing started."
+            }
+
+    return {"results": results}
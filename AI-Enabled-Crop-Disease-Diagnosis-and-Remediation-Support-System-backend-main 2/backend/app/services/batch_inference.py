@@ -0,0 +1,254 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from app.database import WorkerSessionLocal
+from app.models.media import Media
+from app.services.events import publish_media_update
+from app.services.feature_store import load_model_input
+from app.services.metrics import ML_BATCH_SIZE, ML_JOBS, ML_QUEUE_WAIT, ML_STAGE_SECONDS
+from app.services.model import get_model
+from app.services.result_cache import invalidate_media
+
+
+# Micro-batching Inference Engine
+# Coalesces concurrent diagnosis jobs into batches so a sync burst of many
+# photos costs a few forward passes instead of one per photo.
+#
+# A single collector thread takes jobs off the queue until it has
+# max_batch_size of them or the oldest one has waited max_wait_ms. The batch
+# is then decoded in parallel, run through the model as one NumPy array and
+# written back in one transaction.
+#
+# The database-backed queue (app/tasks/db_queue.py) claims its batches itself
+# and hands them to run_batch() directly, without the collector thread.
+
+
+class InferenceJob:
+
+    def __init__(self, media_id, file_path, enqueued_at=None):
+        self.media_id = media_id
+        self.file_path = file_path
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        self.future = Future()
+
+
+class BatchInferenceEngine:
+
+    def __init__(self, max_batch_size, max_wait_ms, decode_workers, job_timeout=None, collect=True):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.job_timeout = job_timeout
+
+        self._queue = queue.Queue()
+        self._decode_pool = ThreadPoolExecutor(
+            max_workers=decode_workers, thread_name_prefix="ml-decode"
+        )
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "failed_items": 0,
+            "last_batch_size": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+        }
+
+        self._stopped = threading.Event()
+        self._collector = None
+        if collect:
+            self._collector = threading.Thread(
+                target=self._collect_loop, name="ml-batcher", daemon=True
+            )
+            self._collector.start()
+
+    def submit(self, media_id, file_path):
+        """Queue one image. The returned Future resolves once its result is committed."""
+        job = InferenceJob(media_id, file_path)
+        self._queue.put(job)
+        return job.future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+
+        batches = snapshot["batches"]
+        items = snapshot["items"]
+        snapshot["queue_depth"] = self.queue_depth()
+        snapshot["max_batch_size"] = self.max_batch_size
+        snapshot["avg_batch_size"] = items / batches if batches else 0.0
+        # Fraction of batch capacity actually used (1.0 = every batch was full)
+        snapshot["avg_batch_fill"] = (
+            items / (batches * self.max_batch_size) if batches else 0.0
+        )
+        snapshot["avg_queue_wait_seconds"] = (
+            snapshot["queue_wait_seconds_total"] / items if items else 0.0
+        )
+        return snapshot
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._collector:
+            self._collector.join(timeout=self.max_wait + 1)
+        self._decode_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _collect_loop(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            flush_at = first.enqueued_at + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = flush_at - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        # Past the wait window: still take whatever is already queued
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                print(f"Error processing ML batch: {e}")
+                self.mark_failed([job.media_id for job in batch])
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+    def run_batch(self, batch):
+        """
+        Diagnose a list of InferenceJob and commit the results. Images that can't be
+        decoded, and every image of a batch that ran past job_timeout, are marked
+        FAILED. Any other error is raised with the rows left as they were;
+        the caller decides whether to retry or mark_failed() them.
+        """
+        started = time.monotonic()
+        deadline = started + self.job_timeout if self.job_timeout else None
+        media_ids = [job.media_id for job in batch]
+
+        db = WorkerSessionLocal()
+        user_ids = {}
+
+        try:
+            user_ids = dict(
+                db.query(Media.media_id, Media.user_id).filter(Media.media_id.in_(media_ids))
+            )
+            db.query(Media).filter(Media.media_id.in_(media_ids)).update(
+                {"status": "PROCESSING"}, synchronize_session=False
+            )
+            db.commit()
+            for media_id, user_id in user_ids.items():
+                invalidate_media(media_id)
+                publish_media_update(media_id, user_id, "PROCESSING")
+
+            images = list(self._decode_pool.map(self._decode, batch))
+
+            ready = [(job, image) for job, image in zip(batch, images) if image is not None]
+            updates = [
+                {"media_id": job.media_id, "status": "FAILED"}
+                for job, image in zip(batch, images) if image is None
+            ]
+
+            if ready:
+                with ML_STAGE_SECONDS.labels("forward").time():
+                    predictions = get_model().predict(np.stack([image for _, image in ready]))
+
+                timed_out = deadline is not None and time.monotonic() > deadline
+
+                for (job, _), (label, confidence) in zip(ready, predictions):
+                    if timed_out:
+                        updates.append({"media_id": job.media_id, "status": "FAILED"})
+                    else:
+                        updates.append({
+                            "media_id": job.media_id,
+                            "status": "COMPLETED",
+                            "result": label,
+                            "confidence": float(confidence),
+                        })
+
+            # All results of the batch land in a single transaction
+            with ML_STAGE_SECONDS.labels("db_write").time():
+                db.bulk_update_mappings(Media, updates)
+                db.commit()
+        except Exception:
+            db.rollback()
+            ML_JOBS.labels("error").inc(len(batch))
+            raise
+        finally:
+            db.close()
+
+        for update in updates:
+            invalidate_media(update["media_id"])
+            publish_media_update(
+                update["media_id"],
+                user_ids.get(update["media_id"]),
+                update["status"],
+                update.get("result"),
+                update.get("confidence"),
+            )
+
+        failed = sum(1 for update in updates if update["status"] == "FAILED")
+        self._record_batch(batch, started, failed)
+        print(f"ML BATCH COMPLETED: {len(batch)} items, {failed} failed")
+
+        for job in batch:
+            job.future.set_result(None)
+
+    def mark_failed(self, media_ids):
+        """
+        Never leave rows stuck in PROCESSING after a batch failed.
+        A result already written (e.g. by another worker holding the job) is kept.
+        """
+        db = WorkerSessionLocal()
+        try:
+            unfinished = (Media.media_id.in_(media_ids), Media.status != "COMPLETED")
+            user_ids = dict(db.query(Media.media_id, Media.user_id).filter(*unfinished))
+            db.query(Media).filter(*unfinished).update(
+                {"status": "FAILED"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        for media_id in user_ids:
+            invalidate_media(media_id)
+            publish_media_update(media_id, user_ids.get(media_id), "FAILED")
+
+    def _decode(self, job):
+        try:
+            return load_model_input(job.media_id, job.file_path)
+        except Exception as e:
+            print(f"Could not decode image for {job.media_id}: {e}")
+            return None
+
+    def _record_batch(self, batch, started, failed):
+        waits = [started - job.enqueued_at for job in batch]
+
+        ML_BATCH_SIZE.observe(len(batch))
+        for wait in waits:
+            ML_QUEUE_WAIT.observe(wait)
+        ML_JOBS.labels("completed").inc(len(batch) - failed)
+        ML_JOBS.labels("failed").inc(failed)
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["failed_items"] += failed
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["queue_wait_seconds_total"] += sum(waits)
+            self._stats["queue_wait_seconds_max"] = max(
+                self._stats["queue_wait_seconds_max"], *waits
+            )
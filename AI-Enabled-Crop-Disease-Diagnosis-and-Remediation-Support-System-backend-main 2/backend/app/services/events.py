@@ -0,0 +1,173 @@
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from app import config
+from app.services.model import format_confidence
+
+
+# Result Notifications
+# The ML pipeline publishes an event whenever a Media row changes status.
+# Clients waiting on /api/events (SSE) or /api/wait (long-poll) get it pushed
+# instead of polling /api/prediction in a loop.
+#
+# Events go to two topics: one per media_id and one per user_id.
+# The broker is in-process by default; EVENTS_BACKEND=redis swaps it for Redis
+# pub/sub so events cross worker processes.
+
+
+def media_topic(media_id):
+    return f"media:{media_id}"
+
+
+def user_topic(user_id):
+    return f"user:{user_id}"
+
+
+class _QueueSubscription:
+
+    def __init__(self, queue):
+        self._queue = queue
+
+    async def get(self, timeout):
+        """Next event, or None if nothing arrives within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """
+    Pub/sub inside one process. publish() is called from ML worker threads,
+    so events are handed to each subscriber's event loop thread-safely.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # topic -> set of (loop, asyncio.Queue)
+
+    def publish(self, topic, event):
+        with self._lock:
+            targets = list(self._subscribers.get(topic, ()))
+
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Subscriber's loop already closed
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, topics):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+
+        with self._lock:
+            for topic in topics:
+                self._subscribers.setdefault(topic, set()).add(entry)
+
+        try:
+            yield _QueueSubscription(entry[1])
+        finally:
+            with self._lock:
+                for topic in topics:
+                    subscribers = self._subscribers.get(topic)
+                    if subscribers is not None:
+                        subscribers.discard(entry)
+                        if not subscribers:
+                            del self._subscribers[topic]
+
+
+class _RedisSubscription:
+
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def get(self, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+
+            message = await self._pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=remaining
+            )
+            if message is not None:
+                return json.loads(message["data"])
+
+
+class RedisBroker:
+    """Pub/sub over Redis, shared by every worker process."""
+
+    def __init__(self, url):
+        # Imported here so the in-process broker never needs the redis package
+        import redis
+        import redis.asyncio
+
+        self._publisher = redis.Redis.from_url(url)
+        self._subscriber = redis.asyncio.Redis.from_url(url)
+
+    def publish(self, topic, event):
+        self._publisher.publish(topic, json.dumps(event))
+
+    @asynccontextmanager
+    async def subscribe(self, topics):
+        pubsub = self._subscriber.pubsub()
+        await pubsub.subscribe(*topics)
+
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if config.EVENTS_BACKEND == "redis":
+                    _broker = RedisBroker(config.REDIS_URL)
+                elif config.EVENTS_BACKEND == "memory":
+                    _broker = InProcessBroker()
+                else:
+                    raise ValueError(f"Unknown EVENTS_BACKEND: {config.EVENTS_BACKEND}")
+
+    return _broker
+
+
+def media_event(media_id, status, result=None, confidence=None):
+    # Same shape as the /api/prediction response; confidence is the stored 0-1 float
+    return {
+        "media_id": media_id,
+        "status": status,
+        "disease": result,
+        "confidence": format_confidence(confidence),
+    }
+
+
+def publish_media_update(media_id, user_id, status, result=None, confidence=None):
+    """
+    Notify subscribers that a Media row changed. Call after the change is committed.
+    Never raises: a notification failure must not fail the ML job, clients can
+    still fall back to polling.
+    """
+    event = media_event(media_id, status, result, confidence)
+
+    try:
+        broker = get_broker()
+        broker.publish(media_topic(media_id), event)
+        if user_id:
+            broker.publish(user_topic(user_id), event)
+    except Exception as e:
+        print(f"Error publishing event for {media_id}: {e}")
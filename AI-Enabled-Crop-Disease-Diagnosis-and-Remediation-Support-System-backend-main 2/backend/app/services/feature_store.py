@@ -0,0 +1,230 @@
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+
+from app import config
+from app.services.metrics import ML_STAGE_SECONDS
+from app.services.model import load_pixels, normalize
+
+
+# Feature Store
+# Optional (FEATURE_STORE_ENABLED). Keeps the decoded, resized model input of
+# every diagnosed image, so re-running inference (e.g. re-scoring the archive
+# with a new model) reads arrays instead of decoding JPEGs.
+#
+# Inputs are stored as uint8 rows of append-only shards in FEATURE_STORE_DIR:
+#   shard-<created>-<pid>-<seq>.npy  a regular .npy of shape (FEATURE_STORE_SHARD_ROWS, H, W, 3)
+#   shard-<created>-<pid>-<seq>.idx  "media_id<TAB>row" per line, appended after the row is written
+# Only the process that created a shard writes to it, so no cross-process locking
+# is needed. Readers open shards with numpy memmaps and learn about rows written
+# by other processes by re-reading the tail of the .idx files.
+
+
+class _ShardWriter:
+
+    def __init__(self, name, array, index_file):
+        self.name = name
+        self.array = array
+        self.index_file = index_file
+        self.next_row = 0
+
+
+class FeatureStore:
+
+    def __init__(self, directory, shard_rows, refresh_seconds):
+        self.directory = directory
+        self.shard_rows = shard_rows
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.Lock()
+        self._index = {}          # media_id -> (shard name, row)
+        self._index_offsets = {}  # .idx path -> bytes already read
+        self._readers = {}        # shard name -> read-only memmap
+        self._last_refresh = 0.0
+        self._writer = None
+        self._shard_seq = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._refresh()
+
+    def get(self, media_id):
+        """uint8 model input of a media as a memmap view, or None if it isn't stored."""
+        with self._lock:
+            location = self._index.get(media_id)
+            if location is None and time.monotonic() - self._last_refresh >= self.refresh_seconds:
+                self._refresh()
+                location = self._index.get(media_id)
+
+            if location is None:
+                return None
+
+            shard, row = location
+            # After a crash the .idx can name rows the shard never got to disk;
+            # they count as missing, so the image is decoded (and stored) again
+            reader = self._reader(shard)
+            if reader is None:
+                self._forget(shard)
+                return None
+            if row >= len(reader):
+                del self._index[media_id]
+                return None
+
+            return reader[row]
+
+    def put(self, media_id, pixels):
+        """Append a media's uint8 model input. A media that is already stored is skipped."""
+        with self._lock:
+            if media_id in self._index:
+                return
+
+            writer = self._writer
+            if writer is None or writer.next_row >= self.shard_rows:
+                writer = self._open_shard(pixels.shape)
+
+            row = writer.next_row
+            writer.array[row] = pixels
+            writer.array.flush()
+            # The index line is the commit point: readers never see a half-written row
+            writer.index_file.write(f"{media_id}\t{row}\n")
+            writer.index_file.flush()
+
+            writer.next_row += 1
+            self._index[media_id] = (writer.name, row)
+
+    def shards(self):
+        """
+        Every shard with its (media_id, row) entries in row order.
+        Reading a shard's rows in this order is sequential I/O.
+        """
+        with self._lock:
+            self._refresh()
+            entries = {}
+            for media_id, (shard, row) in self._index.items():
+                entries.setdefault(shard, []).append((media_id, row))
+
+        return [
+            (shard, sorted(rows, key=lambda entry: entry[1]))
+            for shard, rows in sorted(entries.items())
+        ]
+
+    def open_shard(self, shard):
+        """Read-only memmap of a whole shard, or None if it can't be read."""
+        with self._lock:
+            return self._reader(shard)
+
+    def stats(self):
+        with self._lock:
+            return {"media": len(self._index), "shards": len(self._index_offsets)}
+
+    def _path(self, shard, extension):
+        return os.path.join(self.directory, f"{shard}.{extension}")
+
+    def _reader(self, shard):
+        """Read-only memmap of a shard, or None if its .npy is missing or truncated."""
+        reader = self._readers.get(shard)
+        if reader is None:
+            try:
+                reader = np.load(self._path(shard, "npy"), mmap_mode="r")
+            except (OSError, ValueError, EOFError):
+                return None
+            self._readers[shard] = reader
+        return reader
+
+    def _forget(self, shard):
+        """Drop the index entries of an unreadable shard; their media are stored again on the next put."""
+        self._index = {
+            media_id: location
+            for media_id, location in self._index.items()
+            if location[0] != shard
+        }
+
+    def _open_shard(self, row_shape):
+        self._shard_seq += 1
+        name = f"shard-{int(time.time())}-{os.getpid()}-{self._shard_seq:04d}"
+
+        array = np.lib.format.open_memmap(
+            self._path(name, "npy"),
+            mode="w+",
+            dtype=np.uint8,
+            shape=(self.shard_rows,) + tuple(row_shape),
+        )
+        index_file = open(self._path(name, "idx"), "a")
+
+        if self._writer is not None:
+            self._writer.index_file.close()
+        self._writer = _ShardWriter(name, array, index_file)
+        return self._writer
+
+    def _refresh(self):
+        """Read the index lines appended since the last refresh, by any process."""
+        for index_path in glob.glob(os.path.join(self.directory, "shard-*.idx")):
+            offset = self._index_offsets.get(index_path, 0)
+            if os.path.getsize(index_path) <= offset:
+                continue
+
+            shard = os.path.basename(index_path)[:-len(".idx")]
+            with open(index_path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+
+            # A line still being written has no newline yet; pick it up next time
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.decode(errors="replace").splitlines():
+                try:
+                    media_id, row = line.split("\t")
+                    self._index[media_id] = (shard, int(row))
+                except ValueError:
+                    # A line torn by a crash; the media is simply stored again
+                    continue
+
+            self._index_offsets[index_path] = offset + len(complete)
+
+        self._last_refresh = time.monotonic()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    """The process-wide feature store, or None when FEATURE_STORE_ENABLED is off."""
+    global _store
+
+    if not config.FEATURE_STORE_ENABLED:
+        return None
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FeatureStore(
+                    config.FEATURE_STORE_DIR,
+                    config.FEATURE_STORE_SHARD_ROWS,
+                    config.FEATURE_STORE_REFRESH_SECONDS,
+                )
+
+    return _store
+
+
+def load_model_input(media_id, file_path):
+    """
+    Model-ready float32 input of an upload. Served from the feature store when
+    the media is in it; otherwise decoded from file_path and added to the store.
+    """
+    store = get_feature_store()
+
+    with ML_STAGE_SECONDS.labels("decode").time():
+        pixels = store.get(media_id) if store else None
+        if pixels is None:
+            pixels = load_pixels(file_path)
+            if store:
+                try:
+                    store.put(media_id, pixels)
+                except (OSError, ValueError) as e:
+                    # A full disk (or a shard of another input size) must not fail the diagnosis
+                    print(f"Could not add {media_id} to the feature store: {e}")
+
+    with ML_STAGE_SECONDS.labels("preprocess").time():
+        return normalize(pixels)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app import config
+from app.services.model import INPUT_SIZE, model_input_path, to_model_input
+
+
+# Image Variants
+# Each uploaded image is decoded once, when it is stored, into:
+#   <sha256>.input.npy   the model input, already oriented and resized (uint8)
+#   <sha256>.w<N>.jpg    a JPEG thumbnail per size in THUMBNAIL_SIZES
+# next to the original in the blob store. Inference reads the .npy instead of
+# re-decoding the full photo, and clients ask for a thumbnail with ?size=N
+# instead of downloading the original (see variant_for()).
+#
+# Thumbnails larger than the original are not made; the original is served.
+
+
+def variant_path(file_path, size):
+    """Path of the size-N thumbnail of an image, relative or absolute like file_path."""
+    return f"{os.path.splitext(file_path)[0]}.w{size}.jpg"
+
+
+def _write_atomic(final_path, write):
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(final_path), prefix=".variant-", suffix=".part"
+    )
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write(out)
+        os.replace(temp_path, final_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def create_variants(file_path):
+    """
+    Write the model input and thumbnails of the image at file_path next to it.
+    Returns False if the file can't be decoded as an image (nothing is written).
+    """
+    try:
+        with Image.open(file_path) as img:
+            # For JPEGs, decode at the smallest 1/2, 1/4 or 1/8 scale that still
+            # covers every variant: far cheaper than decoding a phone photo at full size
+            largest = max(max(INPUT_SIZE), *config.THUMBNAIL_SIZES)
+            img.draft("RGB", (largest, largest))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        # DecompressionBombError: more than Image.MAX_IMAGE_PIXELS, refused by Pillow
+        print(f"Could not create variants of {file_path}: {e}")
+        return False
+
+    pixels = to_model_input(img)
+    _write_atomic(model_input_path(file_path), lambda out: np.save(out, pixels))
+
+    for size in config.THUMBNAIL_SIZES:
+        if max(img.size) <= size:
+            continue
+
+        thumbnail = img.copy()
+        thumbnail.thumbnail((size, size))
+        _write_atomic(
+            variant_path(file_path, size),
+            lambda out: thumbnail.save(out, "JPEG", quality=config.THUMBNAIL_QUALITY),
+        )
+
+    return True
+
+
+def delete_variants(file_path):
+    for path in [model_input_path(file_path)] + [
+        variant_path(file_path, size) for size in config.THUMBNAIL_SIZES
+    ]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def variant_for(file_path, size, root=None):
+    """
+    The stored image to send a client that needs it `size` pixels wide: the
+    smallest thumbnail at least that big, or the original if there is none.
+    file_path is relative to root (UPLOAD_DIR); so is the returned path.
+    """
+    root = root or config.UPLOAD_DIR
+
+    for candidate in sorted(config.THUMBNAIL_SIZES):
+        if candidate >= size:
+            path = variant_path(file_path, candidate)
+            if os.path.exists(os.path.join(root, path)):
+                return path
+            # Not made because the original is smaller, or uploaded before variants existed
+            break
+
+    return file_path
@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import json
+import threading
+
+from app import config
+
+# Used when a text is missing in the requested language
+DEFAULT_LANGUAGE = "en"
+
+# Per-language fields of a crop, as in the Flutter CropModel
+TRANSLATED_FIELDS = ("nameTranslations", "careInstructions", "waterRequirements", "growthDuration")
+
+
+# Crop & Remedy Knowledge Base
+# The crop, disease, symptom and remedy catalog, moved here from the Flutter app
+# (lib/data/crop_data.dart) so it can be updated without an app release.
+# It is read once from KNOWLEDGE_BASE_PATH (app/data/knowledge_base.json) into:
+#   - an index (disease label, language) -> matching diseases, used to attach
+#     remedies to predictions without scanning the catalog
+#   - the bulk export of every language, and of each language alone, already
+#     serialised and gzipped, with a content-hash version used as ETag
+#
+# Crops keep the JSON shape of CropModel.toJson(), so CropModel.fromJson() reads
+# the export as is. Each disease also has a `label`: the model's output for it.
+# `aliases` maps other model labels to a catalog label.
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _crop_in_language(crop, lang):
+    """The crop with only `lang` kept in its per-language fields."""
+    crop = dict(crop)
+    for field in TRANSLATED_FIELDS:
+        texts = crop.get(field) or {}
+        crop[field] = {lang: texts[lang]} if lang in texts else {}
+    diseases = crop.get("commonDiseases") or {}
+    crop["commonDiseases"] = {lang: diseases[lang]} if lang in diseases else {}
+    return crop
+
+
+class Export:
+    """One serialised export: JSON body, its gzipped form and a strong ETag."""
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+
+
+class KnowledgeBase:
+
+    def __init__(self, document):
+        self.aliases = document.get("aliases", {})
+        self.crops = {crop["id"]: crop for crop in document["crops"]}
+        self.crop_versions = {crop_id: _digest(crop) for crop_id, crop in self.crops.items()}
+        self.version = _digest({"aliases": self.aliases, "crops": self.crop_versions})
+
+        self.languages = sorted({
+            lang for crop in self.crops.values() for lang in crop.get("commonDiseases", {})
+        })
+
+        self._diseases = {}
+        for crop_id, crop in self.crops.items():
+            names = crop.get("nameTranslations", {})
+            for lang, diseases in crop.get("commonDiseases", {}).items():
+                for disease in diseases:
+                    self._diseases.setdefault((disease["label"], lang), []).append({
+                        "crop": crop_id,
+                        "crop_name": names.get(lang, crop["name"]),
+                        **disease,
+                    })
+
+        self._exports = {None: Export(self._export_payload(None))}
+        for lang in self.languages:
+            self._exports[lang] = Export(self._export_payload(lang))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def diseases_for(self, label, lang=DEFAULT_LANGUAGE):
+        """Every catalog disease the model label stands for (one per crop), in `lang` where translated."""
+        label = self.aliases.get(label, label)
+        return self._diseases.get((label, lang)) or self._diseases.get((label, DEFAULT_LANGUAGE), [])
+
+    def export(self, lang=None):
+        """The precomputed Export of every language (None) or of one; None for an unknown language."""
+        return self._exports.get(lang)
+
+    def crop(self, crop_id, lang=None):
+        crop = self.crops.get(crop_id)
+        if crop is None:
+            return None
+        crop = _crop_in_language(crop, lang) if lang else crop
+        return {**crop, "version": self.crop_versions[crop_id]}
+
+    def manifest(self):
+        """Versions only: clients compare them and fetch just the crops that changed."""
+        return {"version": self.version, "crops": self.crop_versions}
+
+    def _export_payload(self, lang):
+        return {
+            "version": self.version,
+            "languages": [lang] if lang else self.languages,
+            "aliases": self.aliases,
+            "crops": [self.crop(crop_id, lang) for crop_id in self.crops],
+        }
+
+
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base():
+    global _knowledge_base
+
+    if _knowledge_base is None:
+        with _knowledge_base_lock:
+            if _knowledge_base is None:
+                _knowledge_base = KnowledgeBase.load(config.KNOWLEDGE_BASE_PATH)
+
+    return _knowledge_base
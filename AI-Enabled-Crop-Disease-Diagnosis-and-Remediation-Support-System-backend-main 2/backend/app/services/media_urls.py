@@ -0,0 +1,39 @@
+import hashlib
+import hmac
+import math
+import time
+from urllib.parse import quote, urlencode
+
+from app import config
+
+
+# Signed Media URLs
+# With MEDIA_SIGNING_KEY set, /uploads only serves URLs made by media_url():
+#   /uploads/<path>?exp=<unix time>&sig=<HMAC-SHA256(key, "<path>:<exp>")>
+# The API hands these out (history "file_url"); anyone holding one can fetch
+# that image until it expires, and nothing else.
+#
+# Expiry times are rounded up to MEDIA_URL_TTL / 4, so the URL of an image stays
+# the same for a while and HTTP caches keep hitting.
+
+
+def _signature(path, expires):
+    message = f"{path}:{expires}".encode()
+    return hmac.new(config.MEDIA_SIGNING_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def media_url(path):
+    """URL (relative to the server) of a file under UPLOAD_DIR, signed when signing is on."""
+    url = "/uploads/" + quote(path)
+    if not config.MEDIA_SIGNING_KEY:
+        return url
+
+    step = max(config.MEDIA_URL_TTL // 4, 1)
+    expires = math.ceil((time.time() + config.MEDIA_URL_TTL) / step) * step
+    return url + "?" + urlencode({"exp": expires, "sig": _signature(path, expires)})
+
+
+def verify_media_signature(path, expires, signature):
+    if expires is None or signature is None or expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(path, expires), signature)
@@ -0,0 +1,190 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+
+# Prometheus Metrics
+# Served at /metrics (see app/main.py). Answers "where does the time go":
+#   http_request_duration_seconds  per route template (not per URL, to bound label values)
+#   upload_size_bytes              per upload API
+#   upload_stage_duration_seconds  receive (network + disk), variants, db_commit, enqueue
+#   ml_stage_duration_seconds      decode, preprocess, forward, db_write
+#   ml_batch_size / ml_queue_wait_seconds / ml_jobs_total
+#   db_query_duration_seconds      per engine and statement type, from SQLAlchemy events
+# plus gauges read at scrape time from the existing stats helpers (job queue depth,
+# connection pools, result cache, feature store), so the hot path never updates them.
+#
+# Every observation is a lock and a bucket search in process memory. Metrics are
+# per process: with several workers (or ML_EXECUTOR=celery) set PROMETHEUS_MULTIPROC_DIR
+# so /metrics aggregates the histograms of every process on the host.
+
+SIZE_BUCKETS = tuple(16 * 1024 * 4 ** i for i in range(7))  # 16 KiB .. 64 MiB
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=STAGE_BUCKETS,
+)
+UPLOAD_BYTES = Histogram(
+    "upload_size_bytes", "Size of received uploads", ["source"], buckets=SIZE_BUCKETS,
+)
+UPLOAD_STAGE_SECONDS = Histogram(
+    "upload_stage_duration_seconds", "Time spent per upload stage", ["stage"], buckets=STAGE_BUCKETS,
+)
+ML_STAGE_SECONDS = Histogram(
+    "ml_stage_duration_seconds", "Time spent per inference stage", ["stage"], buckets=STAGE_BUCKETS,
+)
+ML_BATCH_SIZE = Histogram(
+    "ml_batch_size", "Images per model forward pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+ML_QUEUE_WAIT = Histogram(
+    "ml_queue_wait_seconds", "Time a job waited in the in-process queue before its batch ran",
+    buckets=STAGE_BUCKETS,
+)
+ML_JOBS = Counter("ml_jobs", "Finished diagnosis jobs", ["outcome"])
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time",
+    ["engine", "operation"], buckets=QUERY_BUCKETS,
+)
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def _operation(statement):
+    word = statement.lstrip()[:8].split(None, 1)
+    word = word[0].upper() if word else ""
+    return word if word in _OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine, name):
+    """Time every statement executed on a (sync) engine. Use engine.sync_engine for async ones."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.labels(name, _operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        # after_cursor_execute is skipped for a failed statement
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording http_request_duration_seconds.
+    The route label is the matched path template (/api/media-status/{media_id}),
+    the mount for static files, or "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.labels(scope["method"], _route_label(scope), status).observe(
+                time.perf_counter() - started
+            )
+
+
+def _route_label(scope):
+    # The router writes the matched route (or mount) into the shared scope dict
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("root_path"):
+        return scope["root_path"] + "/{path}"
+    return "unmatched"
+
+
+class _StatsCollector:
+    """Exposes the existing in-process stats as gauges, read only when scraped."""
+
+    def describe(self):
+        # Without this, registering calls collect() right away, at import time
+        return []
+
+    def collect(self):
+        # Imported here: these modules import this one for their timings
+        from app.database import pool_stats
+        from app.services.feature_store import get_feature_store
+        from app.services.result_cache import cache_stats
+        from app.tasks.job_queue import current_executor
+
+        executor = current_executor()
+        if executor is not None and hasattr(executor, "queue_depth"):
+            yield GaugeMetricFamily(
+                "ml_queue_depth", "Jobs waiting in the in-process ML queue",
+                value=executor.queue_depth(),
+            )
+
+        in_use = GaugeMetricFamily("db_pool_connections_in_use", "Checked-out connections", labels=["pool"])
+        idle = GaugeMetricFamily("db_pool_connections_idle", "Idle pooled connections", labels=["pool"])
+        errors = CounterMetricFamily(
+            "db_pool_checkout_errors", "Failed connection checkouts (pool timeouts)", labels=["pool"]
+        )
+        for pool, stats in pool_stats().items():
+            in_use.add_metric([pool], stats["in_use"])
+            idle.add_metric([pool], stats["idle"])
+            if "checkout_errors" in stats:
+                errors.add_metric([pool], stats["checkout_errors"])
+        yield in_use
+        yield idle
+        yield errors
+
+        cache = cache_stats()
+        lookups = CounterMetricFamily("result_cache_lookups", "Result cache lookups", labels=["result"])
+        for result in ("hits", "misses", "errors"):
+            lookups.add_metric([result], cache[result])
+        yield lookups
+        yield GaugeMetricFamily("result_cache_entries", "Entries in the result cache", value=cache["size"])
+
+        store = get_feature_store()
+        if store:
+            yield GaugeMetricFamily(
+                "feature_store_media", "Model inputs in the feature store", value=store.stats()["media"]
+            )
+
+
+_stats_collector = _StatsCollector()
+REGISTRY.register(_stats_collector)
+
+
+def render_metrics():
+    """(body, content type) of the Prometheus text exposition."""
+    registry = REGISTRY
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Histograms/counters of every process, from the shared directory
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_stats_collector)
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
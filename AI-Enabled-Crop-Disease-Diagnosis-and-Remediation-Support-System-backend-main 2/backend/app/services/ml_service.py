@@ -1,28 +1,14 @@
 from app.celery_worker import celery
-from app.database import SessionLocal
-from app.models.media import Media
+from app.tasks import ml_task
 import time
 
 
 # Celery Worker Task for ML
-# This is an alternative implementation using Celery for asynchronous processing.
+# This is the Celery backend of the ML job queue (ML_EXECUTOR=celery).
 # It is used when the system is configured for high-scale background processing.
+# The actual pipeline lives in app/tasks/ml_task.py so both backends behave the same.
 @celery.task
-def process_ml(media_id, file_path):
+def process_ml(media_id, file_path, timeout=None):
 
-    db = SessionLocal()
-
-    media = db.query(Media).filter(Media.media_id == media_id).first()
-
-    media.status = "PROCESSING"
-    db.commit()
-
-    # simulate ML delay
-    time.sleep(5)
-
-    media.status = "COMPLETED"
-    media.result = "leaf_blight"
-    media.confidence = "92%"
-
-    db.commit()
-    db.close()
+    deadline = time.monotonic() + timeout if timeout else None
+    ml_task.process_ml(media_id, file_path, deadline=deadline)
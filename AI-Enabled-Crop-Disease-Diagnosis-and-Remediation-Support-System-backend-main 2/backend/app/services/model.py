@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app import config
+
+# Input size expected by the diagnosis CNN
+INPUT_SIZE = (224, 224)
+
+
+# Placeholder Diagnosis Model
+# Stands in for the real CNN until it ships. It takes a whole batch as one
+# NumPy array and pays the simulated inference cost once per batch, which is
+# how a real model behaves on CPU.
+class StubModel:
+
+    def predict(self, batch):
+        """
+        batch: float32 array of shape (N, H, W, 3) scaled to [0, 1].
+        Returns a list of (label, confidence) tuples, one per row.
+        """
+        # simulate ML
+        time.sleep(config.ML_SIMULATED_DELAY)
+
+        # Touch the pixels the way a forward pass would, in one vectorised op
+        batch.mean(axis=(1, 2, 3))
+
+        return [("leaf_blight", 0.92)] * len(batch)
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = StubModel()
+
+    return _model
+
+
+def model_loaded():
+    return _model is not None
+
+
+def model_input_path(file_path):
+    """Where the pre-resized model input of an uploaded image is stored."""
+    return os.path.splitext(file_path)[0] + ".input.npy"
+
+
+def to_model_input(img):
+    """An upright RGB PIL image as a uint8 array of shape INPUT_SIZE + (3,)."""
+    return np.asarray(img.resize(INPUT_SIZE), dtype=np.uint8)
+
+
+def load_pixels(file_path):
+    """
+    uint8 model input of an uploaded image (see to_model_input).
+    Reads the copy prepared at ingest (app/services/image_variants.py) when there
+    is one, so the full-resolution original is only decoded for older uploads.
+    """
+    try:
+        return np.load(model_input_path(file_path))
+    except FileNotFoundError:
+        with Image.open(file_path) as img:
+            return to_model_input(ImageOps.exif_transpose(img).convert("RGB"))
+
+
+def normalize(pixels):
+    """uint8 model input -> the float32 array in [0, 1] the model takes."""
+    return pixels.astype(np.float32) / 255.0
+
+
+def load_image(file_path):
+    """Model-ready float32 array of an uploaded image."""
+    return normalize(load_pixels(file_path))
+
+
+def format_confidence(confidence):
+    # Stored as a 0-1 float; returned as a percentage string (e.g. "92%") for the mobile client
+    if confidence is None:
+        return None
+    return f"{round(confidence * 100)}%"
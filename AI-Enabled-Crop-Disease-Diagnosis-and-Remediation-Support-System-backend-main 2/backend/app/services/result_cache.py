@@ -0,0 +1,250 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.models.media import Media, TERMINAL_STATUSES, canonical_media_id
+from app.services.model import format_confidence
+
+
+# Result Cache
+# COMPLETED/FAILED results never change, yet clients ask for them again and
+# again. Lookups go through get_media_snapshot(), which serves terminal results
+# from this cache and only hits the database on a miss. Writers of Media.status
+# call invalidate_media() after committing.
+
+# How long clients may reuse a terminal result without revalidating. Kept short
+# and private: results belong to one user and a media can be deleted or re-run.
+CLIENT_MAX_AGE = 60
+
+
+class LRUCache:
+    """In-process LRU with a per-entry TTL."""
+
+    # Calls never wait on I/O: safe to make from the event loop
+    blocking = False
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Cache tier shared by all workers. Values are stored as JSON with a TTL."""
+
+    # Every call is a network round trip
+    blocking = True
+
+    def __init__(self, url, ttl):
+        # Imported here so the in-process cache never needs the redis package
+        import redis
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return f"result:{key}"
+
+    def get(self, key):
+        value = self._client.get(self._key(key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self._client.setex(self._key(key), self.ttl, json.dumps(value))
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def size(self):
+        return None
+
+
+class NullCache:
+
+    blocking = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def size(self):
+        return 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "errors": 0}
+_counters_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if config.RESULT_CACHE_BACKEND == "redis":
+                    _cache = RedisCache(config.REDIS_URL, config.RESULT_CACHE_TTL)
+                elif config.RESULT_CACHE_BACKEND == "memory":
+                    _cache = LRUCache(config.RESULT_CACHE_MAX_ENTRIES, config.RESULT_CACHE_TTL)
+                elif config.RESULT_CACHE_BACKEND == "none":
+                    _cache = NullCache()
+                else:
+                    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {config.RESULT_CACHE_BACKEND}")
+
+    return _cache
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def cache_stats():
+    with _counters_lock:
+        stats = dict(_counters)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    stats["backend"] = config.RESULT_CACHE_BACKEND
+    stats["size"] = get_result_cache().size()
+    return stats
+
+
+async def _call(cache, method, *args):
+    """Call a cache method from async code, off the event loop if it does network I/O."""
+    if cache.blocking:
+        return await run_in_threadpool(method, *args)
+    return method(*args)
+
+
+async def get_media_snapshot(db, media_id):
+    """
+    The fields of a Media row the status/prediction routes return, as a dict.
+    Terminal results are served from the cache; returns None if the media doesn't exist.
+    db is an AsyncSession. Only the needed columns are selected, no ORM object is built.
+    """
+    media_id = canonical_media_id(media_id)
+    if media_id is None:
+        return None
+
+    cache = get_result_cache()
+
+    try:
+        snapshot = await _call(cache, cache.get, media_id)
+    except Exception as e:
+        # A cache outage degrades to database reads, never to errors
+        print(f"Result cache read failed: {e}")
+        _count("errors")
+        snapshot = None
+
+    if snapshot is not None:
+        _count("hits")
+        return snapshot
+
+    _count("misses")
+
+    row = (
+        await db.execute(
+            select(Media.media_id, Media.status, Media.result, Media.confidence, Media.created_at)
+            .where(Media.media_id == media_id)
+        )
+    ).first()
+    if row is None:
+        return None
+
+    snapshot = {
+        "media_id": row.media_id,
+        "status": row.status,
+        "result": row.result,
+        "confidence": format_confidence(row.confidence),
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+    if row.status in TERMINAL_STATUSES:
+        try:
+            await _call(cache, cache.set, media_id, snapshot)
+        except Exception as e:
+            print(f"Result cache write failed: {e}")
+            _count("errors")
+
+    return snapshot
+
+
+def invalidate_media(media_id):
+    """Drop a cached result. Call after committing a status change."""
+    try:
+        get_result_cache().delete(media_id)
+    except Exception as e:
+        print(f"Result cache invalidation failed for {media_id}: {e}")
+        _count("errors")
+
+
+def not_modified(request, etag):
+    """True if the request's If-None-Match (a list of tags, or *) matches etag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def cached_json_response(request, payload, terminal):
+    """
+    JSON response with a strong ETag. A matching If-None-Match gets an empty 304.
+    Only the client may cache it (never shared proxies): terminal results for
+    CLIENT_MAX_AGE seconds, anything still in progress is revalidated every time.
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={CLIENT_MAX_AGE}" if terminal else "private, no-cache",
+    }
+
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from typing import NamedTuple
+
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.models.blob import Blob
+from app.models.media import Media
+from app.services.image_variants import delete_variants
+
+
+# Upload Storage
+# Uploads are copied to disk in fixed-size chunks so a large image never sits
+# in memory in one piece. Bytes go to a temp file in the destination folder,
+# the size limit and SHA-256 are checked on the fly, and the finished file is
+# renamed into place atomically. A half-written upload is never visible.
+#
+# Uploaded images are stored content-addressed: the file is named after its
+# SHA-256 in a sharded layout (blobs/ab/cd/<sha256>.<ext>), so the same photo
+# uploaded again under a new media_id is stored once and diagnosed once.
+
+BLOB_DIR = os.path.join(config.UPLOAD_DIR, "blobs")
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload passes MAX_UPLOAD_BYTES while streaming."""
+
+
+class SavedUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+
+def _open_temp(dest_dir):
+    # Same filesystem as the destination so os.replace() stays an atomic rename
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-", suffix=".part")
+    return os.fdopen(fd, "wb"), temp_path
+
+
+def _discard(temp_path):
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+def receive_upload(fileobj, dest_dir=BLOB_DIR, max_bytes=None, chunk_size=None):
+    """
+    Stream a file object into a temp file inside dest_dir.
+    Returns a SavedUpload whose path is the temp file; the caller renames or discards it.
+    Raises UploadTooLargeError past max_bytes.
+    """
+    max_bytes = max_bytes or config.MAX_UPLOAD_BYTES
+    chunk_size = chunk_size or config.UPLOAD_CHUNK_SIZE
+
+    out, temp_path = _open_temp(dest_dir)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with out:
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        _discard(temp_path)
+        raise
+
+    return SavedUpload(temp_path, size, digest.hexdigest())
+
+
+def save_upload(fileobj, dest_path, max_bytes=None, chunk_size=None):
+    """Stream a file object to dest_path. Raises UploadTooLargeError past max_bytes."""
+    received = receive_upload(
+        fileobj, os.path.dirname(dest_path) or ".", max_bytes, chunk_size
+    )
+    os.replace(received.path, dest_path)
+    return received._replace(path=dest_path)
+
+
+async def receive_upload_async(upload_file, dest_dir=BLOB_DIR, max_bytes=None, chunk_size=None):
+    """
+    Async variant of receive_upload() for `async def` routes.
+    Reads from a FastAPI UploadFile and does every disk write in the threadpool,
+    so the event loop is never blocked on file I/O.
+    """
+    max_bytes = max_bytes or config.MAX_UPLOAD_BYTES
+    chunk_size = chunk_size or config.UPLOAD_CHUNK_SIZE
+
+    out, temp_path = await run_in_threadpool(_open_temp, dest_dir)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        try:
+            while True:
+                chunk = await upload_file.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+        finally:
+            await run_in_threadpool(out.close)
+    except BaseException:
+        await run_in_threadpool(_discard, temp_path)
+        raise
+
+    return SavedUpload(temp_path, size, digest.hexdigest())
+
+
+async def save_upload_async(upload_file, dest_path, max_bytes=None, chunk_size=None):
+    """Async variant of save_upload()."""
+    received = await receive_upload_async(
+        upload_file, os.path.dirname(dest_path) or ".", max_bytes, chunk_size
+    )
+    await run_in_threadpool(os.replace, received.path, dest_path)
+    return received._replace(path=dest_path)
+
+
+# --- Content-addressed blobs ---
+
+def safe_extension(filename, default="jpg"):
+    """File extension from a client-supplied filename, safe to use in a path."""
+    extension = os.path.splitext(filename or "")[1][1:].lower()
+    return extension if extension.isalnum() else default
+
+
+def blob_path(sha256, extension):
+    """Path of a blob relative to the uploads folder: blobs/ab/cd/<sha256>.<ext>"""
+    return "/".join(["blobs", sha256[:2], sha256[2:4], f"{sha256}.{extension}"])
+
+
+def store_blob(db, received, extension):
+    """
+    Take a received upload (temp file) into the blob store and add a reference to it.
+    If a blob with the same hash exists, the temp file is dropped and nothing is written.
+    Commits the blob change. Returns (blob, created).
+    """
+    # Atomic increment; matches nothing if this content has never been stored
+    hits = db.query(Blob).filter(Blob.sha256 == received.sha256).update(
+        {Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False
+    )
+    if hits:
+        db.commit()
+        _discard(received.path)
+        return db.get(Blob, received.sha256), False
+
+    relative_path = blob_path(received.sha256, extension)
+    final_path = os.path.join(config.UPLOAD_DIR, relative_path)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(received.path, final_path)
+
+    blob = Blob(
+        sha256=received.sha256,
+        file_path=relative_path,
+        size=received.size,
+        ref_count=1,
+    )
+    db.add(blob)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent upload of the same bytes stored it first: take a reference.
+        # Same path -> we renamed identical content over its file, which is fine.
+        # Another path (other extension) -> our copy is referenced by nothing.
+        db.rollback()
+        db.query(Blob).filter(Blob.sha256 == received.sha256).update(
+            {Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False
+        )
+        db.commit()
+        existing = db.get(Blob, received.sha256)
+        if existing is None or existing.file_path != relative_path:
+            _discard(final_path)
+        return existing, False
+
+    return blob, True
+
+
+def release_blob(db, sha256):
+    """
+    Drop one reference to a blob; the file is deleted with the last one. Commits.
+
+    The files are removed before the commit, while the UPDATE below holds the
+    blob's row lock (PostgreSQL) or the write lock (SQLite). A concurrent
+    store_blob() of the same content waits on its own UPDATE until then, so it
+    can't rename a new file into place that this would delete. The original
+    is only moved aside until the commit succeeds: a rollback puts it back.
+    Variants can be recreated, so they are just deleted.
+    """
+    db.query(Blob).filter(Blob.sha256 == sha256).update(
+        {Blob.ref_count: Blob.ref_count - 1}, synchronize_session=False
+    )
+    blob = db.query(Blob).filter(Blob.sha256 == sha256, Blob.ref_count <= 0).first()
+    if blob is None:
+        db.commit()
+        return
+
+    file_path = os.path.join(config.UPLOAD_DIR, blob.file_path)
+    db.delete(blob)
+    db.flush()
+
+    aside_path = f"{file_path}.deleted-{uuid.uuid4().hex}"
+    try:
+        os.replace(file_path, aside_path)
+    except FileNotFoundError:
+        aside_path = None
+    delete_variants(file_path)
+
+    try:
+        db.commit()
+    except BaseException:
+        db.rollback()
+        if aside_path:
+            os.replace(aside_path, file_path)
+        raise
+
+    if aside_path:
+        _discard(aside_path)
+
+
+def find_cached_diagnosis(db, sha256):
+    """Return (result, confidence) of a completed diagnosis of the same content, or None."""
+    return (
+        db.query(Media.result, Media.confidence)
+        .filter(Media.content_hash == sha256, Media.status == "COMPLETED")
+        .first()
+    )
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import uuid
+
+from app import config
+from app.services.storage_service import SavedUpload
+
+
+# Resumable Upload Sessions
+# State of uploads that arrive in pieces (see app/routes/resumable_upload.py).
+# Each session is two files in RESUMABLE_UPLOAD_DIR:
+#   <upload_id>.json  what the client declared (length, media_id, user_id, ...)
+#   <upload_id>.part  the bytes received so far; its size is the current offset
+# The upload_id is random and only ever given to the client that created the
+# session: it is the only credential needed to append to an upload. Nothing
+# else (media_id, user_id) leads to a session.
+# Nothing is kept in memory, so a session survives restarts and is visible to
+# every worker process. Sessions untouched for RESUMABLE_UPLOAD_TTL seconds are
+# deleted by collect_stale_sessions().
+
+SESSION_DIR = config.RESUMABLE_UPLOAD_DIR
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_last_collected = 0.0
+_collect_lock = threading.Lock()
+
+
+def _paths(upload_id):
+    base = os.path.join(SESSION_DIR, upload_id)
+    return base + ".json", base + ".part"
+
+
+def _write_meta(upload_id, session):
+    meta_path, _ = _paths(upload_id)
+    temp_path = meta_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(session, f)
+    os.replace(temp_path, meta_path)
+
+
+def load_session(upload_id):
+    """The session's metadata plus its current "offset", or None if it doesn't exist."""
+    if not _UPLOAD_ID.match(upload_id):
+        return None
+
+    meta_path, part_path = _paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            session = json.load(f)
+        session["offset"] = os.path.getsize(part_path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    return session
+
+
+def create_session(length, media_id=None, user_id=None, filename=None, content_type=None, upload_id=None):
+    """
+    Start an upload session. A client that presents the upload_id of its
+    unfinished session (same media_id, user_id and length) gets that session
+    back to resume it; anything else starts a new one. Returns (session, created).
+    """
+    os.makedirs(SESSION_DIR, exist_ok=True)
+
+    existing = load_session(upload_id) if upload_id else None
+    if existing and (existing["media_id"], existing["user_id"], existing["length"]) == (media_id, user_id, length):
+        return existing, False
+
+    upload_id = secrets.token_hex(16)
+
+    session = {
+        "upload_id": upload_id,
+        "length": length,
+        "media_id": media_id,
+        "user_id": user_id,
+        "filename": filename,
+        "content_type": content_type,
+        "created_at": time.time(),
+    }
+
+    _, part_path = _paths(upload_id)
+    open(part_path, "wb").close()
+    _write_meta(upload_id, session)
+
+    session["offset"] = 0
+    return session, True
+
+
+def open_part(upload_id):
+    """Open the session's partial file for appending."""
+    _, part_path = _paths(upload_id)
+    return open(part_path, "ab")
+
+
+def received_upload(session):
+    """
+    A SavedUpload for a complete session, to hand to store_blob().
+    Its path is a hard link to the partial file, so the session keeps its bytes
+    until delete_session(): finalizing can be retried without re-uploading.
+    """
+    upload_id = session["upload_id"]
+    _, part_path = _paths(upload_id)
+
+    sha256 = session.get("sha256")
+    if sha256 is None:
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(config.UPLOAD_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        stored = {k: v for k, v in session.items() if k != "offset"}
+        stored["sha256"] = sha256
+        _write_meta(upload_id, stored)
+
+    link_path = os.path.join(SESSION_DIR, f"{upload_id}.{uuid.uuid4().hex}.link")
+    os.link(part_path, link_path)
+    return SavedUpload(link_path, session["length"], sha256)
+
+
+def delete_session(upload_id):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def collect_stale_sessions(max_age=None):
+    """Delete sessions that haven't received a byte in max_age seconds. Returns how many."""
+    max_age = max_age if max_age is not None else config.RESUMABLE_UPLOAD_TTL
+    cutoff = time.time() - max_age
+    removed = 0
+
+    try:
+        names = os.listdir(SESSION_DIR)
+    except FileNotFoundError:
+        return 0
+
+    for name in names:
+        path = os.path.join(SESSION_DIR, name)
+
+        if name.endswith(".part"):
+            # The .part file is touched by every chunk, so its mtime is the last activity
+            try:
+                stale = os.path.getmtime(path) < cutoff
+            except FileNotFoundError:
+                continue
+            if stale:
+                delete_session(name[:-len(".part")])
+                removed += 1
+        elif name.endswith(".link") or name.endswith(".tmp"):
+            # Leftovers of a finalize or metadata write that crashed midway
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    return removed
+
+
+def maybe_collect_stale_sessions():
+    """Run collect_stale_sessions() at most once per RESUMABLE_GC_INTERVAL in this process."""
+    global _last_collected
+
+    with _collect_lock:
+        now = time.monotonic()
+        if _last_collected and now - _last_collected < config.RESUMABLE_GC_INTERVAL:
+            return 0
+        _last_collected = now
+
+    removed = collect_stale_sessions()
+    if removed:
+        print(f"Removed {removed} stale upload sessions")
+    return removed
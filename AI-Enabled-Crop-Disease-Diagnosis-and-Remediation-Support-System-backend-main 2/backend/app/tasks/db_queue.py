@@ -0,0 +1,319 @@
+import argparse
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+
+from app import config
+from app.database import worker_engine
+from app.models.ml_job import MlJob
+from app.services.batch_inference import BatchInferenceEngine, InferenceJob
+from app.services.metrics import ML_JOBS
+
+
+# Database-backed ML Job Queue (ML_EXECUTOR=db)
+# Jobs are rows of ml_jobs (app/models/ml_job.py) instead of entries in process
+# memory or Redis, so any number of worker processes, on any node that can reach
+# the database and UPLOAD_DIR, can share the load:
+#
+#   python -m app.tasks.db_queue --threads 2     # a worker without the API
+#
+# The ml_jobs table is created by the deploy step (python -m app.tasks.init_db),
+# which must have run before workers or the API start.
+#
+# A worker claims up to ML_BATCH_MAX_SIZE jobs in one statement
+# (SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL, so concurrent claims never
+# wait on each other or take the same row) and holds them under a lease of
+# ML_JOB_LEASE_SECONDS. A heartbeat thread keeps extending the leases of the jobs
+# still running, up to ML_JOB_TIMEOUT. If the worker dies, its leases expire and
+# the jobs are claimed again by the next worker that polls.
+#
+# A failed attempt is retried after ML_JOB_RETRY_DELAY seconds (doubled on every
+# attempt). After ML_JOB_MAX_ATTEMPTS the job is left as DEAD and its media is
+# marked FAILED. Images that can't be decoded fail right away, as with the other
+# executors: retrying would not help.
+#
+# Delivery is at least once: a worker that loses its lease mid-batch may
+# write the same result as the worker that reclaimed the job.
+#
+# SQLite works too (for tests and local development): it ignores FOR UPDATE,
+# but only one writer runs at a time there anyway.
+
+
+def _now():
+    return datetime.utcnow()
+
+
+def enqueue_jobs(jobs):
+    """Insert (media_id, file_path) pairs as QUEUED jobs, in one statement."""
+    now = _now()
+    with worker_engine.begin() as conn:
+        conn.execute(
+            insert(MlJob),
+            [
+                {"media_id": media_id, "file_path": file_path, "status": "QUEUED",
+                 "attempts": 0, "created_at": now, "available_at": now}
+                for media_id, file_path in jobs
+            ],
+        )
+
+
+def queue_depth():
+    """Jobs waiting to be claimed (including ones waiting for a retry)."""
+    with worker_engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(MlJob).where(MlJob.status == "QUEUED"))
+
+
+def claim_jobs(worker_id, limit, lease_seconds, max_attempts):
+    """
+    Claim up to `limit` jobs for `worker_id`.
+    Returns (claimed rows, media_ids of jobs dead-lettered because their last
+    lease expired).
+    """
+    now = _now()
+
+    with worker_engine.begin() as conn:
+        dead = conn.execute(
+            update(MlJob)
+            .where(
+                MlJob.status == "RUNNING",
+                MlJob.lease_expires_at < now,
+                MlJob.attempts >= max_attempts,
+            )
+            .values(status="DEAD", lease_owner=None, lease_expires_at=None,
+                    last_error="Lease expired: the worker stopped responding")
+            .returning(MlJob.media_id)
+        ).scalars().all()
+
+        claimable = (
+            select(MlJob.id)
+            .where(or_(
+                and_(MlJob.status == "QUEUED", MlJob.available_at <= now),
+                and_(MlJob.status == "RUNNING", MlJob.lease_expires_at < now),
+            ))
+            .order_by(MlJob.available_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("claimable")
+        )
+        claimed = conn.execute(
+            update(MlJob)
+            .where(MlJob.id == claimable.c.id)
+            .values(
+                status="RUNNING",
+                attempts=MlJob.attempts + 1,
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                heartbeat_at=now,
+            )
+            .returning(MlJob.id, MlJob.media_id, MlJob.file_path, MlJob.attempts, MlJob.created_at)
+        ).all()
+
+    return claimed, dead
+
+
+def extend_leases(worker_id, job_ids, lease_seconds):
+    now = _now()
+    with worker_engine.begin() as conn:
+        conn.execute(
+            update(MlJob)
+            .where(MlJob.id.in_(job_ids), MlJob.lease_owner == worker_id, MlJob.status == "RUNNING")
+            .values(lease_expires_at=now + timedelta(seconds=lease_seconds), heartbeat_at=now)
+        )
+
+
+def complete_jobs(worker_id, job_ids):
+    # A job another worker has reclaimed in the meantime is theirs to finish
+    with worker_engine.begin() as conn:
+        conn.execute(
+            delete(MlJob).where(MlJob.id.in_(job_ids), MlJob.lease_owner == worker_id)
+        )
+
+
+def release_failed_jobs(worker_id, jobs, error, max_attempts, retry_delay):
+    """
+    Give failed jobs back to the queue, or dead-letter them after max_attempts.
+    jobs: claimed rows. Returns the media_ids of the dead-lettered jobs.
+    """
+    now = _now()
+    error = str(error)[:2000]
+    dead = []
+
+    with worker_engine.begin() as conn:
+        for job in jobs:
+            owned = and_(MlJob.id == job.id, MlJob.lease_owner == worker_id)
+            if job.attempts >= max_attempts:
+                values = {"status": "DEAD"}
+            else:
+                delay = retry_delay * 2 ** (job.attempts - 1)
+                values = {"status": "QUEUED", "available_at": now + timedelta(seconds=delay)}
+
+            result = conn.execute(
+                update(MlJob).where(owned).values(
+                    lease_owner=None, lease_expires_at=None, last_error=error, **values
+                )
+            )
+            if result.rowcount and values["status"] == "DEAD":
+                dead.append(job.media_id)
+
+    ML_JOBS.labels("retried").inc(len(jobs) - len(dead))
+    return dead
+
+
+class DbQueueWorker:
+    """
+    Claims batches from ml_jobs on `threads` threads and runs them through a
+    BatchInferenceEngine, with one heartbeat thread for all held leases.
+    """
+
+    def __init__(self, threads, batch_size, decode_workers, job_timeout,
+                 lease_seconds, poll_interval, max_attempts, retry_delay):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.threads = threads
+        self.batch_size = batch_size
+        self.job_timeout = job_timeout
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.engine = BatchInferenceEngine(
+            batch_size, 0, decode_workers, job_timeout=job_timeout, collect=False
+        )
+
+        self._held = {}  # job id -> time.monotonic() after which it is no longer heartbeated
+        self._held_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.threads):
+            self._spawn(self._claim_loop, f"ml-db-worker-{index}")
+        self._spawn(self._heartbeat_loop, "ml-db-heartbeat")
+        print(f"ML DB QUEUE WORKER STARTED: {self.worker_id}, {self.threads} thread(s)")
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def wake(self):
+        """Poll now instead of at the next interval (a job was just queued)."""
+        self._wake.set()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=self.poll_interval + 1)
+        self.engine.shutdown()
+
+    def _claim_loop(self):
+        while not self._stopped.is_set():
+            try:
+                claimed, dead = claim_jobs(
+                    self.worker_id, self.batch_size, self.lease_seconds, self.max_attempts
+                )
+            except Exception as e:
+                print(f"Error claiming ML jobs: {e}")
+                claimed, dead = [], []
+
+            if dead:
+                ML_JOBS.labels("dead").inc(len(dead))
+                self.engine.mark_failed(dead)
+
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            self._run(claimed)
+
+    def _run(self, claimed):
+        now_wall, now_mono = _now(), time.monotonic()
+        batch = [
+            # Queue wait as seen by the metrics: time since the job was inserted
+            InferenceJob(job.media_id, job.file_path,
+                         enqueued_at=now_mono - (now_wall - job.created_at).total_seconds())
+            for job in claimed
+        ]
+        job_ids = [job.id for job in claimed]
+
+        with self._held_lock:
+            for job_id in job_ids:
+                self._held[job_id] = now_mono + self.job_timeout
+
+        try:
+            self.engine.run_batch(batch)
+            complete_jobs(self.worker_id, job_ids)
+        except Exception as e:
+            print(f"Error processing ML jobs {job_ids}: {e}")
+            try:
+                dead = release_failed_jobs(
+                    self.worker_id, claimed, e, self.max_attempts, self.retry_delay
+                )
+            except Exception as release_error:
+                # The leases expire and the jobs are reclaimed anyway
+                print(f"Error releasing ML jobs {job_ids}: {release_error}")
+                dead = []
+            if dead:
+                ML_JOBS.labels("dead").inc(len(dead))
+                self.engine.mark_failed(dead)
+        finally:
+            with self._held_lock:
+                for job_id in job_ids:
+                    self._held.pop(job_id, None)
+
+    def _heartbeat_loop(self):
+        interval = self.lease_seconds / 3
+        while not self._stopped.wait(interval):
+            now = time.monotonic()
+            with self._held_lock:
+                # A job stuck past its timeout stops being extended, so another
+                # worker can take it over once the lease runs out
+                job_ids = [job_id for job_id, until in self._held.items() if until > now]
+            if not job_ids:
+                continue
+            try:
+                extend_leases(self.worker_id, job_ids, self.lease_seconds)
+            except Exception as e:
+                print(f"Error extending ML job leases: {e}")
+
+
+def create_worker(threads=None):
+    return DbQueueWorker(
+        threads=config.ML_DB_WORKERS if threads is None else threads,
+        batch_size=config.ML_BATCH_MAX_SIZE,
+        decode_workers=config.ML_DECODE_WORKERS,
+        job_timeout=config.ML_JOB_TIMEOUT,
+        lease_seconds=config.ML_JOB_LEASE_SECONDS,
+        poll_interval=config.ML_DB_POLL_INTERVAL,
+        max_attempts=config.ML_JOB_MAX_ATTEMPTS,
+        retry_delay=config.ML_JOB_RETRY_DELAY,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run ML jobs from the database queue.")
+    parser.add_argument("--threads", type=int, default=max(config.ML_DB_WORKERS, 1),
+                        help="Batches processed at the same time")
+    args = parser.parse_args(argv)
+
+    worker = create_worker(args.threads)
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.shutdown()
+
+
+if __name__ == "__main__":
+    main()
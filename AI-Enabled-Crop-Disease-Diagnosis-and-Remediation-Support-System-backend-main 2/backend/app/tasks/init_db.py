@@ -0,0 +1,32 @@
+from app.database import worker_engine
+from app.models import base
+from app.tasks import migrate_media
+
+# Every model module, so create_all knows all tables
+from app.models import blob, media, ml_job  # noqa: F401
+
+
+# Database Schema Setup
+# Run once per deploy, before starting the API or workers:
+#
+#   python -m app.tasks.init_db
+#
+# Converts a media table from an older release (app/tasks/migrate_media.py) and
+# creates any missing table. Safe to run again. The API no longer does this on
+# import; DB_INIT_ON_STARTUP=true makes it run at startup instead (local development).
+
+
+def init_db():
+    if not migrate_media.migrate():
+        return False
+    base.Base.metadata.create_all(bind=worker_engine)
+    return True
+
+
+def main():
+    if not init_db():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config
+from app.services.batch_inference import BatchInferenceEngine
+from app.tasks import db_queue
+from app.tasks.ml_task import process_ml
+
+
+# ML Job Queue
+# Uploads call enqueue_ml() and return immediately; inference runs on one of
+# the backends below. The backend is picked once per process from ML_EXECUTOR.
+
+
+class QueueFullError(Exception):
+    """Raised when the ML job queue cannot take another job."""
+
+
+class ThreadPoolBackend:
+    """
+    In-process backend. Jobs run on a fixed thread pool.
+    The semaphore counts running + waiting jobs, so the pool's internal
+    queue never grows past ML_QUEUE_SIZE.
+    """
+
+    def __init__(self, max_workers, queue_size, job_timeout):
+        self.job_timeout = job_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ml-job")
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def submit(self, media_id, file_path):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("ML job queue is full")
+
+        try:
+            future = self._pool.submit(self._run, media_id, file_path)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def queue_depth(self):
+        # Jobs submitted but not yet picked up by a pool thread
+        return self._pool._work_queue.qsize()
+
+    def _run(self, media_id, file_path):
+        # The timeout counts from when the job starts, not from when it was queued
+        deadline = time.monotonic() + self.job_timeout
+        try:
+            process_ml(media_id, file_path, deadline=deadline)
+        except Exception as e:
+            print(f"Error processing ML for {media_id}: {e}")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchBackend:
+    """
+    In-process backend that coalesces jobs into micro-batches
+    (see app/services/batch_inference.py). Capacity is a full batch
+    in flight plus ML_QUEUE_SIZE waiting jobs.
+    """
+
+    def __init__(self, max_batch_size, max_wait_ms, decode_workers, queue_size, job_timeout):
+        self.engine = BatchInferenceEngine(
+            max_batch_size, max_wait_ms, decode_workers, job_timeout=job_timeout
+        )
+        self._slots = threading.BoundedSemaphore(max_batch_size + queue_size)
+
+    def submit(self, media_id, file_path):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("ML job queue is full")
+
+        future = self.engine.submit(media_id, file_path)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def queue_depth(self):
+        return self.engine.queue_depth()
+
+    def stats(self):
+        return self.engine.stats()
+
+    def shutdown(self):
+        self.engine.shutdown()
+
+
+class DbQueueBackend:
+    """
+    Database-backed backend (see app/tasks/db_queue.py). Jobs are rows in
+    ml_jobs, claimed by worker threads in this process and/or by separate
+    `python -m app.tasks.db_queue` processes. Backpressure counts QUEUED rows.
+    """
+
+    def __init__(self, queue_size, worker=None):
+        self.queue_size = queue_size
+        # None when this process only queues jobs (ML_DB_WORKERS=0)
+        self.worker = worker
+        if worker:
+            worker.start()
+
+    def submit(self, media_id, file_path):
+        if self.submit_batch([(media_id, file_path)]):
+            raise QueueFullError("ML job queue is full")
+
+    def submit_batch(self, jobs):
+        """Queue as many jobs as there is room for, in one insert. Returns the rejected media_ids."""
+        room = max(self.queue_size - db_queue.queue_depth(), 0)
+        accepted, rejected = jobs[:room], [media_id for media_id, _ in jobs[room:]]
+
+        if accepted:
+            db_queue.enqueue_jobs(accepted)
+            if self.worker:
+                self.worker.wake()
+        return rejected
+
+    def queue_depth(self):
+        return db_queue.queue_depth()
+
+    def shutdown(self):
+        if self.worker:
+            self.worker.shutdown()
+
+
+class CeleryBackend:
+    """
+    Celery backend. Jobs go to the broker configured in app/celery_worker.py.
+    Backpressure comes from the broker queue depth, checked on every submit.
+    """
+
+    def __init__(self, queue_size, job_timeout):
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+
+    def submit(self, media_id, file_path):
+        # Imported here so the thread backend never needs Celery/Redis
+        from app.celery_worker import celery
+        from app.services.ml_service import process_ml as process_ml_task
+
+        if self._queue_depth(celery) >= self.queue_size:
+            raise QueueFullError("ML job queue is full")
+
+        process_ml_task.apply_async(
+            args=[media_id, file_path],
+            kwargs={"timeout": self.job_timeout},
+            # Hard kill shortly after the soft deadline in process_ml
+            time_limit=self.job_timeout + 10,
+        )
+
+    def _queue_depth(self, celery):
+        with celery.connection_for_read() as conn:
+            queue = conn.default_channel.queue_declare(
+                queue=celery.conf.task_default_queue, passive=True
+            )
+            return queue.message_count
+
+    def shutdown(self):
+        pass
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = _create_executor()
+
+    return _executor
+
+
+def current_executor():
+    """The executor if this process created one, without creating it (used by /metrics)."""
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def _create_executor():
+    if config.ML_EXECUTOR == "celery":
+        return CeleryBackend(config.ML_QUEUE_SIZE, config.ML_JOB_TIMEOUT)
+
+    if config.ML_EXECUTOR == "batch":
+        return BatchBackend(
+            config.ML_BATCH_MAX_SIZE,
+            config.ML_BATCH_MAX_WAIT_MS,
+            config.ML_DECODE_WORKERS,
+            config.ML_QUEUE_SIZE,
+            config.ML_JOB_TIMEOUT,
+        )
+
+    if config.ML_EXECUTOR == "db":
+        worker = db_queue.create_worker() if config.ML_DB_WORKERS > 0 else None
+        return DbQueueBackend(config.ML_QUEUE_SIZE, worker)
+
+    if config.ML_EXECUTOR == "thread":
+        return ThreadPoolBackend(
+            config.ML_MAX_WORKERS, config.ML_QUEUE_SIZE, config.ML_JOB_TIMEOUT
+        )
+
+    raise ValueError(f"Unknown ML_EXECUTOR: {config.ML_EXECUTOR}")
+
+
+def enqueue_ml(media_id, file_path):
+    """Queue ML processing for an uploaded file. Raises QueueFullError on backpressure."""
+    get_executor().submit(media_id, file_path)
+
+
+def enqueue_ml_batch(jobs):
+    """
+    Queue ML processing for several uploads, given as (media_id, file_path) pairs.
+    Jobs submitted together land in the same micro-batch with the batch executor.
+    Returns the media_ids the queue had no room for; all others were queued.
+    """
+    executor = get_executor()
+    if hasattr(executor, "submit_batch"):
+        return executor.submit_batch(list(jobs))
+
+    rejected = []
+
+    for media_id, file_path in jobs:
+        try:
+            executor.submit(media_id, file_path)
+        except QueueFullError:
+            rejected.append(media_id)
+
+    return rejected
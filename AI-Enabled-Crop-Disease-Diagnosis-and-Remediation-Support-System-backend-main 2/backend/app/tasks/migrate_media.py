@@ -0,0 +1,193 @@
+import argparse
+from contextlib import contextmanager
+
+from sqlalchemy import DateTime, inspect, select, text
+
+from app.database import worker_engine
+from app.models.media import MEDIA_STATUSES, Media, canonical_media_id
+
+
+# Media Schema Migration
+# Converts a media table created by an older release to the compact schema in
+# app/models/media.py:
+#
+#   python -m app.tasks.migrate_media            # check, then migrate
+#   python -m app.tasks.migrate_media --check    # only report rows that can't be converted
+#
+#   media_id    varchar        -> uuid (16 bytes)
+#   status      varchar        -> media_status enum
+#   confidence  varchar "92%"  -> real 0.92 (the API still returns "92%")
+#   indexes     media_id (duplicate of the primary key) and user_id (prefix of
+#               user_id + created_at) are dropped; the partial indexes are added
+#   columns     added since the first release (ADDED_COLUMNS) are created, empty
+#
+# A table that doesn't exist yet is simply created. Rows whose media_id isn't a
+# UUID, or whose status is unknown, stop the migration before anything changes.
+#
+# On PostgreSQL the ALTERs rewrite the table under an ACCESS EXCLUSIVE lock, all
+# in one transaction: stop the API and workers first, and expect it to take
+# about as long as a full table copy. On SQLite the table is copied into a new
+# one in batches (SQLite can't change column types in place).
+
+BATCH_SIZE = 5000
+
+# Media columns the first release's table doesn't have. Left NULL on old rows.
+ADDED_COLUMNS = ("updated_at", "content_hash")
+
+
+def _parse_confidence(value):
+    """Stored "92%" (or a bare "0.92") -> 0.92. None for missing or unreadable values."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = value.strip()
+    try:
+        if value.endswith("%"):
+            return float(value[:-1]) / 100
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _find_problems(conn):
+    problems = []
+    rows = conn.execute(text("SELECT media_id, status FROM media"))
+    for media_id, status in rows:
+        if canonical_media_id(media_id) is None:
+            problems.append(f"media_id {media_id!r} is not a UUID")
+        if status not in MEDIA_STATUSES:
+            problems.append(f"media {media_id}: unknown status {status!r}")
+    return problems
+
+
+def _has_python_type(column_type):
+    try:
+        column_type.python_type
+    except NotImplementedError:
+        return False
+    return True
+
+
+@contextmanager
+def _transaction():
+    """One transaction around the whole migration, DDL included."""
+    if worker_engine.dialect.name != "sqlite":
+        with worker_engine.begin() as conn:
+            yield conn
+        return
+
+    # pysqlite commits on its own before DDL statements; manage the transaction by hand
+    with worker_engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql("BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+
+
+def _migrate_postgresql(conn):
+    statuses = ", ".join(f"'{status}'" for status in MEDIA_STATUSES)
+    added = [
+        f"ADD COLUMN IF NOT EXISTS {name} {Media.__table__.c[name].type.compile(conn.dialect)}"
+        for name in ADDED_COLUMNS
+    ]
+    for statement in (
+        # Dropped first so the rewrite doesn't rebuild them
+        "DROP INDEX IF EXISTS ix_media_media_id",
+        "DROP INDEX IF EXISTS ix_media_user_id",
+        f"CREATE TYPE media_status AS ENUM ({statuses})",
+        "ALTER TABLE media "
+        "ALTER COLUMN media_id TYPE uuid USING media_id::uuid, "
+        "ALTER COLUMN status TYPE media_status USING status::media_status, "
+        "ALTER COLUMN status SET NOT NULL, "
+        "ALTER COLUMN confidence TYPE real "
+        "USING NULLIF(rtrim(trim(confidence), '%'), '')::real / 100",
+        *(f"ALTER TABLE media {clause}" for clause in added),
+    ):
+        conn.execute(text(statement))
+
+    existing = {index["name"] for index in inspect(conn).get_indexes("media")}
+    for index in Media.__table__.indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+def _migrate_sqlite(conn):
+    conn.execute(text("ALTER TABLE media RENAME TO media_old"))
+    # The old indexes keep their names after the rename; free them for the new table
+    for index in inspect(conn).get_indexes("media_old"):
+        conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+    Media.__table__.create(conn)
+
+    old_columns = {column["name"] for column in inspect(conn).get_columns("media_old")}
+    columns = [
+        column.name if column.name in old_columns else f"NULL AS {column.name}"
+        for column in Media.__table__.columns
+    ]
+    old_rows = conn.execution_options(yield_per=BATCH_SIZE).execute(
+        text(f"SELECT {', '.join(columns)} FROM media_old").columns(
+            created_at=DateTime(), updated_at=DateTime()
+        )
+    )
+    for batch in old_rows.partitions():
+        rows = []
+        for row in batch:
+            row = dict(row._mapping)
+            row["media_id"] = canonical_media_id(row["media_id"])
+            row["confidence"] = _parse_confidence(row["confidence"])
+            rows.append(row)
+        conn.execute(Media.__table__.insert(), rows)
+
+    conn.execute(text("DROP TABLE media_old"))
+
+
+def migrate(check_only=False):
+    with _transaction() as conn:
+        if not inspect(conn).has_table("media"):
+            print("No media table yet; creating it with the current schema")
+            if not check_only:
+                Media.__table__.create(conn)
+            return True
+
+        confidence_type = {c["name"]: c["type"] for c in inspect(conn).get_columns("media")}["confidence"]
+        if not _has_python_type(confidence_type) or confidence_type.python_type is not str:
+            print("media table already uses the current schema")
+            return True
+
+        problems = _find_problems(conn)
+        for problem in problems:
+            print(problem)
+        if problems:
+            print(f"{len(problems)} row(s) can't be converted; fix or delete them, then run again")
+            return False
+
+        count = conn.scalar(select(text("count(*)")).select_from(text("media")))
+        if check_only:
+            print(f"All {count} rows can be converted")
+            return True
+
+        print(f"Migrating {count} rows ({conn.dialect.name})")
+        if conn.dialect.name == "postgresql":
+            _migrate_postgresql(conn)
+        else:
+            _migrate_sqlite(conn)
+
+    print("Done")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the media table to the compact schema.")
+    parser.add_argument("--check", action="store_true", help="Only report rows that can't be converted")
+    args = parser.parse_args(argv)
+
+    if not migrate(check_only=args.check):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,77 @@
-from app.database import SessionLocal
+from app.database import WorkerSessionLocal
 from app.models.media import Media
+from app.services.events import publish_media_update
+from app.services.feature_store import load_model_input
+from app.services.metrics import ML_BATCH_SIZE, ML_JOBS, ML_STAGE_SECONDS
+from app.services.model import get_model
+from app.services.result_cache import invalidate_media
+import logging
 import time
 
+logger = logging.getLogger(__name__)
 
-# Synchronous ML Task
-# This function simulates the Machine Learning processing pipeline.
-# In a real production environment, this would likely be offloaded to a worker queue (like Celery).
-def process_ml(media_id, file_path):
 
-    db = SessionLocal()
+# ML Task
+# Runs the diagnosis pipeline for a single image.
+# It runs off the request path: uploads hand it to the job queue in
+# app/tasks/job_queue.py, which calls it from a worker thread or a Celery worker.
+# Bursts of uploads are better served by the micro-batching engine in
+# app/services/batch_inference.py (ML_EXECUTOR=batch).
+#
+# deadline is a time.monotonic() value. If inference finishes after it, the
+# result is discarded and the media is marked FAILED instead.
+def process_ml(media_id, file_path, deadline=None):
 
-    media = db.query(Media).filter(Media.media_id == media_id).first()
+    db = WorkerSessionLocal()
+    user_id = None
 
-    if not media:
-        return
+    try:
+        media = db.query(Media).filter(Media.media_id == media_id).first()
 
-    media.status = "PROCESSING"
-    db.commit()
+        if not media:
+            return
 
-    print("ML STARTED")
+        user_id = media.user_id
+        media.status = "PROCESSING"
+        db.commit()
+        invalidate_media(media_id)
+        publish_media_update(media_id, user_id, "PROCESSING")
 
-    # simulate ML
-    time.sleep(5)
+        logger.debug("ML started: %s", media_id)
 
-    media.status = "COMPLETED"
-    media.result = "leaf_blight"
-    media.confidence = "92%"
+        image = load_model_input(media_id, file_path)
+        ML_BATCH_SIZE.observe(1)
+        with ML_STAGE_SECONDS.labels("forward").time():
+            label, confidence = get_model().predict(image[None])[0]
 
-    db.commit()
-    db.close()
+        if deadline is not None and time.monotonic() > deadline:
+            media.status = "FAILED"
+            db.commit()
+            invalidate_media(media_id)
+            publish_media_update(media_id, user_id, "FAILED")
+            ML_JOBS.labels("timed_out").inc()
+            logger.info("ML timed out: %s", media_id)
+            return
 
-    print("ML COMPLETED")
+        media.status = "COMPLETED"
+        media.result = label
+        media.confidence = float(confidence)
+
+        with ML_STAGE_SECONDS.labels("db_write").time():
+            db.commit()
+        ML_JOBS.labels("completed").inc()
+        invalidate_media(media_id)
+        publish_media_update(media_id, user_id, "COMPLETED", media.result, media.confidence)
+
+        logger.debug("ML completed: %s (%s, %.2f)", media_id, label, media.confidence)
+    except Exception:
+        # Never leave the row stuck in PROCESSING
+        ML_JOBS.labels("error").inc()
+        db.rollback()
+        db.query(Media).filter(Media.media_id == media_id).update({"status": "FAILED"})
+        db.commit()
+        invalidate_media(media_id)
+        publish_media_update(media_id, user_id, "FAILED")
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import bindparam, select, text, update
+
+from app import config
+from app.database import worker_engine
+from app.models.media import Media
+from app.services.feature_store import load_model_input
+from app.services.model import get_model
+from app.services.result_cache import invalidate_media
+
+
+# Bulk Re-diagnosis
+# Re-scores stored images with the current model, e.g. after a model upgrade:
+#
+#   python -m app.tasks.rescore --since 2024-01-01 --result leaf_blight --workers 8
+#
+# Rows are read in media_id order, one page (--page-size) per short read
+# transaction (keyset: media_id > last one read), and scored in chunks by a
+# process pool (one model per process). No read stays open while results are
+# written, which SQLite without WAL would refuse ("database is locked").
+# Results are written back in one statement per chunk, and the last media_id
+# written is checkpointed so an interrupted run continues where it stopped
+# (--checkpoint).
+#
+# Only COMPLETED rows are re-scored unless --status says otherwise. A row whose
+# image can't be loaded is left as it is.
+#
+# With RESULT_CACHE_BACKEND=memory the API processes don't see this job's cache
+# invalidations; their cached results expire after RESULT_CACHE_TTL.
+
+DEFAULT_CHECKPOINT = "rescore_checkpoint.json"
+
+
+def _score_chunk(rows):
+    """Runs in a pool process. rows: [(media_id, file_path)] -> (scored, failed_ids)."""
+    images = []
+    loaded = []
+    failed = []
+
+    for media_id, file_path in rows:
+        try:
+            images.append(load_model_input(media_id, os.path.join(config.UPLOAD_DIR, file_path)))
+            loaded.append(media_id)
+        except Exception as e:
+            print(f"Could not load image for {media_id}: {e}")
+            failed.append(media_id)
+
+    scored = []
+    if images:
+        predictions = get_model().predict(np.stack(images))
+        scored = [
+            (media_id, label, float(confidence))
+            for media_id, (label, confidence) in zip(loaded, predictions)
+        ]
+
+    return scored, failed
+
+
+def _query(filters, after):
+    query = select(Media.media_id, Media.file_path).where(
+        Media.status.in_(filters["status"]),
+        Media.file_path.isnot(None),
+    )
+
+    if filters["since"]:
+        query = query.where(Media.created_at >= datetime.fromisoformat(filters["since"]))
+    if filters["until"]:
+        query = query.where(Media.created_at < datetime.fromisoformat(filters["until"]))
+    if filters["user_id"]:
+        query = query.where(Media.user_id == filters["user_id"])
+    if filters["result"]:
+        query = query.where(Media.result == filters["result"])
+    if after:
+        # Keyset resume: media_id order is what the checkpoint records
+        query = query.where(Media.media_id > after)
+
+    return query.order_by(Media.media_id)
+
+
+def _write_results(conn, scored):
+    """Apply one chunk of results in a single statement."""
+    now = datetime.utcnow()
+
+    if conn.dialect.name == "postgresql":
+        # UPDATE ... FROM (VALUES ...): one statement, one round trip
+        values = ", ".join(f"(:id{i}, :result{i}, :confidence{i})" for i in range(len(scored)))
+        params = {"updated_at": now}
+        for i, (media_id, label, confidence) in enumerate(scored):
+            params.update({f"id{i}": media_id, f"result{i}": label, f"confidence{i}": confidence})
+
+        conn.execute(
+            text(
+                "UPDATE media SET result = v.result, confidence = v.confidence, "
+                "status = 'COMPLETED', updated_at = :updated_at "
+                f"FROM (VALUES {values}) AS v(media_id, result, confidence) "
+                "WHERE media.media_id = CAST(v.media_id AS uuid)"
+            ),
+            params,
+        )
+    else:
+        # executemany of one prepared UPDATE
+        conn.execute(
+            update(Media.__table__)
+            .where(Media.__table__.c.media_id == bindparam("b_media_id"))
+            .values(
+                result=bindparam("b_result"),
+                confidence=bindparam("b_confidence"),
+                status="COMPLETED",
+                updated_at=now,
+            ),
+            [
+                {"b_media_id": media_id, "b_result": label, "b_confidence": confidence}
+                for media_id, label, confidence in scored
+            ],
+        )
+
+
+def _load_checkpoint(path, filters, restart):
+    if restart or not os.path.exists(path):
+        return {"filters": filters, "last_media_id": None, "processed": 0, "updated": 0, "failed": 0}
+
+    with open(path) as f:
+        checkpoint = json.load(f)
+
+    if checkpoint["filters"] != filters:
+        raise SystemExit(
+            f"{path} belongs to a run with different filters: {checkpoint['filters']}. "
+            "Pass --restart to start over."
+        )
+
+    return checkpoint
+
+
+def _save_checkpoint(path, checkpoint):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def _pages(filters, after, page_size):
+    """Rows to re-score, in media_id order, read page_size at a time."""
+    while True:
+        with worker_engine.connect() as reader:
+            page = reader.execute(_query(filters, after).limit(page_size)).all()
+        if not page:
+            return
+        yield from page
+        after = page[-1].media_id
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append((row.media_id, row.file_path))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rescore(filters, workers, batch_size, page_size, checkpoint_path, restart=False):
+    checkpoint = _load_checkpoint(checkpoint_path, filters, restart)
+    if checkpoint["last_media_id"]:
+        print(f"Resuming after media_id {checkpoint['last_media_id']}")
+
+    started = time.monotonic()
+    run_processed = 0
+    last_report = started
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = _pages(filters, checkpoint["last_media_id"], page_size)
+
+        in_flight = deque()  # (last media_id of the chunk, future), in media_id order
+
+        def drain(limit):
+            nonlocal run_processed, last_report
+
+            while len(in_flight) > limit:
+                last_id, future = in_flight.popleft()
+                scored, failed = future.result()
+
+                if scored:
+                    with worker_engine.begin() as writer:
+                        _write_results(writer, scored)
+                    for media_id, _, _ in scored:
+                        invalidate_media(media_id)
+
+                checkpoint["last_media_id"] = last_id
+                checkpoint["processed"] += len(scored) + len(failed)
+                checkpoint["updated"] += len(scored)
+                checkpoint["failed"] += len(failed)
+                _save_checkpoint(checkpoint_path, checkpoint)
+
+                run_processed += len(scored) + len(failed)
+                now = time.monotonic()
+                if now - last_report >= 5:
+                    _report(checkpoint, run_processed, now - started)
+                    last_report = now
+
+        for chunk in _chunks(rows, batch_size):
+            in_flight.append((chunk[-1][0], pool.submit(_score_chunk, chunk)))
+            # Keep every worker busy without reading the whole table ahead
+            drain(workers * 2)
+
+        drain(0)
+
+    _report(checkpoint, run_processed, time.monotonic() - started)
+    return checkpoint
+
+
+def _report(checkpoint, run_processed, elapsed):
+    rate = run_processed / elapsed if elapsed else 0.0
+    print(
+        f"Re-scored {checkpoint['processed']} rows "
+        f"({checkpoint['updated']} updated, {checkpoint['failed']} failed), "
+        f"{rate:.1f} rows/s"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-diagnose stored images with the current model.")
+    parser.add_argument("--since", help="only media created at or after this ISO date/time")
+    parser.add_argument("--until", help="only media created before this ISO date/time")
+    parser.add_argument("--user-id", help="only media of this user")
+    parser.add_argument("--result", help="only media whose current diagnosis is this label")
+    parser.add_argument(
+        "--status", action="append",
+        help="statuses to re-score (repeatable, default COMPLETED)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=config.ML_BATCH_MAX_SIZE,
+                        help="images per model call and per UPDATE")
+    parser.add_argument("--page-size", "--yield-per", type=int, default=1000,
+                        help="rows read per query")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    filters = {
+        "since": args.since,
+        "until": args.until,
+        "user_id": args.user_id,
+        "result": args.result,
+        "status": sorted(args.status or ["COMPLETED"]),
+    }
+
+    rescore(filters, args.workers, args.batch_size, args.page_size, args.checkpoint, args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+from PIL import Image
+
+from benchmarks.server import BACKEND_DIR, BackendServer, rss_bytes
+
+
+# Benchmark Harness
+# Load-tests the upload -> diagnose -> poll loop against a fresh backend:
+#
+#   python -m benchmarks.run --db sqlite --concurrency 32 --duration 30
+#   python -m benchmarks.run --db postgres --mix upload=1,poll=6,history=2,diagnose=1
+#   python -m benchmarks.run --save-baseline          # record benchmarks/baselines/<db>.json
+#   python -m benchmarks.run --compare                # fail on a regression against it
+#
+# Operations (weights set by --mix):
+#   upload    POST /api/upload-media with a new media_id and unique image bytes
+#   poll      GET /api/media-status/{id} of an earlier upload
+#   history   GET /api/history of one of --users users
+#   diagnose  upload, then poll until COMPLETED: end-to-end inference latency
+#
+# The app runs with its stub model (ML_SIMULATED_DELAY, --ml-delay). Every run
+# uses a fixed --random-seed, so the same options replay the same traffic.
+# Reports p50/p95/p99 latency and throughput per operation, and the server's
+# peak RSS. Run from the backend directory.
+
+DEFAULT_MIX = "upload=2,poll=5,history=2,diagnose=1"
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+DIAGNOSE_TIMEOUT = 60
+DIAGNOSE_POLL_INTERVAL = 0.02
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("upload", "poll", "history", "diagnose"):
+            raise argparse.ArgumentTypeError(f"Unknown operation in --mix: {name}")
+        weights[name] = float(weight or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def make_images(count, size, rng):
+    """JPEGs of random noise. Decodable, and too noisy for content dedup to match."""
+    images = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        noise = bytes(rng.getrandbits(8) for _ in range(size * size * 3))
+        Image.frombytes("RGB", (size, size), noise).save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # Nearest rank
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Load:
+    """Shared state of one run: what has been uploaded, and every timing."""
+
+    def __init__(self, client, images, users, rng):
+        self.client = client
+        self.images = images
+        self.users = users
+        self.rng = rng
+        self.media_ids = []
+        self.latencies = {}  # operation -> [seconds]
+        self.errors = {}     # operation -> {status or exception name: count}
+        self.recording = False
+
+    def record(self, operation, seconds, error=None):
+        if not self.recording:
+            return
+        if error is None:
+            self.latencies.setdefault(operation, []).append(seconds)
+        else:
+            counts = self.errors.setdefault(operation, {})
+            counts[error] = counts.get(error, 0) + 1
+
+    async def upload(self):
+        media_id = str(uuid.uuid4())
+        # Trailing bytes after the JPEG end marker: ignored by decoders, but make
+        # every upload a new blob, so each one goes through inference
+        content = self.rng.choice(self.images) + uuid.uuid4().bytes
+        response = await self.client.post(
+            "/api/upload-media",
+            files={"file": (f"{media_id}.jpg", content, "image/jpeg")},
+            data={"media_id": media_id, "user_id": self.rng.choice(self.users)},
+        )
+        if response.status_code == 200:
+            self.media_ids.append(media_id)
+        return response, media_id
+
+    async def run(self, operation):
+        started = time.perf_counter()
+        try:
+            if operation == "upload":
+                response, _ = await self.upload()
+            elif operation == "poll":
+                if not self.media_ids:
+                    return
+                media_id = self.rng.choice(self.media_ids)
+                response = await self.client.get(f"/api/media-status/{media_id}")
+            elif operation == "history":
+                response = await self.client.get(
+                    "/api/history", params={"user_id": self.rng.choice(self.users)}
+                )
+            else:
+                await self.diagnose(started)
+                return
+        except httpx.HTTPError as e:
+            self.record(operation, None, type(e).__name__)
+            return
+
+        error = None if response.status_code == 200 else response.status_code
+        self.record(operation, time.perf_counter() - started, error)
+
+    async def diagnose(self, started):
+        response, media_id = await self.upload()
+        if response.status_code != 200:
+            self.record("diagnose", None, response.status_code)
+            return
+
+        while time.perf_counter() - started < DIAGNOSE_TIMEOUT:
+            status = (await self.client.get(f"/api/media-status/{media_id}")).json().get("status")
+            if status == "COMPLETED":
+                self.record("diagnose", time.perf_counter() - started)
+                return
+            if status == "FAILED":
+                self.record("diagnose", None, "FAILED")
+                return
+            await asyncio.sleep(DIAGNOSE_POLL_INTERVAL)
+
+        self.record("diagnose", None, "timeout")
+
+
+async def drive(base_url, args, pid):
+    rng = random.Random(args.random_seed)
+    images = make_images(args.images, args.image_size, rng)
+    users = [f"bench-user-{i}" for i in range(args.users)]
+    mix = parse_mix(args.mix)
+    operations, weights = list(mix), list(mix.values())
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=DIAGNOSE_TIMEOUT) as client:
+        load = Load(client, images, users, rng)
+
+        # Seed: data for poll/history to read, not measured
+        for _ in range(args.seed_uploads):
+            await load.upload()
+
+        rss_samples = []
+
+        async def sample_rss():
+            while True:
+                if pid:
+                    rss = rss_bytes(pid)
+                    if rss is not None:
+                        rss_samples.append(rss)
+                await asyncio.sleep(0.5)
+
+        async def user(stop_at):
+            while time.perf_counter() < stop_at:
+                await load.run(rng.choices(operations, weights)[0])
+
+        sampler = asyncio.create_task(sample_rss())
+
+        if args.warmup > 0:
+            stop_at = time.perf_counter() + args.warmup
+            await asyncio.gather(*[user(stop_at) for _ in range(args.concurrency)])
+
+        load.recording = True
+        rss_samples.clear()
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        await asyncio.gather(*[user(stop_at) for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+        load.recording = False
+
+        sampler.cancel()
+
+    return summarize(load, elapsed, rss_samples)
+
+
+def summarize(load, elapsed, rss_samples):
+    operations = {}
+    total = 0
+    for operation in sorted(set(load.latencies) | set(load.errors)):
+        values = sorted(load.latencies.get(operation, []))
+        errors = load.errors.get(operation, {})
+        total += len(values)
+        operations[operation] = {
+            "count": len(values),
+            "errors": sum(errors.values()),
+            "errors_by_kind": {str(kind): count for kind, count in errors.items()},
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else None,
+            **{
+                f"p{int(q * 100)}_ms": round(percentile(values, q) * 1000, 2) if values else None
+                for q in (0.5, 0.95, 0.99)
+            },
+        }
+
+    return {
+        "duration_seconds": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2),
+        "operations": operations,
+        "rss_mb": {
+            "max": round(max(rss_samples) / 2**20, 1) if rss_samples else None,
+            "end": round(rss_samples[-1] / 2**20, 1) if rss_samples else None,
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"\n{'operation':<10} {'count':>7} {'errors':>7} {'rps':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, op in result["operations"].items():
+        cells = [op[key] if op[key] is not None else "-" for key in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"{name:<10} {op['count']:>7} {op['errors']:>7} {op['throughput_rps']:>8} "
+              f"{cells[0]:>9} {cells[1]:>9} {cells[2]:>9}")
+    print(f"\ntotal {result['throughput_rps']} req/s over {result['duration_seconds']}s, "
+          f"server RSS max {result['rss_mb']['max']} MB")
+
+
+def compare(result, baseline, tolerance):
+    """Regressions of result against baseline beyond tolerance (a fraction), as messages."""
+    if baseline["meta"]["options"] != result["meta"]["options"]:
+        print("warning: the baseline was recorded with different options; numbers may not compare")
+
+    regressions = []
+    for name, base in baseline["operations"].items():
+        current = result["operations"].get(name)
+        if current is None:
+            regressions.append(f"{name}: not measured in this run")
+            continue
+
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if base[key] and current[key] and current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {base[key]} -> {current[key]}")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name} throughput_rps: {base['throughput_rps']} -> {current['throughput_rps']}"
+            )
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name} errors: {base['errors']} -> {current['errors']}")
+
+    base_rss, rss = baseline["rss_mb"]["max"], result["rss_mb"]["max"]
+    if base_rss and rss and rss > base_rss * (1 + tolerance):
+        regressions.append(f"rss_mb max: {base_rss} -> {rss}")
+
+    return regressions
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the upload -> diagnose -> poll loop.")
+    parser.add_argument("--db", choices=["sqlite", "postgres"], default="sqlite",
+                        help="database of the started backend (postgres needs initdb/pg_ctl)")
+    parser.add_argument("--database-url", help="use this database instead of a fresh one")
+    parser.add_argument("--url", help="benchmark an already running backend instead of starting one")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--ml-executor", default="batch", help="ML_EXECUTOR of the started backend")
+    parser.add_argument("--ml-delay", type=float, default=0.05,
+                        help="stub model time per forward pass, seconds (ML_SIMULATED_DELAY)")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before that")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed-uploads", type=int, default=50, help="uploads made before the run")
+    parser.add_argument("--images", type=int, default=20, help="distinct images to upload")
+    parser.add_argument("--image-size", type=int, default=640, help="image width and height, pixels")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--output", help="result JSON (default benchmarks/results/<time>-<db>.json)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="also save the result as the baseline of this --db")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare with the baseline of this --db; exit 1 on a regression")
+    parser.add_argument("--baseline", help="baseline file (default benchmarks/baselines/<db>.json)")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before --compare fails, as a fraction")
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    server = None
+    if args.url:
+        base_url, pid = args.url, None
+    else:
+        server = BackendServer(
+            db=args.db,
+            database_url=args.database_url,
+            workers=args.server_workers,
+            env={
+                "ML_EXECUTOR": args.ml_executor,
+                "ML_SIMULATED_DELAY": str(args.ml_delay),
+            },
+        )
+        print(f"Starting backend ({args.db}) in {server.workdir}")
+        server.start()
+        base_url, pid = server.url, server.pid
+
+    try:
+        result = asyncio.run(drive(base_url, args, pid))
+    finally:
+        if server:
+            server.stop()
+
+    options = {
+        key: value for key, value in vars(args).items()
+        if key not in ("output", "save_baseline", "compare", "baseline", "tolerance", "url", "database_url")
+    }
+    result = {
+        "meta": {
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "options": options,
+        },
+        **result,
+    }
+
+    print_report(result)
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    output = args.output or os.path.join(RESULTS_DIR, f"{stamp}-{args.db}.json")
+    _write_json(output, result)
+    print(f"Result saved to {output}")
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.db}.json")
+    if args.save_baseline:
+        _write_json(baseline_path, result)
+        print(f"Baseline saved to {baseline_path}")
+
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            sys.exit(f"No baseline at {baseline_path}; record one with --save-baseline")
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {baseline_path} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+# Benchmark Servers
+# Starts the backend (and, for --db postgres, a throwaway Postgres cluster) in
+# a temporary directory, so every run begins from an empty database and
+# upload folder. Everything is removed again by stop().
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until(check, timeout, what):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"{what} did not start within {timeout}s")
+
+
+class EphemeralPostgres:
+    """A private Postgres cluster (initdb + pg_ctl from PATH) on a free local port."""
+
+    def __init__(self, workdir):
+        for tool in ("initdb", "pg_ctl"):
+            if shutil.which(tool) is None:
+                raise RuntimeError(
+                    f"{tool} not found on PATH; install PostgreSQL or pass --database-url"
+                )
+
+        self.data_dir = os.path.join(workdir, "pgdata")
+        self.port = free_port()
+
+    @property
+    def url(self):
+        return f"postgresql+psycopg2://postgres@127.0.0.1:{self.port}/postgres"
+
+    def start(self):
+        subprocess.run(
+            ["initdb", "-D", self.data_dir, "-U", "postgres", "--auth=trust", "--no-sync"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        options = (
+            f"-p {self.port} -c listen_addresses=127.0.0.1 -k {self.data_dir} "
+            # Durability doesn't matter for a throwaway cluster; the app's queries do
+            "-c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+        )
+        subprocess.run(
+            ["pg_ctl", "-D", self.data_dir, "-o", options, "-w", "-l",
+             os.path.join(self.data_dir, "server.log"), "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+
+    def stop(self):
+        subprocess.run(
+            ["pg_ctl", "-D", self.data_dir, "-m", "immediate", "stop"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+
+class BackendServer:
+    """The FastAPI app under uvicorn, configured for benchmarking."""
+
+    def __init__(self, db="sqlite", database_url=None, workers=1, env=None):
+        self.workdir = tempfile.mkdtemp(prefix="crop-bench-")
+        self.port = free_port()
+        self.workers = workers
+        self.extra_env = env or {}
+        self.postgres = None
+        self.process = None
+
+        if database_url:
+            self.database_url = database_url
+        elif db == "postgres":
+            self.postgres = EphemeralPostgres(self.workdir)
+            self.database_url = self.postgres.url
+        elif db == "sqlite":
+            self.database_url = f"sqlite:///{os.path.join(self.workdir, 'bench.db')}"
+        else:
+            raise ValueError(f"Unknown database: {db}")
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    def start(self):
+        if self.postgres:
+            self.postgres.start()
+
+        env = {
+            **os.environ,
+            "DATABASE_URL": self.database_url,
+            "UPLOAD_DIR": os.path.join(self.workdir, "uploads"),
+            "RESUMABLE_UPLOAD_DIR": os.path.join(self.workdir, "upload_sessions"),
+            "FEATURE_STORE_DIR": os.path.join(self.workdir, "feature_store"),
+            **self.extra_env,
+        }
+        # The API doesn't create tables itself
+        subprocess.run(
+            [sys.executable, "-m", "app.tasks.init_db"],
+            cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=open(os.path.join(self.workdir, "server.log"), "wb"),
+            stderr=subprocess.STDOUT,
+        )
+
+        def healthy():
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"Backend exited with {self.process.returncode}; "
+                    f"see {os.path.join(self.workdir, 'server.log')}"
+                )
+            try:
+                return httpx.get(f"{self.url}/health/ready", timeout=1).status_code == 200
+            except httpx.HTTPError:
+                return False
+
+        _wait_until(healthy, 60, "Backend")
+
+    def stop(self, keep_workdir=False):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.postgres:
+            self.postgres.stop()
+        if not keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def rss_bytes(pid):
+    """Resident memory of a process and its children (uvicorn workers), from /proc. None off Linux."""
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+    except (FileNotFoundError, ProcessLookupError):
+        if current == pid:
+            return None
+    return total
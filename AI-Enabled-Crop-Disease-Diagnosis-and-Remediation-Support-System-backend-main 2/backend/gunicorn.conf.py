@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+
+# Production server:
+#
+#   python -m app.tasks.init_db
+#   gunicorn app.main:app -c gunicorn.conf.py
+#
+# preload_app imports the app once in the master, and on_starting loads the
+# model there too. Forked workers share those pages copy-on-write instead of
+# each importing and loading everything again, which also makes new workers
+# start faster. Each worker then runs the app lifespan (app/main.py): its own
+# connection pools and ML executor threads.
+#
+# With PROMETHEUS_MULTIPROC_DIR set (see app/services/metrics.py), wipe that
+# directory before every start of the master, e.g.
+#
+#   rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+#
+# Files left by a previous run are read as if their processes were still alive.
+# child_exit below marks workers that exit, so restarted workers don't keep
+# adding the live gauges of dead ones.
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def on_starting(server):
+    from app import config
+    from app.services.knowledge_base import get_knowledge_base
+    from app.services.model import get_model
+
+    get_knowledge_base()
+    if config.ML_WARMUP:
+        get_model()
+
+
+def post_fork(server, worker):
+    from app.database import discard_inherited_connections
+
+    discard_inherited_connections()
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,14 +1,14 @@
 import requests
 import uuid
 import os
+from PIL import Image
 
 BASE_URL = "http://127.0.0.1:8000/api"
 UPLOAD_URL = f"{BASE_URL}/upload-media"
 
 # Create a dummy image file
 dummy_filename = "test_image.jpg"
-with open(dummy_filename, "wb") as f:
-    f.write(os.urandom(1024))  # 1KB of random data
+Image.frombytes("RGB", (32, 32), os.urandom(32 * 32 * 3)).save(dummy_filename, "JPEG")  # decodable random noise
 
 try:
     # 1. Generate a client-side ID
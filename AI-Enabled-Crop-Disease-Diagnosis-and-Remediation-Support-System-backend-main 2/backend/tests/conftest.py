@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import base
+from app.models import blob, media, ml_job  # noqa: F401
+from app.services import batch_inference
+from app.tasks import db_queue
+
+
+@pytest.fixture
+def worker_db(tmp_path, monkeypatch):
+    """A fresh SQLite database behind the worker engine and sessions of the ML pipeline."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'worker.db'}")
+    base.Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    monkeypatch.setattr(db_queue, "worker_engine", engine)
+    monkeypatch.setattr(batch_inference, "WorkerSessionLocal", session_factory)
+
+    yield session_factory
+    engine.dispose()
@@ -0,0 +1,164 @@
+import threading
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from app.models.media import Media
+from app.services import batch_inference
+from app.services.batch_inference import BatchInferenceEngine, InferenceJob
+
+# Run from backend/ (python -m pytest tests) so `app` is importable.
+# Unlike test_integration.py, no running server is needed.
+
+UNREADABLE = "unreadable.jpg"
+
+
+class FakeModel:
+    """Labels every image "leaf_blight" with 0.9; records the size of each forward pass."""
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def predict(self, images):
+        with self.lock:
+            self.batch_sizes.append(len(images))
+        return [("leaf_blight", 0.9)] * len(images)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(batch_inference, "get_model", lambda: model)
+
+    def load_model_input(media_id, file_path):
+        if file_path == UNREADABLE:
+            raise OSError("cannot identify image file")
+        return np.zeros((4, 4, 3), dtype=np.uint8)
+
+    monkeypatch.setattr(batch_inference, "load_model_input", load_model_input)
+    return model
+
+
+@pytest.fixture
+def make_engine():
+    engines = []
+
+    def make(max_batch_size=4, max_wait_ms=50, collect=True, job_timeout=None):
+        engine = BatchInferenceEngine(max_batch_size, max_wait_ms, 2, job_timeout=job_timeout, collect=collect)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.shutdown()
+
+
+def _add_media(session_factory, count, status="UPLOADED"):
+    media_ids = [str(uuid.uuid4()) for _ in range(count)]
+    with session_factory() as db:
+        db.add_all(Media(media_id=media_id, status=status, file_path="a.jpg") for media_id in media_ids)
+        db.commit()
+    return media_ids
+
+
+def _statuses(session_factory):
+    with session_factory() as db:
+        return dict(db.query(Media.media_id, Media.status))
+
+
+def test_run_batch_writes_every_result(worker_db, model, make_engine):
+    engine = make_engine(collect=False)
+    good = _add_media(worker_db, 2)
+    bad = _add_media(worker_db, 1)
+
+    jobs = [InferenceJob(media_id, "a.jpg") for media_id in good] + [InferenceJob(bad[0], UNREADABLE)]
+    engine.run_batch(jobs)
+
+    # One forward pass for the decodable images; the other one fails on its own
+    assert model.batch_sizes == [2]
+    assert _statuses(worker_db) == {good[0]: "COMPLETED", good[1]: "COMPLETED", bad[0]: "FAILED"}
+    with worker_db() as db:
+        assert db.get(Media, good[0]).result == "leaf_blight"
+        assert db.get(Media, good[0]).confidence == pytest.approx(0.9)
+    assert all(job.future.done() for job in jobs)
+    assert engine.stats()["failed_items"] == 1
+
+
+def test_batch_past_its_timeout_is_failed(worker_db, model, make_engine):
+    engine = make_engine(collect=False, job_timeout=0.01)
+    media_ids = _add_media(worker_db, 2)
+
+    jobs = [InferenceJob(media_id, "a.jpg", enqueued_at=time.monotonic()) for media_id in media_ids]
+    real_predict = model.predict
+
+    def slow_predict(images):
+        time.sleep(0.05)
+        return real_predict(images)
+
+    model.predict = slow_predict
+    engine.run_batch(jobs)
+    assert set(_statuses(worker_db).values()) == {"FAILED"}
+
+
+def test_collector_flushes_a_full_batch_without_waiting(worker_db, model, make_engine):
+    engine = make_engine(max_batch_size=4, max_wait_ms=10_000)
+    media_ids = _add_media(worker_db, 4)
+
+    started = time.monotonic()
+    futures = [engine.submit(media_id, "a.jpg") for media_id in media_ids]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert time.monotonic() - started < 5
+    assert model.batch_sizes == [4]
+    assert set(_statuses(worker_db).values()) == {"COMPLETED"}
+
+
+def test_collector_flushes_a_partial_batch_after_max_wait(worker_db, model, make_engine):
+    engine = make_engine(max_batch_size=8, max_wait_ms=100)
+    media_ids = _add_media(worker_db, 3)
+
+    started = time.monotonic()
+    futures = [engine.submit(media_id, "a.jpg") for media_id in media_ids]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert time.monotonic() - started >= 0.09
+    assert model.batch_sizes == [3]
+    assert engine.stats()["last_batch_size"] == 3
+
+
+def test_collector_marks_a_crashed_batch_failed(worker_db, model, make_engine):
+    engine = make_engine(max_batch_size=2, max_wait_ms=10)
+    media_ids = _add_media(worker_db, 2)
+
+    def crash(images):
+        raise RuntimeError("model crashed")
+
+    model.predict = crash
+    futures = [engine.submit(media_id, "a.jpg") for media_id in media_ids]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+    assert set(_statuses(worker_db).values()) == {"FAILED"}
+
+
+def test_mark_failed_skips_completed_rows(worker_db, make_engine, monkeypatch):
+    engine = make_engine(collect=False)
+    completed = _add_media(worker_db, 1, status="COMPLETED")
+    processing = _add_media(worker_db, 1, status="PROCESSING")
+
+    published = []
+    monkeypatch.setattr(
+        batch_inference,
+        "publish_media_update",
+        lambda media_id, user_id, status, *args: published.append((media_id, status)),
+    )
+    engine.mark_failed(completed + processing)
+
+    assert _statuses(worker_db) == {completed[0]: "COMPLETED", processing[0]: "FAILED"}
+    assert published == [(processing[0], "FAILED")]
@@ -0,0 +1,142 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.media import Media
+from app.models.ml_job import MlJob
+from app.tasks import db_queue
+
+# Run from backend/ (python -m pytest tests) so `app` is importable.
+# Unlike test_integration.py, no running server is needed.
+
+LEASE = 30
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 10
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """db_queue's notion of now, moved by hand."""
+    now = [datetime(2024, 1, 1)]
+    monkeypatch.setattr(db_queue, "_now", lambda: now[0])
+    return now
+
+
+def _add_media(session_factory, status="UPLOADED"):
+    media_id = str(uuid.uuid4())
+    with session_factory() as db:
+        db.add(Media(media_id=media_id, status=status, file_path=f"{media_id}.jpg"))
+        db.commit()
+    return media_id
+
+
+def _claim(worker_id, limit=10):
+    return db_queue.claim_jobs(worker_id, limit, LEASE, MAX_ATTEMPTS)
+
+
+def _jobs(session_factory):
+    with session_factory() as db:
+        return {job.media_id: (job.status, job.attempts, job.lease_owner) for job in db.query(MlJob)}
+
+
+def test_claimed_jobs_are_leased_to_one_worker(worker_db, clock):
+    media_ids = [str(uuid.uuid4()) for _ in range(3)]
+    db_queue.enqueue_jobs([(media_id, f"/uploads/{media_id}.jpg") for media_id in media_ids])
+    assert db_queue.queue_depth() == 3
+
+    claimed, dead = _claim("a", limit=2)
+    assert len(claimed) == 2 and dead == []
+    assert all(job.attempts == 1 for job in claimed)
+
+    # The rest goes to the next worker; leased jobs are not claimed twice
+    claimed_b, _ = _claim("b")
+    assert [job.media_id for job in claimed_b] == sorted(set(media_ids) - {job.media_id for job in claimed})
+    assert _claim("c") == ([], [])
+    assert db_queue.queue_depth() == 0
+
+
+def test_expired_lease_is_reclaimed(worker_db, clock):
+    db_queue.enqueue_jobs([(str(uuid.uuid4()), "/uploads/a.jpg")])
+    (job,), _ = _claim("a")
+
+    # Heartbeats keep the lease alive...
+    clock[0] += timedelta(seconds=LEASE - 1)
+    db_queue.extend_leases("a", [job.id], LEASE)
+    clock[0] += timedelta(seconds=LEASE - 1)
+    assert _claim("b") == ([], [])
+
+    # ...until they stop
+    clock[0] += timedelta(seconds=2)
+    (reclaimed,), _ = _claim("b")
+    assert reclaimed.id == job.id and reclaimed.attempts == 2
+
+    # The first worker no longer owns it: neither its heartbeat nor its completion counts
+    db_queue.extend_leases("a", [job.id], LEASE)
+    db_queue.complete_jobs("a", [job.id])
+    assert _jobs(worker_db)[job.media_id] == ("RUNNING", 2, "b")
+
+    db_queue.complete_jobs("b", [job.id])
+    assert _jobs(worker_db) == {}
+
+
+def test_failed_jobs_are_retried_with_backoff(worker_db, clock):
+    db_queue.enqueue_jobs([(str(uuid.uuid4()), "/uploads/a.jpg")])
+
+    for attempt in (1, 2):
+        (job,), _ = _claim("a")
+        assert job.attempts == attempt
+        assert db_queue.release_failed_jobs("a", [job], "boom", MAX_ATTEMPTS, RETRY_DELAY) == []
+
+        # Not before RETRY_DELAY * 2 ** (attempt - 1)
+        delay = RETRY_DELAY * 2 ** (attempt - 1)
+        clock[0] += timedelta(seconds=delay - 1)
+        assert _claim("a") == ([], [])
+        clock[0] += timedelta(seconds=1)
+
+    (job,), _ = _claim("a")
+    assert job.attempts == MAX_ATTEMPTS
+    assert db_queue.release_failed_jobs("a", [job], "boom", MAX_ATTEMPTS, RETRY_DELAY) == [job.media_id]
+
+    assert _jobs(worker_db)[job.media_id] == ("DEAD", MAX_ATTEMPTS, None)
+    clock[0] += timedelta(days=1)
+    assert _claim("a") == ([], [])
+
+
+def test_lease_expiring_on_the_last_attempt_dead_letters_the_job(worker_db, clock):
+    db_queue.enqueue_jobs([(str(uuid.uuid4()), "/uploads/a.jpg")])
+    for _ in range(MAX_ATTEMPTS):
+        (job,), dead = _claim("a")
+        assert dead == []
+        clock[0] += timedelta(seconds=LEASE + 1)
+
+    claimed, dead = _claim("b")
+    assert claimed == [] and dead == [job.media_id]
+    assert _jobs(worker_db)[job.media_id] == ("DEAD", MAX_ATTEMPTS, None)
+
+
+def test_dead_letter_does_not_fail_a_completed_diagnosis(worker_db, clock, monkeypatch):
+    # Another worker holding the job finished it; this one gives up on it
+    completed = _add_media(worker_db, status="COMPLETED")
+    stuck = _add_media(worker_db, status="PROCESSING")
+    db_queue.enqueue_jobs([(completed, "/uploads/a.jpg"), (stuck, "/uploads/b.jpg")])
+
+    worker = db_queue.DbQueueWorker(
+        threads=1, batch_size=10, decode_workers=1, job_timeout=60,
+        lease_seconds=LEASE, poll_interval=1, max_attempts=1, retry_delay=RETRY_DELAY,
+    )
+
+    def failing_batch(batch):
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(worker.engine, "run_batch", failing_batch)
+    try:
+        claimed, _ = _claim(worker.worker_id)
+        worker._run(claimed)
+    finally:
+        worker.engine.shutdown()
+
+    with worker_db() as db:
+        statuses = dict(db.query(Media.media_id, Media.status))
+    assert statuses == {completed: "COMPLETED", stuck: "FAILED"}
+    assert {status for status, _, _ in _jobs(worker_db).values()} == {"DEAD"}
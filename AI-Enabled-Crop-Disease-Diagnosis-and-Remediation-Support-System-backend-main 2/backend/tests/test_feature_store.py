@@ -0,0 +1,133 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app import config
+from app.services import feature_store
+from app.services.feature_store import FeatureStore, load_model_input
+from app.services.model import INPUT_SIZE
+
+# Run from backend/ (python -m pytest tests) so `app` is importable.
+# Unlike test_integration.py, no running server is needed.
+
+SHAPE = (4, 4, 3)
+
+
+def _pixels(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+def _store(directory, shard_rows=2):
+    # refresh_seconds=0: every miss re-reads the .idx files, as after FEATURE_STORE_REFRESH_SECONDS
+    return FeatureStore(str(directory), shard_rows, 0)
+
+
+def _files(directory, extension):
+    return sorted(name for name in os.listdir(directory) if name.endswith(extension))
+
+
+def test_rows_are_appended_to_shards(tmp_path):
+    store = _store(tmp_path)
+    for i in range(3):
+        store.put(f"m{i}", _pixels(i))
+
+    # Two rows fill the first shard; the third starts a new one
+    shards = store.shards()
+    assert [rows for _, rows in shards] == [[("m0", 0), ("m1", 1)], [("m2", 0)]]
+    assert len(_files(tmp_path, ".npy")) == len(_files(tmp_path, ".idx")) == 2
+
+    first = store.open_shard(shards[0][0])
+    assert first.shape == (2,) + SHAPE
+    assert (first[1] == 1).all()
+
+    for i in range(3):
+        assert (store.get(f"m{i}") == i).all()
+    assert store.get("unknown") is None
+    assert store.stats() == {"media": 3, "shards": 2}
+
+
+def test_put_of_a_stored_media_is_skipped(tmp_path):
+    store = _store(tmp_path)
+    store.put("m0", _pixels(1))
+    store.put("m0", _pixels(2))
+
+    assert (store.get("m0") == 1).all()
+    assert store.stats()["media"] == 1
+
+
+def test_rows_of_another_process_are_found(tmp_path):
+    writer = _store(tmp_path)
+    reader = _store(tmp_path)
+
+    writer.put("m0", _pixels(7))
+    assert (reader.get("m0") == 7).all()
+
+
+def test_index_ahead_of_a_truncated_shard(tmp_path):
+    store = _store(tmp_path)
+    store.put("m0", _pixels(3))
+    store.put("m1", _pixels(4))
+
+    # A crash left the .idx lines on disk but not the shard data
+    shard = _files(tmp_path, ".npy")[0]
+    with open(tmp_path / shard, "r+b") as f:
+        f.truncate(64)
+
+    restarted = _store(tmp_path)
+    assert restarted.get("m0") is None
+    assert restarted.open_shard(shard[:-len(".npy")]) is None
+
+    # The media is stored again in a new shard
+    restarted.put("m0", _pixels(3))
+    assert (restarted.get("m0") == 3).all()
+
+
+def test_index_ahead_of_the_shard_rows(tmp_path):
+    store = _store(tmp_path)
+    store.put("m0", _pixels(3))
+
+    index = tmp_path / _files(tmp_path, ".idx")[0]
+    with open(index, "a") as f:
+        f.write("m9\t5\n")  # a row the shard doesn't have
+        f.write("torn line\n")
+        f.write("m8\t")     # still being written
+
+    restarted = _store(tmp_path)
+    assert restarted.get("m9") is None
+    assert restarted.get("m8") is None
+    assert (restarted.get("m0") == 3).all()
+
+
+@pytest.fixture
+def enabled_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "FEATURE_STORE_ENABLED", True)
+    monkeypatch.setattr(config, "FEATURE_STORE_DIR", str(tmp_path / "features"))
+    monkeypatch.setattr(feature_store, "_store", None)
+    yield
+    monkeypatch.setattr(feature_store, "_store", None)
+
+
+def test_load_model_input_round_trip(tmp_path, enabled_store):
+    path = tmp_path / "leaf.png"
+    Image.new("RGB", (300, 200), (255, 0, 0)).save(path)
+
+    decoded = load_model_input("m0", str(path))
+    assert decoded.shape == INPUT_SIZE + (3,)
+    assert decoded.dtype == np.float32
+    assert decoded[0, 0].tolist() == [1.0, 0.0, 0.0]
+
+    # The second load comes from the store, not the file
+    os.remove(path)
+    assert np.array_equal(load_model_input("m0", str(path)), decoded)
+    assert feature_store.get_feature_store().stats()["media"] == 1
+
+
+def test_load_model_input_without_the_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "FEATURE_STORE_ENABLED", False)
+    path = tmp_path / "leaf.png"
+    Image.new("RGB", (50, 50), (0, 0, 255)).save(path)
+
+    assert feature_store.get_feature_store() is None
+    assert load_model_input("m0", str(path))[0, 0].tolist() == [0.0, 0.0, 1.0]
@@ -2,6 +2,11 @@ import pytest
 import httpx
 import uuid
 import os
+import json
+import base64
+from datetime import datetime, timedelta, timezone
+import io
+from PIL import Image
 
 # --- CONFIGURATION ---
 BASE_URL = "http://localhost:8000"
@@ -14,9 +19,9 @@ def test_client():
         yield client
 
 def create_dummy_image():
-    # Create a small dummy image for testing upload
-    with open(TEST_IMAGE_PATH, "wb") as f:
-        f.write(os.urandom(1024))
+    # Create a small random-noise JPEG for testing upload.
+    # It must be decodable: the ML pipeline marks undecodable uploads FAILED.
+    Image.frombytes("RGB", (32, 32), os.urandom(32 * 32 * 3)).save(TEST_IMAGE_PATH, "JPEG")
 
 def remove_dummy_image():
     if os.path.exists(TEST_IMAGE_PATH):
@@ -108,6 +113,33 @@ def test_static_file_serving(test_client):
     assert response.status_code == 200
     assert response.headers["content-type"] in ["image/jpeg", "image/png"]
 
+    # Thumbnail request: the test image is smaller than any thumbnail,
+    # so the original is served
+    response = test_client.get(file_url, params={"size": 128})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+
+def test_other_image_formats_are_served(test_client):
+    """TC_BACKEND_03: Verify originals in other image formats are served, internal files are not"""
+    user_id = str(uuid.uuid4())
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (32, 32), os.urandom(32 * 32 * 3)).save(buffer, "WEBP")
+
+    response = test_client.post(
+        "/api/upload-media",
+        files={"file": ("leaf.webp", buffer.getvalue(), "image/webp")},
+        data={"media_id": str(uuid.uuid4()), "user_id": user_id},
+    )
+    assert response.status_code in [200, 201]
+
+    file_path = test_client.get(f"/api/history?user_id={user_id}").json()[0]["file_path"]
+    response = test_client.get(f"/uploads/{file_path}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+
+    model_input = file_path.rsplit(".", 1)[0] + ".input.npy"
+    assert test_client.get(f"/uploads/{model_input}").status_code == 404
+
 def test_user_isolation(test_client):
     """TC_ISOLATION_01: Verify User Data Separation"""
     # 1. Create two distinct users
@@ -155,3 +187,175 @@ def test_user_isolation(test_client):
         
     finally:
         remove_dummy_image()
+
+def test_history_pagination(test_client):
+    """TC_HISTORY_02: Verify History is paged with a keyset cursor"""
+    first = test_client.get("/api/history", params={"limit": 1})
+    assert first.status_code == 200
+    assert len(first.json()) == 1
+    assert "X-Server-Time" in first.headers
+
+    cursor = first.headers.get("X-Next-Cursor")
+    assert cursor, "Expected more than one page of history"
+
+    second = test_client.get("/api/history", params={"limit": 1, "cursor": cursor})
+    assert second.status_code == 200
+    assert len(second.json()) == 1
+    assert second.json()[0]["media_id"] != first.json()[0]["media_id"]
+
+    # since with an offset: two hours ago, written as local time in UTC+05:00
+    server_time = datetime.fromisoformat(first.headers["X-Server-Time"])
+    since = (server_time - timedelta(hours=2)).replace(tzinfo=timezone.utc)
+    since = since.astimezone(timezone(timedelta(hours=5))).isoformat()
+    changed = test_client.get("/api/history", params={"since": since})
+    assert changed.status_code == 200
+    assert TEST_MEDIA_ID in [item["media_id"] for item in changed.json()]
+
+def test_bulk_status_lookup(test_client):
+    """TC_SYNC_01: Verify Bulk Status Lookup for offline queue reconciliation"""
+    unknown_id = str(uuid.uuid4())
+    response = test_client.post(
+        "/api/media-status/bulk",
+        json={"media_ids": [TEST_MEDIA_ID, unknown_id]},
+    )
+    assert response.status_code == 200
+
+    body = response.json()
+    assert body["results"][TEST_MEDIA_ID]["status"] in ["UPLOADED", "PROCESSING", "COMPLETED"]
+    assert body["missing"] == [unknown_id]
+
+    # Nothing changed since the previous call's server time
+    response = test_client.post(
+        "/api/media-status/bulk",
+        json={"media_ids": [TEST_MEDIA_ID], "since": "2999-01-01T00:00:00"},
+    )
+    assert response.json()["results"] == {}
+
+    # Offsets are accepted too
+    response = test_client.post(
+        "/api/media-status/bulk",
+        json={"media_ids": [TEST_MEDIA_ID], "since": "2999-01-01T05:30:00+05:30"},
+    )
+    assert response.status_code == 200
+    assert response.json()["results"] == {}
+
+def test_status_revalidation(test_client):
+    """TC_STATUS_01: Verify status responses carry an ETag answered with 304"""
+    response = test_client.get(f"/api/media-status/{TEST_MEDIA_ID}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("private")
+    etag = response.headers["etag"]
+
+    # If-None-Match is a list of tags
+    response = test_client.get(
+        f"/api/media-status/{TEST_MEDIA_ID}",
+        headers={"If-None-Match": f'"other", {etag}'},
+    )
+    assert response.status_code == 304
+
+    response = test_client.get(
+        f"/api/media-status/{TEST_MEDIA_ID}",
+        headers={"If-None-Match": etag[:-2] + '"'},
+    )
+    assert response.status_code == 200
+
+def test_batch_upload(test_client):
+    """TC_SYNC_02: Verify Batch Upload of the offline queue in one request"""
+    new_id = str(uuid.uuid4())
+    create_dummy_image()
+    try:
+        with open(TEST_IMAGE_PATH, "rb") as f:
+            content = f.read()
+
+        files = [
+            ("files", ("a.jpg", content, "image/jpeg")),
+            ("files", ("b.jpg", content, "image/jpeg")),
+        ]
+        items = [{"media_id": TEST_MEDIA_ID}, {"media_id": new_id, "user_id": "user_batch"}]
+        response = test_client.post(
+            "/api/upload-media/batch", files=files, data={"items": json.dumps(items)}
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["media_id"] for r in results] == [TEST_MEDIA_ID, new_id]
+        # Already uploaded earlier -> deduplicated, not processed twice
+        assert "deduplicated" in results[0]["message"]
+        assert results[1]["status"] in ["UPLOADED", "COMPLETED"]
+    finally:
+        remove_dummy_image()
+
+def test_resumable_upload(test_client):
+    """TC_UPLOAD_02: Verify Resumable Upload continues from the last received byte"""
+    resumable_id = str(uuid.uuid4())
+    create_dummy_image()
+    try:
+        with open(TEST_IMAGE_PATH, "rb") as f:
+            content = f.read()
+
+        metadata = "media_id " + base64.b64encode(resumable_id.encode()).decode()
+        response = test_client.post(
+            "/api/uploads",
+            headers={"Upload-Length": str(len(content)), "Upload-Metadata": metadata},
+        )
+        assert response.status_code == 201
+        location = response.headers["Location"]
+
+        # First half, then the connection "drops"
+        half = len(content) // 2
+        chunk_headers = {"Content-Type": "application/offset+octet-stream"}
+        response = test_client.patch(
+            location, content=content[:half], headers={**chunk_headers, "Upload-Offset": "0"}
+        )
+        assert response.status_code == 204
+
+        # Resume from where the server is
+        response = test_client.head(location)
+        assert response.headers["Upload-Offset"] == str(half)
+
+        # The media_id alone never leads to the session...
+        response = test_client.post(
+            "/api/uploads",
+            headers={"Upload-Length": str(len(content)), "Upload-Metadata": metadata},
+        )
+        assert response.status_code == 201
+        assert response.headers["Location"] != location
+        test_client.delete(response.headers["Location"])
+
+        # ...its upload_id does
+        upload_id = location.rsplit("/", 1)[-1]
+        resume_metadata = metadata + ",upload_id " + base64.b64encode(upload_id.encode()).decode()
+        response = test_client.post(
+            "/api/uploads",
+            headers={"Upload-Length": str(len(content)), "Upload-Metadata": resume_metadata},
+        )
+        assert response.status_code == 200
+        assert response.headers["Location"] == location
+        assert response.json()["offset"] == half
+
+        response = test_client.patch(
+            location, content=content[half:], headers={**chunk_headers, "Upload-Offset": str(half)}
+        )
+        assert response.status_code == 200
+        assert response.json()["media_id"] == resumable_id
+
+        # The session is gone once the Media row exists
+        assert test_client.head(location).status_code == 404
+    finally:
+        remove_dummy_image()
+
+def test_knowledge_base_export(test_client):
+    """TC_KB_01: Verify the knowledge base export honours Accept-Encoding and If-None-Match"""
+    response = test_client.get("/api/knowledge-base", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["crops"]
+    etag = response.headers["etag"]
+
+    # q=0 means "not gzip"
+    response = test_client.get("/api/knowledge-base", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json()["crops"]
+
+    response = test_client.get("/api/knowledge-base", headers={"If-None-Match": f'"stale", {etag}'})
+    assert response.status_code == 304
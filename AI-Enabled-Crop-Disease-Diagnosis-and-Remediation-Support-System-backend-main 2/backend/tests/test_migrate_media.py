@@ -0,0 +1,127 @@
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import Index, create_engine, inspect, text
+from sqlalchemy.dialects import postgresql
+
+from app.tasks import init_db, migrate_media
+
+# Run from backend/ (python -m pytest tests) so `app` is importable.
+# Unlike test_integration.py, no running server is needed.
+
+# The media table exactly as the first release's create_all made it
+OLD_SCHEMA = """
+CREATE TABLE media (
+    media_id VARCHAR NOT NULL, media_type VARCHAR, status VARCHAR,
+    created_at DATETIME, user_id VARCHAR, result VARCHAR, confidence VARCHAR,
+    file_path VARCHAR, PRIMARY KEY (media_id)
+)
+"""
+
+
+@pytest.fixture
+def old_database(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(OLD_SCHEMA)
+        conn.execute("CREATE INDEX ix_media_media_id ON media (media_id)")
+        conn.execute("CREATE INDEX ix_media_user_id ON media (user_id)")
+        conn.execute(
+            "INSERT INTO media VALUES ('0F8FAD5B-D9CB-469F-A165-70867728950E', 'image/jpeg', "
+            "'COMPLETED', '2024-01-01 00:00:00.000000', 'u1', 'leaf_blight', '92%', 'a.jpg')"
+        )
+        conn.execute(
+            "INSERT INTO media VALUES ('7c9e6679-7425-40de-944b-e07fc1f90ae7', 'image/jpeg', "
+            "'UPLOADED', '2024-01-02 00:00:00.000000', 'u1', NULL, NULL, 'b.jpg')"
+        )
+
+    engine = create_engine(f"sqlite:///{path}")
+    monkeypatch.setattr(migrate_media, "worker_engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def test_migrate_converts_old_table(old_database):
+    assert migrate_media.migrate() is True
+
+    with old_database.connect() as conn:
+        rows = conn.execute(
+            text("SELECT media_id, status, confidence, updated_at, content_hash FROM media ORDER BY created_at")
+        ).all()
+        indexes = {index["name"] for index in inspect(conn).get_indexes("media")}
+        tables = inspect(conn).get_table_names()
+
+    assert rows == [
+        ("0f8fad5bd9cb469fa16570867728950e", "COMPLETED", pytest.approx(0.92), None, None),
+        ("7c9e6679742540de944be07fc1f90ae7", "UPLOADED", None, None, None),
+    ]
+    assert "ix_media_media_id" not in indexes and "ix_media_user_id" not in indexes
+    assert "ix_media_active_status_created_at" in indexes
+    assert tables == ["media"]
+
+    # A second run finds nothing to do
+    assert migrate_media.migrate() is True
+
+
+def test_init_db_upgrades_old_database(old_database, monkeypatch):
+    monkeypatch.setattr(init_db, "worker_engine", old_database)
+    assert init_db.init_db() is True
+
+    with old_database.connect() as conn:
+        columns = {column["name"] for column in inspect(conn).get_columns("media")}
+        tables = set(inspect(conn).get_table_names())
+    assert {"updated_at", "content_hash"} <= columns
+    assert {"media", "blobs", "ml_jobs"} <= tables
+
+
+def test_migrate_refuses_unconvertible_rows(old_database):
+    with old_database.begin() as conn:
+        conn.execute(text("UPDATE media SET media_id = 'not-a-uuid' WHERE user_id = 'u1' AND status = 'UPLOADED'"))
+
+    assert migrate_media.migrate() is False
+    with old_database.connect() as conn:
+        assert inspect(conn).get_table_names() == ["media"]
+        assert conn.scalar(text("SELECT confidence FROM media WHERE status = 'COMPLETED'")) == "92%"
+
+
+def test_postgresql_adds_missing_columns(monkeypatch):
+    statements = []
+
+    class FakeConnection:
+        dialect = postgresql.dialect()
+
+        def execute(self, statement):
+            statements.append(str(statement))
+
+    class FakeInspector:
+        def get_indexes(self, table):
+            return []
+
+    created = []
+    monkeypatch.setattr(migrate_media, "inspect", lambda conn: FakeInspector())
+    monkeypatch.setattr(Index, "create", lambda index, conn: created.append(index.name))
+
+    migrate_media._migrate_postgresql(FakeConnection())
+
+    assert "ALTER TABLE media ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE" in statements
+    assert "ALTER TABLE media ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)" in statements
+    assert {"ix_media_updated_at", "ix_media_content_hash"} <= set(created)
+
+
+def test_transaction_on_other_databases_uses_begin(monkeypatch):
+    began = []
+
+    class FakeEngine:
+        class dialect:
+            name = "postgresql"
+
+        @contextmanager
+        def begin(self):
+            began.append(True)
+            yield "connection"
+
+    monkeypatch.setattr(migrate_media, "worker_engine", FakeEngine())
+    with migrate_media._transaction() as conn:
+        assert conn == "connection"
+    assert began == [True]
@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import config
+from app.models import base
+from app.models.blob import Blob
+from app.services.storage_service import SavedUpload, release_blob, store_blob
+
+# Run from backend/ (python -m pytest tests) so `app` is importable.
+# Unlike test_integration.py, no running server is needed.
+
+CONTENT = b"not really a jpeg"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}")
+    base.Base.metadata.create_all(engine, tables=[Blob.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _received(tmp_path, name="upload.part"):
+    path = tmp_path / name
+    path.write_bytes(CONTENT)
+    return SavedUpload(str(path), len(CONTENT), hashlib.sha256(CONTENT).hexdigest())
+
+
+def _stored_files():
+    return sorted(
+        name for _, _, names in os.walk(config.UPLOAD_DIR) for name in names
+    )
+
+
+def test_same_content_is_stored_once(db, tmp_path):
+    blob, created = store_blob(db, _received(tmp_path, "a.part"), "jpg")
+    again, created_again = store_blob(db, _received(tmp_path, "b.part"), "jpg")
+
+    assert (created, created_again) == (True, False)
+    assert again.sha256 == blob.sha256
+    assert db.get(Blob, blob.sha256).ref_count == 2
+    assert _stored_files() == [f"{blob.sha256}.jpg"]
+
+
+def test_last_release_deletes_the_file(db, tmp_path):
+    blob, _ = store_blob(db, _received(tmp_path, "a.part"), "jpg")
+    store_blob(db, _received(tmp_path, "b.part"), "jpg")
+
+    release_blob(db, blob.sha256)
+    assert _stored_files() == [f"{blob.sha256}.jpg"]
+
+    release_blob(db, blob.sha256)
+    assert _stored_files() == []
+    assert db.get(Blob, blob.sha256) is None
+
+
+def test_failed_release_keeps_the_file(db, tmp_path, monkeypatch):
+    blob, _ = store_blob(db, _received(tmp_path), "jpg")
+    sha256 = blob.sha256
+
+    def failing_commit():
+        raise RuntimeError("connection lost")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db, "commit", failing_commit)
+        with pytest.raises(RuntimeError):
+            release_blob(db, sha256)
+
+    assert _stored_files() == [f"{sha256}.jpg"]
+    assert db.get(Blob, sha256).ref_count == 1
+
+
+def test_release_of_unknown_blob_is_a_no_op(db):
+    release_blob(db, "0" * 64)
+    assert _stored_files() == []
+
@@ -48,23 +48,19 @@ class SubmissionProvider with ChangeNotifier {
     notifyListeners();
 
     try {
-      // Capture pending local items (that might not be in backend yet)
-      // On Web, StorageService doesn't persist, so we rely on current memory state for pending items.
-      final pendingItems = _submissions.where((s) {
-        return s.status == SubmissionStatus.saved || 
-               s.status == SubmissionStatus.uploading || 
-               s.status == SubmissionStatus.failed;
-      }).toList();
-
-      // Fetch from backend
+      // Fetch from backend. After the first load this only returns
+      // records that changed since the previous pull.
       final backendHistory = await _syncService.fetchHistory();
-      
-      // Merge: Keep local pending items if they aren't already in backend history.
-      // This prevents "flicker" where a locally queue item disappears because it's not yet on the server.
-      final backendIds = backendHistory.map((s) => s.id).toSet();
-      final uniquePending = pendingItems.where((s) => !backendIds.contains(s.id)).toList();
-      
-      _submissions = [...uniquePending, ...backendHistory];
+
+      // Merge by id: fetched records replace their older copy, everything else is kept.
+      // Local pending items stay until the backend knows about them, which prevents
+      // "flicker" where a locally queued item disappears because it's not yet on the server.
+      final merged = {for (final s in _submissions) s.id: s};
+      for (final s in backendHistory) {
+        merged[s.id] = s;
+      }
+
+      _submissions = merged.values.toList();
       
       // Sort ensures newest first
       _submissions.sort((a, b) => b.createdAt.compareTo(a.createdAt));
@@ -48,7 +48,8 @@ class HistoryScreen extends StatelessWidget {
   Widget _thumb(String path) {
     final borderRadius = BorderRadius.circular(12);
 
-    final img = imageFromPath(path, fit: BoxFit.cover);
+    // 56 logical pixels at up to 3x device pixel ratio
+    final img = imageFromPath(path, fit: BoxFit.cover, size: 168);
 
     return ClipRRect(
       borderRadius: borderRadius,
@@ -22,7 +22,7 @@ class UploadedImagesScreen extends StatelessWidget {
   }
 
   Widget _image(String path) {
-    return imageFromPath(path, fit: BoxFit.cover);
+    return imageFromPath(path, fit: BoxFit.cover, size: 512);
   }
 
   @override
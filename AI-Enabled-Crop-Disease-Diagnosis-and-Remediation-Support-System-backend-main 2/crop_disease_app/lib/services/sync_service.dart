@@ -1,4 +1,5 @@
 import 'dart:async';
+import 'dart:math';
 import 'package:flutter/foundation.dart';
 import 'dart:convert'; // Will be needed for real API implementation
 import 'package:http/http.dart' as http; // Will be needed for real API implementation
@@ -20,6 +21,9 @@ class SyncService {
   bool _isSyncing = false;
   Timer? _syncTimer;
 
+  // Submissions sent per /api/upload-media/batch request when flushing the queue
+  static const int _syncBatchSize = 20;
+
   SyncService({
     required StorageService storageService,
     this.baseUrl = 'http://localhost:8000', // Use localhost for Web/Desktop
@@ -59,10 +63,11 @@ class SyncService {
         print('Syncing ${pendingSubmissions.length} pending submissions');
       }
 
-      for (var submission in pendingSubmissions) {
-        await uploadSubmission(submission);
-        // Add small delay between uploads to avoid overwhelming server
-        await Future.delayed(const Duration(milliseconds: 500));
+      // One request per batch instead of one per submission:
+      // on slow links most of the time goes into round trips, not bytes.
+      for (var start = 0; start < pendingSubmissions.length; start += _syncBatchSize) {
+        final end = min(start + _syncBatchSize, pendingSubmissions.length);
+        await uploadSubmissions(pendingSubmissions.sublist(start, end));
       }
     } catch (e) {
       if (kDebugMode) {
@@ -130,6 +135,121 @@ class SyncService {
     }
   }
 
+  // Upload several submissions in one request.
+  // Each one succeeds or fails on its own; failed ones stay queued for the next sync.
+  Future<void> uploadSubmissions(List<Submission> submissions) async {
+    for (var i = 0; i < submissions.length; i++) {
+      submissions[i] = submissions[i].copyWith(status: SubmissionStatus.uploading);
+      await _storageService.updateSubmission(submissions[i]);
+      _uploadProgressController.add({
+        'id': submissions[i].id,
+        'status': SubmissionStatus.uploading,
+        'progress': 0.0,
+      });
+    }
+
+    List<dynamic> results;
+    try {
+      results = await _uploadBatchToBackend(submissions);
+    } catch (e) {
+      if (kDebugMode) {
+        print('Batch upload failed: $e');
+      }
+      results = List.filled(submissions.length, {'error': e.toString()});
+    }
+
+    for (var i = 0; i < submissions.length; i++) {
+      var submission = submissions[i];
+      final result = results[i];
+
+      if (result['error'] == null) {
+        submission = submission.copyWith(
+          status: SubmissionStatus.submitted,
+          uploadedAt: DateTime.now(),
+          diagnosisId: result['media_id'],
+        );
+        await _storageService.updateSubmission(submission);
+
+        _uploadProgressController.add({
+          'id': submission.id,
+          'status': SubmissionStatus.submitted,
+          'progress': 1.0,
+          'diagnosisId': result['media_id'],
+        });
+      } else {
+        submission = submission.copyWith(status: SubmissionStatus.failed);
+        await _storageService.updateSubmission(submission);
+
+        _uploadProgressController.add({
+          'id': submission.id,
+          'status': SubmissionStatus.failed,
+          'progress': 0.0,
+        });
+
+        if (kDebugMode) {
+          print('Upload failed: ${submission.id}, error: ${result['error']}');
+        }
+      }
+    }
+  }
+
+  // The current user's ID, if someone is logged in
+  Future<String?> _currentUserId() async {
+    final prefs = await SharedPreferences.getInstance();
+    final userJson = prefs.getString('current_user');
+    if (userJson == null) return null;
+    return jsonDecode(userJson)['id'];
+  }
+
+  // The submission's image as a multipart file
+  Future<http.MultipartFile> _multipartFile(String field, Submission submission) async {
+    if (kIsWeb) {
+      // Special Handling for Web:
+      // Flutter Web cannot read files from a path string like mobile.
+      // We must fetch the blob data using the URL.
+      final fileResponse = await http.get(Uri.parse(submission.mediaPath));
+      return http.MultipartFile.fromBytes(
+        field,
+        fileResponse.bodyBytes,
+        filename: 'upload.jpg', // Name doesn't matter much for backend logic
+      );
+    }
+    return http.MultipartFile.fromPath(field, submission.mediaPath);
+  }
+
+  // Send several submissions to /api/upload-media/batch.
+  // Returns one result per submission, in order; failed ones carry 'error'.
+  Future<List<dynamic>> _uploadBatchToBackend(List<Submission> submissions) async {
+    if (kDebugMode) {
+      print('Uploading ${submissions.length} submissions to $baseUrl/api/upload-media/batch');
+    }
+
+    var request = http.MultipartRequest('POST', Uri.parse('$baseUrl/api/upload-media/batch'));
+
+    // Local submission IDs make every upload idempotent, as in _uploadToBackend
+    request.fields['items'] = jsonEncode(
+      submissions.map((submission) => {'media_id': submission.id}).toList(),
+    );
+
+    final userId = await _currentUserId();
+    if (userId != null) {
+      request.fields['user_id'] = userId;
+    }
+
+    for (var submission in submissions) {
+      request.files.add(await _multipartFile('files', submission));
+    }
+
+    var response = await request.send();
+    var responseData = await response.stream.bytesToString();
+
+    if (response.statusCode != 200) {
+      throw Exception('Server error: ${response.statusCode} - $responseData');
+    }
+
+    return json.decode(responseData)['results'];
+  }
+
   // Perform actual upload to backend
   Future<Map<String, dynamic>> _uploadToBackend(Submission submission) async {
     try {
@@ -145,26 +265,12 @@ class SyncService {
       request.fields['media_id'] = submission.id;
 
       // Add user_id to request
-      final prefs = await SharedPreferences.getInstance();
-      final userJson = prefs.getString('current_user');
-      if (userJson != null) {
-        final user = jsonDecode(userJson);
-        request.fields['user_id'] = user['id'];
+      final userId = await _currentUserId();
+      if (userId != null) {
+        request.fields['user_id'] = userId;
       }
 
-      if (kIsWeb) {
-        // Special Handling for Web:
-        // Flutter Web cannot read files from a path string like mobile.
-        // We must fetch the blob data using the URL.
-        final fileResponse = await http.get(Uri.parse(submission.mediaPath));
-        request.files.add(http.MultipartFile.fromBytes(
-          'file',
-          fileResponse.bodyBytes,
-          filename: 'upload.jpg', // Name doesn't matter much for backend logic
-        ));
-      } else {
-        request.files.add(await http.MultipartFile.fromPath('file', submission.mediaPath));
-      }
+      request.files.add(await _multipartFile('file', submission));
       
       var response = await request.send();
       var responseData = await response.stream.bytesToString();
@@ -184,22 +290,51 @@ class SyncService {
     }
   }
 
-  // Fetch history from backend
+  // Server time of the last successful history pull (X-Server-Time header).
+  // Sent back as `since` so later pulls only return records that changed.
+  String? _lastHistoryPull;
+
+  // Fetch history from backend.
+  // The first call returns everything (following X-Next-Cursor pages);
+  // later calls return only what changed since the previous call.
   Future<List<Submission>> fetchHistory() async {
     try {
       final prefs = await SharedPreferences.getInstance();
       final userJson = prefs.getString('current_user');
-      String userIdParam = '';
+      final params = <String, String>{};
       if (userJson != null) {
           final user = jsonDecode(userJson);
-          userIdParam = '?user_id=${user['id']}';
+          params['user_id'] = user['id'];
+      }
+      if (_lastHistoryPull != null) {
+        params['since'] = _lastHistoryPull!;
       }
 
-      final response = await http.get(Uri.parse('$baseUrl/api/history$userIdParam'));
+      final List<dynamic> data = [];
+      String? serverTime;
+      String? cursor;
 
-      if (response.statusCode == 200) {
-        final List<dynamic> data = json.decode(response.body);
-        return data.map((item) {
+      do {
+        final pageParams = {...params, if (cursor != null) 'cursor': cursor};
+        final response = await http.get(
+          Uri.parse('$baseUrl/api/history').replace(queryParameters: pageParams),
+        );
+
+        if (response.statusCode != 200) {
+          if (kDebugMode) {
+            print('Error fetching history: ${response.statusCode}');
+          }
+          return [];
+        }
+
+        data.addAll(json.decode(response.body));
+        serverTime ??= response.headers['x-server-time'];
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor != null);
+
+      _lastHistoryPull = serverTime;
+
+      return data.map((item) {
           // Map backend status to frontend status
           SubmissionStatus status = SubmissionStatus.submitted;
           if (item['status'] == 'COMPLETED') status = SubmissionStatus.diagnosed;
@@ -208,7 +343,10 @@ class SyncService {
 
           // Construct image URL
           String mediaPath = '';
-          if (item['file_path'] != null) {
+          if (item['file_url'] != null) {
+            // Signed when the server requires it
+            mediaPath = '$baseUrl${item["file_url"]}';
+          } else if (item['file_path'] != null) {
             mediaPath = '$baseUrl/uploads/${item["file_path"]}';
           } else {
             // Fallback if file_path is missing (legacy data)
@@ -226,12 +364,6 @@ class SyncService {
             diagnosisId: item['media_id'],
           );
         }).toList();
-      } else {
-        if (kDebugMode) {
-          print('Error fetching history: ${response.statusCode}');
-        }
-        return [];
-      }
     } catch (e) {
       if (kDebugMode) {
         print('Error fetching history: $e');
@@ -3,9 +3,20 @@ import 'package:flutter/widgets.dart';
 import 'image_from_path_web.dart'
     if (dart.library.io) 'image_from_path_io.dart' as impl;
 
+// [size]: for images on the backend, the width in pixels actually needed.
+// The server then sends its smallest stored variant at least that wide
+// instead of the full-resolution original.
 Widget imageFromPath(
   String path, {
   BoxFit fit = BoxFit.cover,
+  int? size,
 }) {
+  if (size != null && path.startsWith('http')) {
+    final uri = Uri.parse(path);
+    path = uri.replace(queryParameters: {
+      ...uri.queryParameters,
+      'size': '$size',
+    }).toString();
+  }
   return impl.imageFromPath(path, fit: fit);
 }
@@ -4,12 +4,11 @@ Flask Backend for Crop Disease Diagnosis App
 This backend server handles:
 - Receiving photo uploads and text submissions from the frontend
 - Deduplicating submissions using UUIDs
-- Saving uploaded images to the filesystem
-- Storing submission metadata in memory
+- Saving uploaded images to the filesystem, decoded while the request streams in
+- Storing submission metadata in SQLite or PostgreSQL (see store.py)
 - Returning diagnosis status (currently a placeholder)
 
 In a production environment, this would:
-- Use a real database (PostgreSQL, MongoDB)
 - Integrate with an AI model for actual crop disease diagnosis
 - Implement authentication and authorization
 - Use cloud storage for images (AWS S3, Google Cloud Storage)
@@ -17,22 +16,43 @@ In a production environment, this would:
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from concurrent.futures import ThreadPoolExecutor
 import time
-import base64
+import json
+import logging
 import os
 from pathlib import Path
 
+from store import create_store
+from streaming import SyncPayloadError, StagedImage, parse_sync_json, stage_upload
+from sync_logging import Timer, log_event
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS to allow requests from the React frontend
 
+# Largest request body accepted (bytes); request.stream stops there with a 413,
+# chunked bodies included. Applies to multipart uploads too.
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('SYNC_MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
+
 # Create uploads directory for storing crop disease images
 UPLOAD_DIR = Path(__file__).parent / 'uploads'
 UPLOAD_DIR.mkdir(exist_ok=True)
 
-# In-memory storage for deduplication and submission tracking
-# In a real app, this would be PostgreSQL/Redis/MongoDB
-received_ids = set()      # Track which submission IDs we've already processed
-submissions = []          # Store all received submissions
+# Persistent storage for deduplication and submission tracking.
+# SQLite (WAL) by default; set SYNC_DATABASE_URL=postgresql://... for PostgreSQL.
+# Shared by every worker process, and survives restarts.
+store = create_store()
+
+# Images are persisted (copied out of the upload spool, fsynced) on a
+# bounded thread pool shared by all requests
+PERSIST_WORKERS = int(os.environ.get('SYNC_PERSIST_WORKERS', min(8, (os.cpu_count() or 1) * 2)))
+persist_pool = ThreadPoolExecutor(max_workers=PERSIST_WORKERS, thread_name_prefix='persist')
+
+# Paging of GET /api/submissions
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
 @app.route('/api/sync', methods=['POST'])
 def sync_data():
@@ -59,77 +79,221 @@ def sync_data():
         "status": "success",
         "processed": number of new items,
         "skipped": number of duplicates,
-        "message": "Data synced successfully..."
+        "message": "Data synced successfully...",
+        "items": [
+            {
+                "id": "uuid-string",
+                "outcome": "saved" | "duplicate" | "invalid",
+                "image": "uuid-string.jpg",   (saved with an image)
+                "image_ms": 1.8,              (time to persist the image)
+                "image_error": "..."          (image could not be saved)
+            }
+        ],
+        "timings": {"parse_ms", "persist_ms", "store_ms", "total_ms"}
     }
     """
-    data = request.json
-    incoming_submissions = data.get('submissions', [])
-    
-    processed_count = 0
-    skipped_count = 0
+    timer = Timer()
+    try:
+        incoming_submissions = _read_submissions()
+    except SyncPayloadError as e:
+        log_event('sync_rejected', logging.WARNING, error=str(e))
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except RequestEntityTooLarge:
+        log_event('sync_rejected', logging.WARNING, error='request body too large')
+        message = f"Request body larger than {app.config['MAX_CONTENT_LENGTH']} bytes"
+        return jsonify({"status": "error", "message": message}), 413
+
+    try:
+        return _sync_submissions(incoming_submissions, timer, parse_ms=timer.ms())
+    finally:
+        # Images of duplicates (or of a failed request) are not kept
+        for sub in incoming_submissions:
+            image = _staged_image(sub)
+            if image:
+                image.discard()
+
+
+def _read_submissions():
+    """
+    Read the submissions of a sync request without holding its images in memory.
+
+    - application/json: the payload above, parsed incrementally; every data URL
+      image is decoded in chunks into a staged file (see streaming.py)
+    - multipart/form-data: a `submissions` field with the JSON list of
+      submissions (without images), and the image of each submission as a file
+      part named `image_<id>`, saving the 33% overhead of base64
+
+    Images arrive in sub['data']['image'] as StagedImage objects (JSON) or
+    Werkzeug FileStorage objects (multipart).
+    """
+    if request.mimetype == 'multipart/form-data':
+        try:
+            submissions = json.loads(request.form.get('submissions', '[]'))
+        except ValueError:
+            raise SyncPayloadError("The submissions field is not valid JSON")
+        if not isinstance(submissions, list) or not all(isinstance(sub, dict) for sub in submissions):
+            raise SyncPayloadError("The submissions field must be a JSON list of objects")
+
+        for sub in submissions:
+            image_file = request.files.get(f"image_{sub.get('id')}")
+            if image_file and isinstance(sub.get('data'), dict):
+                # Copied out of Werkzeug's spool later, on persist_pool
+                sub['data']['image'] = image_file
+        return submissions
+
+    data = parse_sync_json(request.stream, UPLOAD_DIR)
+    submissions = data.get('submissions', []) if isinstance(data, dict) else None
+    if not isinstance(submissions, list) or not all(isinstance(sub, dict) for sub in submissions):
+        # Images are only staged inside a list of submissions
+        for image in filter(None, map(_staged_image, submissions if isinstance(submissions, list) else [])):
+            image.discard()
+        raise SyncPayloadError("Expected {\"submissions\": [...]}")
+    return submissions
+
+
+def _staged_image(sub):
+    data = sub.get('data') if isinstance(sub, dict) else None
+    image = data.get('image') if isinstance(data, dict) else None
+    return image if isinstance(image, StagedImage) else None
+
+
+def _image_of(sub):
+    """The image of a submission still to be persisted: a StagedImage or a multipart file."""
+    data = sub.get('data')
+    image = data.get('image') if isinstance(data, dict) else None
+    return image if isinstance(image, (StagedImage, FileStorage)) else None
+
+
+def _persist_image(image):
+    """
+    Runs on persist_pool. Make one image durable in a staged file: copy a
+    multipart file part out of Werkzeug's spool, or fsync an image decoded
+    while parsing. Returns (StagedImage, milliseconds).
+    """
+    timer = Timer()
+    if isinstance(image, FileStorage):
+        staged = stage_upload(image, UPLOAD_DIR)
+    else:
+        staged = image
+        staged.flush_to_disk()
+    return staged, timer.ms()
+
+
+def _sync_submissions(incoming_submissions, timer, parse_ms):
+    items = []  # Outcome of each submission, in request order
+    new_items = []  # (submission, item) of IDs seen for the first time
+
+    # Deduplication: one indexed lookup for every ID in the batch.
+    # Decided here, in request order, before any work goes to the pool,
+    # so the first occurrence of an ID always wins.
+    incoming_ids = [sub.get('id') for sub in incoming_submissions if sub.get('id')]
+    known_ids = store.existing_ids(incoming_ids)
     
     for sub in incoming_submissions:
         sub_id = sub.get('id')
         
         # Skip submissions without an ID
         if not sub_id:
+            items.append({"id": None, "outcome": "invalid", "error": "missing id"})
             continue
         
         # Deduplication: skip if we've already processed this ID
-        if sub_id in received_ids:
-            skipped_count += 1
-            print(f"[DEDUPE] Skipped duplicate submission: {sub_id}")
+        # (earlier sync, or earlier in this same batch)
+        if sub_id in known_ids:
+            items.append({"id": sub_id, "outcome": "duplicate"})
+            log_event('submission_duplicate', id=sub_id)
             continue
+        known_ids.add(sub_id)
         
-        # Handle image data if present
-        if 'data' in sub and 'image' in sub['data']:
-            image_data = sub['data']['image']
-            
-            # Check if it's a base64 encoded image
-            if image_data and image_data.startswith('data:image'):
-                try:
-                    # Extract base64 data (remove the "data:image/jpeg;base64," prefix)
-                    header, encoded = image_data.split(',', 1)
-                    image_bytes = base64.b64decode(encoded)
-                    
-                    # Determine file extension from the data URL header
-                    ext = 'jpg'
-                    if 'png' in header:
-                        ext = 'png'
-                    elif 'jpeg' in header or 'jpg' in header:
-                        ext = 'jpg'
-                    
-                    # Save image with UUID as filename
-                    image_filename = f"{sub_id}.{ext}"
-                    image_path = UPLOAD_DIR / image_filename
-                    with open(image_path, 'wb') as f:
-                        f.write(image_bytes)
-                    
-                    # Store filename in submission, remove base64 to save memory
-                    sub['data']['image_filename'] = image_filename
-                    sub['data']['image'] = None  # Clear base64 data
-                    
-                    print(f"[IMAGE] Saved image: {image_filename}")
-                except Exception as e:
-                    print(f"[ERROR] Failed to save image: {e}")
-        
-        # Store the submission
-        received_ids.add(sub_id)
+        item = {"id": sub_id, "outcome": "saved"}
+        items.append(item)
+        new_items.append((sub, item))
+    
+    # Persist the images of new submissions in parallel
+    persist_timer = Timer()
+    pending = [
+        (sub, item, persist_pool.submit(_persist_image, image))
+        for sub, item in new_items
+        if (image := _image_of(sub)) is not None
+    ]
+    
+    for sub, item, future in pending:
+        try:
+            staged, item['image_ms'] = future.result()
+            sub['data']['image'] = staged
+        except Exception as e:
+            # The submission is kept without its image
+            if isinstance(sub['data']['image'], StagedImage):
+                sub['data']['image'].discard()
+            item['image_error'] = str(e)
+            sub['data']['image'] = None
+            log_event('image_save_failed', logging.ERROR, id=item['id'], error=str(e))
+            continue
         
+        # Store filename (UUID as name) in submission instead of the image itself.
+        # The staged file stays in sub['data']['image'] until the insert below.
+        sub['data']['image_filename'] = f"{item['id']}.{staged.ext}"
+        item['image'] = sub['data']['image_filename']
+    persist_ms = persist_timer.ms()
+    
+    new_submissions = []
+    for sub, _ in new_items:
         # Add server-side metadata
         sub['received_at'] = time.time()
         sub['server_status'] = "diagnosis_pending"  # Placeholder for AI diagnosis
-        
-        submissions.append(sub)
-        processed_count += 1
-        print(f"[RECV] New submission: {sub_id}")
+        new_submissions.append({**sub, 'data': {**sub['data'], 'image': None}})
+    
+    # Store the whole batch in one insert. IDs another worker stored in the
+    # meantime are not inserted again and count as duplicates.
+    store_timer = Timer()
+    inserted_ids = store.add_submissions(new_submissions)
+    store_ms = store_timer.ms()
+    
+    for sub, item in new_items:
+        if sub['id'] not in inserted_ids:
+            # Another request stored this ID first: its image must not be
+            # replaced. This one's staged file is discarded by sync_data().
+            item['outcome'] = "duplicate"
+            item.pop('image', None)
+            log_event('submission_duplicate', id=sub['id'])
+            continue
+
+        staged = _staged_image(sub)
+        if staged:
+            try:
+                staged.commit(UPLOAD_DIR / sub['data']['image_filename'])
+            except OSError as e:
+                # The stored submission names a file that couldn't be written
+                staged.discard()
+                item['image_error'] = str(e)
+                del item['image']
+                log_event('image_save_failed', logging.ERROR, id=item['id'], error=str(e))
+        log_event('submission_received', id=sub['id'], image=item.get('image'))
+
+    processed_count = len(inserted_ids)
+    skipped_count = sum(1 for item in items if item['outcome'] == "duplicate")
+    timings = {
+        "parse_ms": parse_ms,
+        "persist_ms": persist_ms,
+        "store_ms": store_ms,
+        "total_ms": timer.ms(),
+    }
+    log_event(
+        'sync_batch',
+        submissions=len(items),
+        processed=processed_count,
+        skipped=skipped_count,
+        **timings,
+    )
 
     # Return success response
     response = {
         "status": "success",
         "processed": processed_count,
         "skipped": skipped_count,
-        "message": "Data synced successfully. Diagnosis is pending."
+        "message": "Data synced successfully. Diagnosis is pending.",
+        "items": items,
+        "timings": timings,
     }
     
     return jsonify(response), 200
@@ -137,14 +301,29 @@ def sync_data():
 @app.route('/api/submissions', methods=['GET'])
 def get_submissions():
     """
-    Debug endpoint to view all stored submissions
+    Debug endpoint to view stored submissions, one page at a time
     
     This is useful for:
     - Debugging during development
     - Verifying that submissions are being received
     - Checking the structure of stored data
+    
+    Query parameters:
+    - limit: page size (default 100, max 1000)
+    - cursor: the X-Next-Cursor header of the previous page
+    
+    Submissions are returned in the order they were received. The header
+    X-Next-Cursor is absent on the last page.
     """
-    return jsonify(submissions), 200
+    limit = min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor', 0, type=int)
+    
+    page, next_cursor = store.list_submissions(after_seq=cursor, limit=max(limit, 1))
+    
+    response = jsonify(page)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response, 200
 
 if __name__ == '__main__':
     print("🌾 Starting Crop Disease Diagnosis Backend on port 5000...")
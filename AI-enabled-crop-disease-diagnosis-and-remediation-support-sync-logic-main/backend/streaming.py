@@ -0,0 +1,438 @@
+"""
+Streaming request parsing for POST /api/sync
+
+`request.json` reads the whole body, then the JSON parser makes a copy of every
+base64 image string, then b64decode makes another. A sync of 20 photos held
+about three times its payload in memory.
+
+This module instead reads the body in CHUNK_SIZE pieces with a small
+incremental JSON parser. The value of submissions[*].data.image is never
+held whole: its base64 is decoded chunk by chunk into a temporary file in
+the uploads directory (a StagedImage). Every other string is small and is
+parsed normally, up to MAX_STRING_BYTES.
+
+For multipart requests (no base64 at all), see stage_upload().
+
+The handler renames a StagedImage to its final name once the submission is
+accepted, or deletes it for a duplicate.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import os
+import tempfile
+
+from sync_logging import log_event
+
+# Bytes read from the request body at a time
+CHUNK_SIZE = 64 * 1024
+
+# Longest string accepted outside of an image (text, IDs, timestamps, ...)
+MAX_STRING_BYTES = 1024 * 1024
+
+# Deepest nesting of objects and arrays accepted (the parser recurses per level)
+MAX_DEPTH = 64
+
+# Longest "data:image/...;base64," prefix looked at
+MAX_DATA_URL_HEADER = 256
+
+# Location of the streamed image values
+IMAGE_PATH = ('submissions', '*', 'data', 'image')
+
+_WHITESPACE = b' \t\r\n'
+_DELIMITERS = b' \t\r\n,]}'
+
+
+class SyncPayloadError(ValueError):
+    """The request body is not valid JSON (or not a valid sync payload)."""
+
+
+class StagedImage:
+    """An image written to a temporary file, waiting to be kept or dropped."""
+
+    def __init__(self, path, ext):
+        self.path = path
+        self.ext = ext
+
+    def flush_to_disk(self):
+        """fsync the staged file, so it survives a crash once the sync is acknowledged."""
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def commit(self, final_path):
+        os.replace(self.path, final_path)
+        self.path = None
+
+    def discard(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+def _temp_image(directory):
+    fd, path = tempfile.mkstemp(dir=directory, prefix='.incoming-', suffix='.part')
+    return os.fdopen(fd, 'wb'), path
+
+
+def _ext_for(content_type):
+    return 'png' if 'png' in content_type else 'jpg'
+
+
+class _Reader:
+    """Buffered byte reader over a file-like request stream."""
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = b''
+        self.pos = 0
+
+    def fill(self):
+        """Read another chunk. Returns False at the end of the body."""
+        data = self.stream.read(self.chunk_size)
+        if not data:
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def ensure(self, count):
+        """Make sure `count` unread bytes are buffered."""
+        while len(self.buf) - self.pos < count:
+            if not self.fill():
+                raise SyncPayloadError("Unexpected end of request body")
+
+    def peek(self):
+        """Next non-whitespace byte, without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos:self.pos + 1]
+            if not self.fill():
+                return b''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise SyncPayloadError(f"Expected {char.decode()!r} in request body")
+        self.pos += 1
+
+
+class _ImageSink:
+    """
+    Receives the characters of a data URL string piece by piece and decodes the
+    base64 after the comma into a temporary file.
+
+    A value that is not a "data:image/...;base64," URL is collected as a plain
+    string instead (the original behaviour kept such values untouched).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.header = b''
+        self.mode = 'header'   # header -> base64 | raw | failed
+        self.pending = b''     # base64 characters not yet forming a full quantum
+        self.raw = []
+        self.size = 0
+        self.file = None
+        self.path = None
+        self.ext = None
+
+    def write(self, piece):
+        if self.mode == 'header':
+            self.header += piece
+            comma = self.header.find(b',')
+            if comma < 0:
+                if len(self.header) > MAX_DATA_URL_HEADER:
+                    self._start_raw(self.header)
+                return
+
+            piece = self.header[comma + 1:]
+            header = self.header[:comma]
+            if not (header.startswith(b'data:image') and header.endswith(b';base64')):
+                self._start_raw(self.header)
+                return
+
+            self.ext = _ext_for(header.decode('ascii', 'replace'))
+            self.file, self.path = _temp_image(self.directory)
+            self.mode = 'base64'
+
+        if self.mode == 'raw':
+            self._add_raw(piece)
+        elif self.mode == 'base64':
+            self._decode(piece)
+
+    def _start_raw(self, data):
+        self.mode = 'raw'
+        self._add_raw(data)
+
+    def _add_raw(self, piece):
+        self.size += len(piece)
+        if self.size > MAX_STRING_BYTES:
+            raise SyncPayloadError("Image value is neither a data URL nor a short string")
+        self.raw.append(piece)
+
+    def _decode(self, piece):
+        # Whitespace (e.g. MIME line breaks) is allowed in base64 but breaks
+        # the 4-character alignment, so drop it before splitting
+        data = self.pending + b''.join(piece.split())
+        usable = len(data) - len(data) % 4
+        try:
+            self.file.write(base64.b64decode(data[:usable]))
+        except (binascii.Error, OSError) as e:
+            log_event('image_decode_failed', logging.WARNING, error=str(e))
+            self._fail()
+            return
+        self.pending = data[usable:]
+
+    def _fail(self):
+        self.mode = 'failed'
+        self.file.close()
+        os.remove(self.path)
+        self.file = self.path = None
+
+    def close(self):
+        """The parsed value: a StagedImage, the plain string, or None if decoding failed."""
+        if self.mode == 'header':
+            self._start_raw(self.header)
+        if self.mode == 'raw':
+            return _decode_utf8(b''.join(self.raw))
+
+        if self.mode == 'base64':
+            if self.pending:
+                # Unpadded tail
+                self._decode(b'=' * (-len(self.pending) % 4))
+        if self.mode == 'failed':
+            return None
+
+        self.file.close()
+        return StagedImage(self.path, self.ext)
+
+    def abort(self):
+        if self.file:
+            self._fail()
+
+
+def _decode_utf8(data):
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        raise SyncPayloadError("Request body is not valid UTF-8")
+
+
+class _Parser:
+    """Recursive-descent JSON parser reading from a _Reader."""
+
+    def __init__(self, reader, image_dir):
+        self.reader = reader
+        self.image_dir = image_dir
+        self.staged = []  # every StagedImage created, so they can be cleaned up on error
+
+    def document(self):
+        value = self.value(())
+        if self.reader.peek():
+            raise SyncPayloadError("Unexpected data after the JSON document")
+        return value
+
+    def value(self, path):
+        char = self.reader.peek()
+        if char in (b'{', b'[') and len(path) >= MAX_DEPTH:
+            raise SyncPayloadError("Request body is nested too deeply")
+        if char == b'{':
+            return self.object(path)
+        if char == b'[':
+            return self.array(path)
+        if char == b'"':
+            if _matches(path, IMAGE_PATH):
+                return self.image()
+            return self.string()
+        if not char:
+            raise SyncPayloadError("Unexpected end of request body")
+        return self.literal()
+
+    def object(self, path):
+        reader = self.reader
+        reader.expect(b'{')
+        result = {}
+        if reader.peek() == b'}':
+            reader.pos += 1
+            return result
+
+        while True:
+            if reader.peek() != b'"':
+                raise SyncPayloadError("Expected an object key in request body")
+            key = self.string()
+            reader.expect(b':')
+            value = self.value(path + (key,))
+            # A repeated key keeps the last value (as json.loads does);
+            # an image staged for an earlier one would be left behind
+            if isinstance(result.get(key), StagedImage):
+                self.staged.remove(result[key])
+                result[key].discard()
+            result[key] = value
+
+            char = reader.peek()
+            reader.pos += 1
+            if char == b'}':
+                return result
+            if char != b',':
+                raise SyncPayloadError("Expected ',' or '}' in request body")
+
+    def array(self, path):
+        reader = self.reader
+        reader.expect(b'[')
+        result = []
+        if reader.peek() == b']':
+            reader.pos += 1
+            return result
+
+        while True:
+            result.append(self.value(path + ('*',)))
+
+            char = reader.peek()
+            reader.pos += 1
+            if char == b']':
+                return result
+            if char != b',':
+                raise SyncPayloadError("Expected ',' or ']' in request body")
+
+    def literal(self):
+        """Number, true, false or null."""
+        reader = self.reader
+        token = b''
+        while True:
+            end = reader.pos
+            while end < len(reader.buf) and reader.buf[end] not in _DELIMITERS:
+                end += 1
+            token += reader.buf[reader.pos:end]
+            reader.pos = end
+            if end < len(reader.buf) or not reader.fill():
+                break
+            if len(token) > 64:
+                raise SyncPayloadError("Invalid value in request body")
+
+        try:
+            return json.loads(token)
+        except ValueError:
+            raise SyncPayloadError(f"Invalid value in request body: {token[:20]!r}")
+
+    def string(self):
+        pieces = []
+        size = 0
+        for piece in self._string_pieces():
+            size += len(piece)
+            if size > MAX_STRING_BYTES:
+                raise SyncPayloadError("String value too long")
+            pieces.append(piece)
+        return _decode_utf8(b''.join(pieces))
+
+    def image(self):
+        sink = _ImageSink(self.image_dir)
+        try:
+            for piece in self._string_pieces():
+                sink.write(piece)
+            value = sink.close()
+        except BaseException:
+            sink.abort()
+            raise
+
+        if isinstance(value, StagedImage):
+            self.staged.append(value)
+        return value
+
+    def _string_pieces(self):
+        """
+        Yield the contents of the string at the reader as UTF-8 byte pieces,
+        with escapes resolved, one buffer's worth at a time.
+        """
+        reader = self.reader
+        reader.expect(b'"')
+
+        while True:
+            buf = reader.buf
+            quote = buf.find(b'"', reader.pos)
+            backslash = buf.find(b'\\', reader.pos, quote if quote >= 0 else len(buf))
+
+            if backslash >= 0:
+                if backslash > reader.pos:
+                    yield buf[reader.pos:backslash]
+                reader.pos = backslash
+                yield self._escape()
+            elif quote >= 0:
+                if quote > reader.pos:
+                    yield buf[reader.pos:quote]
+                reader.pos = quote + 1
+                return
+            else:
+                if len(buf) > reader.pos:
+                    yield buf[reader.pos:]
+                reader.pos = len(buf)
+                if not reader.fill():
+                    raise SyncPayloadError("Unterminated string in request body")
+
+    def _escape(self):
+        reader = self.reader
+        reader.ensure(2)
+        length = 2
+        if reader.buf[reader.pos + 1:reader.pos + 2] == b'u':
+            reader.ensure(6)
+            length = 6
+            # A surrogate pair only decodes as a whole
+            if b'd800' <= reader.buf[reader.pos + 2:reader.pos + 6].lower() <= b'dbff':
+                try:
+                    reader.ensure(12)
+                    length = 12
+                except SyncPayloadError:
+                    pass
+
+        escape = reader.buf[reader.pos:reader.pos + length]
+        reader.pos += length
+        try:
+            return json.loads(b'"' + escape + b'"').encode('utf-8')
+        except (ValueError, UnicodeEncodeError):
+            raise SyncPayloadError(f"Invalid escape in request body: {escape!r}")
+
+
+def _matches(path, pattern):
+    return len(path) == len(pattern) and all(
+        expected == '*' or key == expected for key, expected in zip(path, pattern)
+    )
+
+
+def parse_sync_json(stream, image_dir, chunk_size=CHUNK_SIZE):
+    """
+    Parse a JSON sync payload from a file-like stream.
+
+    Returns the decoded document, in which every data URL at
+    submissions[*].data.image is replaced by a StagedImage. On error, images
+    staged so far are deleted and SyncPayloadError is raised.
+    """
+    parser = _Parser(_Reader(stream, chunk_size), image_dir)
+    try:
+        return parser.document()
+    except BaseException:
+        for staged in parser.staged:
+            staged.discard()
+        raise
+
+
+def stage_upload(file_storage, image_dir):
+    """
+    Stage an image sent as a multipart file part.
+    Werkzeug has already spooled it to disk, so this is a plain file copy.
+    """
+    out, path = _temp_image(image_dir)
+    try:
+        with out:
+            file_storage.save(out)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        os.remove(path)
+        raise
+    return StagedImage(path, _ext_for(file_storage.mimetype or file_storage.filename or ''))
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# app.py opens its store at import time: keep tests away from backend/sync.db
+os.environ.setdefault(
+    'SYNC_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='sync-tests-'), 'sync.db')
+)
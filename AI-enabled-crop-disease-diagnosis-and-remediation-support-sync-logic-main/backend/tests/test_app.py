@@ -0,0 +1,86 @@
+"""
+Tests of POST /api/sync (app.py).
+
+Run from backend/:  python -m pytest tests
+"""
+
+import base64
+
+import pytest
+
+import app as sync_app
+from store import SQLiteStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    monkeypatch.setattr(sync_app, 'UPLOAD_DIR', uploads)
+    monkeypatch.setattr(sync_app, 'store', SQLiteStore(tmp_path / 'sync.db'))
+    return sync_app.app.test_client()
+
+
+def _submission(sub_id, image_bytes):
+    return {
+        'id': sub_id,
+        'data': {'text': 'leaf', 'image': 'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode()},
+        'createdAt': '2024-01-01T00:00:00Z',
+        'status': 'queued',
+    }
+
+
+def _files(directory):
+    return sorted(path.name for path in directory.iterdir())
+
+
+def test_new_submission_saves_its_image(client):
+    response = client.post('/api/sync', json={'submissions': [_submission('a1', b'image a1')]})
+
+    assert response.status_code == 200
+    assert response.json['processed'] == 1
+    assert response.json['items'][0]['image'] == 'a1.jpg'
+    assert (sync_app.UPLOAD_DIR / 'a1.jpg').read_bytes() == b'image a1'
+    assert _files(sync_app.UPLOAD_DIR) == ['a1.jpg']
+
+    page, _ = sync_app.store.list_submissions()
+    assert page[0]['data']['image_filename'] == 'a1.jpg'
+    assert page[0]['data']['image'] is None
+
+
+def test_duplicate_keeps_the_first_image(client):
+    client.post('/api/sync', json={'submissions': [_submission('a1', b'first')]})
+    response = client.post('/api/sync', json={'submissions': [_submission('a1', b'second')]})
+
+    assert response.json['items'][0]['outcome'] == 'duplicate'
+    assert (sync_app.UPLOAD_DIR / 'a1.jpg').read_bytes() == b'first'
+    assert _files(sync_app.UPLOAD_DIR) == ['a1.jpg']
+
+
+def test_concurrent_duplicate_does_not_overwrite_the_winners_image(client, monkeypatch):
+    # Another worker stores 'a1' (and its image) after this request's dedupe
+    # lookup, but before its insert
+    store = sync_app.store
+    add_submissions = store.add_submissions
+
+    def insert_after_other_worker(submissions):
+        add_submissions([{'id': 'a1', 'received_at': 0.0, 'data': {'image_filename': 'a1.jpg'}}])
+        (sync_app.UPLOAD_DIR / 'a1.jpg').write_bytes(b'winner')
+        return add_submissions(submissions)
+
+    monkeypatch.setattr(store, 'add_submissions', insert_after_other_worker)
+    response = client.post('/api/sync', json={'submissions': [_submission('a1', b'loser')]})
+
+    item = response.json['items'][0]
+    assert item['outcome'] == 'duplicate'
+    assert 'image' not in item
+    assert (sync_app.UPLOAD_DIR / 'a1.jpg').read_bytes() == b'winner'
+    assert _files(sync_app.UPLOAD_DIR) == ['a1.jpg']
+
+
+def test_invalid_payload_leaves_no_files(client):
+    body = '{"submissions": [{"id": "a1", "data": {"image": "data:image/jpeg;base64,QUJD"}}, oops]}'
+    response = client.post('/api/sync', data=body, content_type='application/json')
+
+    assert response.status_code == 400
+    assert _files(sync_app.UPLOAD_DIR) == []
@@ -0,0 +1,121 @@
+"""
+Tests of the SQLite submission store (store.py).
+
+Run from backend/:  python -m pytest tests
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from store import SQLiteStore, _page, create_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteStore(tmp_path / 'sync.db')
+
+
+def _submission(sub_id, text='leaf'):
+    return {'id': sub_id, 'received_at': 1700000000.0, 'data': {'text': text}}
+
+
+def test_add_and_find_submissions(store):
+    assert store.existing_ids(['a', 'b']) == set()
+
+    assert store.add_submissions([_submission('a'), _submission('b')]) == {'a', 'b'}
+    assert store.existing_ids(['a', 'b', 'c']) == {'a', 'b'}
+
+
+def test_existing_ids_of_large_batches(store):
+    ids = [f'id-{i}' for i in range(1200)]
+    store.add_submissions([_submission(sub_id) for sub_id in ids[::2]])
+    assert store.existing_ids(ids) == set(ids[::2])
+    assert store.existing_ids([]) == set()
+
+
+def test_re_inserting_is_idempotent(store):
+    store.add_submissions([_submission('a', 'first')])
+
+    # A retried sync: 'a' is left out and keeps its first payload
+    assert store.add_submissions([_submission('a', 'retry'), _submission('b')]) == {'b'}
+    assert store.add_submissions([_submission('a'), _submission('b')]) == set()
+    assert store.add_submissions([]) == set()
+
+    page, _ = store.list_submissions()
+    assert [(sub['id'], sub['data']['text']) for sub in page] == [('a', 'first'), ('b', 'leaf')]
+
+
+def test_failed_insert_rolls_back(store):
+    # The same ID twice in one call violates the unique index: nothing is kept
+    with pytest.raises(sqlite3.IntegrityError):
+        store.add_submissions([_submission('a'), _submission('b'), _submission('a')])
+    assert store.existing_ids(['a', 'b']) == set()
+
+    # The connection is usable again afterwards
+    assert store.add_submissions([_submission('a')]) == {'a'}
+
+
+def test_concurrent_inserts_of_one_id(tmp_path):
+    path = tmp_path / 'sync.db'
+    stores = [SQLiteStore(path) for _ in range(8)]
+    barrier = threading.Barrier(len(stores))
+    results = []
+
+    def insert(store):
+        barrier.wait()
+        results.append(store.add_submissions([_submission('same')]))
+
+    threads = [threading.Thread(target=insert, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Exactly one writer reports it as new; the others count it as a duplicate
+    assert sorted(results, key=len) == [set()] * 7 + [{'same'}]
+
+
+def test_pages_in_arrival_order(store):
+    ids = [f'id-{i}' for i in range(7)]
+    for sub_id in ids:
+        store.add_submissions([_submission(sub_id)])
+
+    seen = []
+    cursor = 0
+    while True:
+        page, cursor = store.list_submissions(after_seq=cursor, limit=3)
+        seen.append([sub['id'] for sub in page])
+        if cursor is None:
+            break
+
+    assert seen == [ids[0:3], ids[3:6], ids[6:7]]
+
+
+def test_exact_multiple_of_the_page_size_has_no_empty_last_page(store):
+    store.add_submissions([_submission(f'id-{i}') for i in range(4)])
+
+    page, cursor = store.list_submissions(limit=2)
+    assert len(page) == 2 and cursor is not None
+
+    page, cursor = store.list_submissions(after_seq=cursor, limit=2)
+    assert len(page) == 2 and cursor is None
+
+
+def test_page_helper():
+    rows = [(1, '{"id": "a"}'), (2, '{"id": "b"}'), (5, '{"id": "c"}')]
+
+    assert _page(rows, 2) == ([{'id': 'a'}, {'id': 'b'}], 2)
+    assert _page(rows, 3) == ([{'id': 'a'}, {'id': 'b'}, {'id': 'c'}], None)
+    assert _page([], 3) == ([], None)
+
+
+def test_create_store_from_url(tmp_path, monkeypatch):
+    monkeypatch.setenv('SYNC_DATABASE_URL', f'sqlite:///{tmp_path}/other.db')
+    assert isinstance(create_store(), SQLiteStore)
+    assert (tmp_path / 'other.db').exists()
+
+    monkeypatch.setenv('SYNC_DATABASE_URL', 'mysql://localhost/db')
+    with pytest.raises(ValueError):
+        create_store()
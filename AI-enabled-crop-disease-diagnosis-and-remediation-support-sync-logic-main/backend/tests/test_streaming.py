@@ -0,0 +1,169 @@
+"""
+Tests of the streaming /api/sync parser (streaming.py).
+
+Run from backend/:  python -m pytest tests
+"""
+
+import base64
+import io
+import json
+import os
+
+import pytest
+
+from streaming import MAX_DEPTH, StagedImage, SyncPayloadError, parse_sync_json
+
+# Small chunk sizes put chunk boundaries everywhere: inside strings, escapes,
+# base64 quanta and the data URL header
+CHUNK_SIZES = [1, 2, 3, 5, 7, 64, 64 * 1024]
+
+IMAGE = bytes(range(256)) * 3 + b'\xff\xd8 tail'
+
+
+def _parse(body, image_dir, chunk_size=64 * 1024):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return parse_sync_json(io.BytesIO(body), str(image_dir), chunk_size)
+
+
+def _payload(image, **data):
+    return json.dumps({
+        'submissions': [{'id': 'a1', 'data': {'text': 'leaf', 'image': image, **data}}],
+    })
+
+
+def _staged_files(image_dir):
+    return sorted(name for name in os.listdir(image_dir) if name.startswith('.incoming-'))
+
+
+def _read(staged):
+    with open(staged.path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_plain_values_match_json_loads(tmp_path, chunk_size):
+    document = {
+        'submissions': [],
+        'text': 'quote " backslash \\ slash / tab \t newline \n',
+        'unicode': 'café नमस्ते \U0001F33F',
+        'numbers': [0, -1, 3.25, 1e3, 12345678901234567890],
+        'literals': [True, False, None],
+        'nested': {'a': [{'b': []}, {}], 'empty': ''},
+    }
+    for ensure_ascii in (True, False):
+        body = json.dumps(document, ensure_ascii=ensure_ascii, indent=1)
+        assert _parse(body, tmp_path, chunk_size) == document
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_image_is_decoded_to_a_staged_file(tmp_path, chunk_size):
+    data_url = 'data:image/png;base64,' + base64.b64encode(IMAGE).decode()
+    result = _parse(_payload(data_url), tmp_path, chunk_size)
+
+    image = result['submissions'][0]['data']['image']
+    assert isinstance(image, StagedImage)
+    assert image.ext == 'png'
+    assert _read(image) == IMAGE
+    assert result['submissions'][0]['data']['text'] == 'leaf'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_image_with_line_breaks_and_escapes(tmp_path, chunk_size):
+    # MIME-style line breaks (JSON-escaped) and an escaped slash inside the base64
+    encoded = base64.encodebytes(IMAGE).decode().replace('/', '\\/').replace('\n', '\\n')
+    body = _payload('@').replace('"@"', '"data:image\\/jpeg;base64,' + encoded + '"')
+    image = _parse(body, tmp_path, chunk_size)['submissions'][0]['data']['image']
+
+    assert image.ext == 'jpg'
+    assert _read(image) == IMAGE
+
+
+def test_unpadded_base64(tmp_path):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(b'abcde').decode().rstrip('=')
+    image = _parse(_payload(data_url), tmp_path, 2)['submissions'][0]['data']['image']
+    assert _read(image) == b'abcde'
+
+
+def test_non_data_url_image_is_kept_as_string(tmp_path):
+    result = _parse(_payload('https://example.com/leaf.jpg'), tmp_path, 4)
+    assert result['submissions'][0]['data']['image'] == 'https://example.com/leaf.jpg'
+    assert _staged_files(tmp_path) == []
+
+
+def test_invalid_base64_gives_none_and_no_file(tmp_path):
+    result = _parse(_payload('data:image/jpeg;base64,AB$D'), tmp_path, 3)
+    assert result['submissions'][0]['data']['image'] is None
+    assert _staged_files(tmp_path) == []
+
+
+def test_only_submission_images_are_streamed(tmp_path):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(b'xyz').decode()
+    result = _parse(json.dumps({'submissions': [], 'image': data_url}), tmp_path)
+    assert result['image'] == data_url
+
+
+def test_duplicate_image_key_keeps_only_the_last_image(tmp_path):
+    first = 'data:image/jpeg;base64,' + base64.b64encode(b'first').decode()
+    second = 'data:image/png;base64,' + base64.b64encode(b'second').decode()
+    body = (
+        '{"submissions": [{"id": "a1", "data": {"image": "%s", "image": "%s"}}]}'
+        % (first, second)
+    )
+    image = _parse(body, tmp_path, 5)['submissions'][0]['data']['image']
+
+    assert _read(image) == b'second'
+    assert _staged_files(tmp_path) == [os.path.basename(image.path)]
+
+
+def test_nesting_up_to_the_limit_is_accepted(tmp_path):
+    body = '[' * MAX_DEPTH + ']' * MAX_DEPTH
+    assert _parse(body, tmp_path) == json.loads(body)
+
+
+@pytest.mark.parametrize('body', [
+    '[' * (MAX_DEPTH + 1) + ']' * (MAX_DEPTH + 1),
+    '[' * 5000,
+    '{"a":' * 5000,
+])
+def test_deep_nesting_is_rejected(tmp_path, body):
+    with pytest.raises(SyncPayloadError, match='nested too deeply'):
+        _parse(body, tmp_path)
+
+
+@pytest.mark.parametrize('body', [
+    '',
+    '{',
+    '{"submissions": [}',
+    '{"submissions" []}',
+    '{"a": 1,}',
+    '[1 2]',
+    '{"a": tru}',
+    '{"a": "unterminated',
+    '{"a": "bad escape \\x"}',
+    '{"a": 1} trailing',
+    '{1: 2}',
+    b'{"a": "\xff\xfe"}',
+])
+def test_malformed_input_is_rejected(tmp_path, body):
+    with pytest.raises(SyncPayloadError):
+        _parse(body, tmp_path, 3)
+
+
+def test_error_after_an_image_removes_staged_files(tmp_path):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(IMAGE).decode()
+    body = _payload(data_url)[:-2] + ', }'
+
+    with pytest.raises(SyncPayloadError):
+        _parse(body, tmp_path, 7)
+    assert _staged_files(tmp_path) == []
+
+
+def test_truncated_image_removes_its_file(tmp_path):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(IMAGE).decode()
+    body = _payload(data_url)
+    body = body[:body.index(data_url) + 100]
+
+    with pytest.raises(SyncPayloadError):
+        _parse(body, tmp_path, 16)
+    assert _staged_files(tmp_path) == []
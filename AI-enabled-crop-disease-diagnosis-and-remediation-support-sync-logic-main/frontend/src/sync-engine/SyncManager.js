@@ -37,12 +37,43 @@ export const saveSubmission = async (data) => {
     return submission;
 };
 
+/**
+ * Build the multipart body of a sync request
+ * 
+ * Images are sent as binary file parts named `image_<id>` instead of base64
+ * data URLs inside the JSON, which is a third smaller and lets the backend
+ * write them straight to disk. The remaining submission fields go in the
+ * `submissions` field as JSON.
+ * 
+ * @param {Array<Object>} queue - The queued submissions
+ * @returns {Promise<FormData>} The request body
+ */
+const buildSyncForm = async (queue) => {
+    const form = new FormData();
+    const submissions = [];
+
+    for (const item of queue) {
+        const image = item.data?.image;
+        if (typeof image === 'string' && image.startsWith('data:image')) {
+            // Decode the data URL into a Blob
+            const blob = await (await fetch(image)).blob();
+            form.append(`image_${item.id}`, blob, `${item.id}.${blob.type === 'image/png' ? 'png' : 'jpg'}`);
+            submissions.push({ ...item, data: { ...item.data, image: null } });
+        } else {
+            submissions.push(item);
+        }
+    }
+
+    form.append('submissions', JSON.stringify(submissions));
+    return form;
+};
+
 /**
  * Sync all queued submissions to the backend server
  * 
  * This function:
  * - Gets all pending items from the queue
- * - Sends them to the backend in a single POST request
+ * - Sends them to the backend in a single multipart POST request
  * - On success: moves items to history and removes from queue
  * - On failure: keeps items in queue for retry later
  * 
@@ -59,10 +90,10 @@ export const syncQueue = async () => {
 
     try {
         // Send all queued items to the backend
+        // No Content-Type header: the browser sets the multipart boundary
         const response = await fetch(BACKEND_URL, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ submissions: queue })
+            body: await buildSyncForm(queue)
         });
 
         if (response.ok) {